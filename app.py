@@ -7,9 +7,14 @@ EdgeOne DDNS 动态域名解析系统
 
 import os
 import json
+import codecs
+import csv
+import hashlib
+import hmac
 import logging
 import logging.handlers
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from functools import wraps
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, g
 from jinja2 import filters
 from datetime import datetime
 import threading
@@ -21,6 +26,13 @@ from edgeone_client import EdgeOneClient
 from ip_detector import IPDetector
 from notification import NotificationManager
 from ddns_service import DNSService
+from jobs import JobManager
+from config_watcher import ConfigWatcher
+from control_socket import ControlSocket
+from inventory import DomainEntry, normalize_domain, normalize_family, read_csv, read_jsonl
+import dyndns
+import metrics
+from profiler import PROFILER, ProfilerBusy, samples_to_collapsed, samples_to_text, stats_to_bytes, stats_to_text
 
 # 配置日志
 def setup_logging():
@@ -92,13 +104,60 @@ app.config['SECRET_KEY'] = 'edgeone-ddns-secret-key'
 # 初始化配置
 config = Config()
 dnsservice = DNSService(config)
+job_manager = JobManager(dnsservice.event_bus, state_dir=os.environ.get('DDNS_JOBS_DIR') or None)
+if os.environ.get('DDNS_EVENTS_DIR'):
+    # 多个worker之间转发事件，SSE客户端连接到任一worker都能收到全部事件
+    dnsservice.event_bus.enable_relay(os.environ['DDNS_EVENTS_DIR'])
+config_watcher = ConfigWatcher(config, lambda old_data: on_config_file_changed(old_data))
 
 # 全局变量
 last_update_time = None
 current_ip = None
 scheduler_thread = None
 
+# 状态快照缓存：(DNSService状态版本, 应用状态版本, 清单版本, 日志文件版本) 不变时直接复用序列化结果和ETag
+app_status_version = 0
+status_snapshot = {'key': None, 'body': b'', 'etag': ''}
+status_snapshot_lock = threading.Lock()
+
 # 自动初始化定时任务（确保在模块加载时执行）
+def on_config_file_changed(old_data: dict):
+    """配置文件被外部修改（或由其他worker保存）后，在本进程增量应用
+    
+    每个worker都替换自己的配置并重建客户端；更新解析记录和发送通知只由一个进程执行：
+    其他worker通过 /api/config 保存的配置已由该worker应用，外部修改由持有领导锁的worker应用。
+    """
+    touch_app_status()
+    if old_data.get('update_interval') != config.update_interval:
+        init_scheduler()
+    update_records = not config.saved_by_service and config_watcher.is_leader()
+    job_manager.submit(
+        'config_reload',
+        lambda report_progress: dnsservice.apply_config_changes(old_data, update_records)
+    )
+
+def on_control_trigger(message: dict) -> dict:
+    """处理控制套接字的触发消息，更新在后台任务中执行"""
+    address = message.get('address')
+    family = message.get('family')
+    job = job_manager.submit(
+        'hook_update',
+        lambda report_progress: dnsservice.trigger_update(address, family, trigger='hook')
+    )
+    return {'success': True, 'message': f'更新任务已提交: {job.id}', 'job_id': job.id}
+
+control_socket = None
+
+def start_control_socket():
+    """启动本地控制套接字（多进程时只有一个进程负责监听）"""
+    global control_socket
+    path = config.snapshot.control_socket
+    if not path or control_socket:
+        return
+    control_socket = ControlSocket(path, on_control_trigger)
+    if not control_socket.start():
+        logging.debug("控制套接字由其他进程负责")
+
 def auto_init_scheduler():
     """自动初始化定时任务"""
     global scheduler_thread
@@ -107,17 +166,23 @@ def auto_init_scheduler():
         # 加载配置
         config.load()
         
+        # 监听配置文件变化
+        config_watcher.start()
+        
+        # 监听本地触发消息
+        start_control_socket()
+        
         # 清除所有现有任务
         schedule.clear()
         
         # 添加定时更新任务
         schedule.every(config.update_interval).seconds.do(
-            lambda: dnsservice.check_and_update_ip()
+            lambda: dnsservice.check_and_update_ip(trigger='schedule')
         )
         
         # 启动调度器线程
         if not scheduler_thread or not scheduler_thread.is_alive():
-            scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+            scheduler_thread = threading.Thread(target=run_scheduler, name='scheduler', daemon=True)
             scheduler_thread.start()
             logging.info("定时任务调度器已自动启动")
         
@@ -161,16 +226,52 @@ def get_system_status():
     """获取系统状态信息"""
     global last_update_time, current_ip
     
+    cfg = config.snapshot
     status = {
         'service_running': dnsservice.is_running,
         'last_update_time': last_update_time.isoformat() if last_update_time else None,
         'current_ip': current_ip,
-        'config_valid': config.is_valid(),
-        'total_domains': len(config.ipv4_domains or config.domains) + len(config.ipv6_domains),
+        'config_valid': cfg.is_valid,
+        'total_domains': sum(cfg.total_domains),
+        'zones': len(cfg.zones),
+        'cycle_stats': dnsservice.get_cycle_stats(),
         'logs': dnsservice.get_recent_logs(limit=10)
     }
     return status
 
+def touch_app_status():
+    """标记应用级状态（配置、手动更新结果）已变化"""
+    global app_status_version
+    with status_snapshot_lock:
+        app_status_version += 1
+
+def get_status_snapshot() -> dict:
+    """获取状态快照，仅在状态版本变化时重建"""
+    global status_snapshot
+    
+    # 清单版本也会随其他worker的域名增删变化；状态中的文件日志可能由其他worker写入，
+    # 日志文件的大小和修改时间也计入版本，否则各worker会用同一ETag返回不同内容
+    key = (dnsservice.status_version, app_status_version, config.snapshot.inventory_version,
+           dnsservice.log_file_version())
+    snapshot = status_snapshot
+    if snapshot['key'] == key:
+        return snapshot
+    
+    with status_snapshot_lock:
+        snapshot = status_snapshot
+        if snapshot['key'] == key:
+            return snapshot
+        
+        body = app.json.dumps(get_system_status()).encode('utf-8')
+        snapshot = {
+            'key': key,
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest()
+        }
+        # 整体替换引用，读取方无需加锁
+        status_snapshot = snapshot
+        return snapshot
+
 @app.route('/')
 def index():
     """主页 - 仪表板"""
@@ -195,80 +296,354 @@ def api_config():
         if not all(key in data for key in ['secret_id', 'zone_id']):
             return jsonify({'error': '缺少必需的配置字段'}), 400
         
-        # 更新配置
-        config.secret_id = data['secret_id']
-        
-        # 处理secret_key：如果提交的是掩码值，则保留原值；否则更新为新值
-        submitted_secret_key = data.get('secret_key', '')
-        if submitted_secret_key and not submitted_secret_key.startswith('*'):
-            config.secret_key = submitted_secret_key
-        # 如果提交的是空值或掩码值，保持原有的secret_key不变
-        
-        config.zone_id = data['zone_id']
-        # 保持向后兼容：如果发送了domains，则使用它
-        if 'domains' in data and data['domains']:
-            config.domains = data.get('domains', [])
-        else:
-            config.ipv4_domains = data.get('ipv4_domains', [])
-            config.ipv6_domains = data.get('ipv6_domains', [])
+        # 修改与保存期间持有配置锁，避免与配置文件监听器的重新加载交错
+        with config.lock:
+            # 记录修改前的配置，用于增量应用
+            old_data = dict(config.data)
             
-        config.update_interval = int(data.get('update_interval', 300))
-        config.ipv4_enabled = data.get('ipv4_enabled', True)
-        config.ipv6_enabled = data.get('ipv6_enabled', False)
+            # 更新配置
+            config.secret_id = data['secret_id']
+            
+            # 处理secret_key：如果提交的是掩码值，则保留原值；否则更新为新值
+            submitted_secret_key = data.get('secret_key', '')
+            if submitted_secret_key and not submitted_secret_key.startswith('*'):
+                config.secret_key = submitted_secret_key
+            # 如果提交的是空值或掩码值，保持原有的secret_key不变
+            
+            config.zone_id = data['zone_id']
+            # 保持向后兼容：如果发送了domains，则使用它
+            if 'domains' in data and data['domains']:
+                config.domains = data.get('domains', [])
+            else:
+                config.ipv4_domains = data.get('ipv4_domains', [])
+                config.ipv6_domains = data.get('ipv6_domains', [])
+                
+            config.update_interval = int(data.get('update_interval', 300))
+            config.ipv4_enabled = data.get('ipv4_enabled', True)
+            config.ipv6_enabled = data.get('ipv6_enabled', False)
+            
+            # Webhook配置
+            config.webhook_enabled = data.get('webhook_enabled', False)
+            config.webhook_url = data.get('webhook_url', '')
+            config.webhook_headers = data.get('webhook_headers', '{}')
+            config.webhook_body_template = data.get('webhook_body_template', '{}')
+            if 'webhook_targets' in data:
+                config.webhook_targets = data['webhook_targets']
+            if 'dyndns_users' in data:
+                config.dyndns_users = data['dyndns_users']
+            
+            # 保存配置
+            config.save()
         
-        # Webhook配置
-        config.webhook_enabled = data.get('webhook_enabled', False)
-        config.webhook_url = data.get('webhook_url', '')
-        config.webhook_headers = data.get('webhook_headers', '{}')
-        config.webhook_body_template = data.get('webhook_body_template', '{}')
+        # 在配置锁之外标记状态变化：重建状态快照时先持有快照锁再读取配置，反过来嵌套会死锁
+        touch_app_status()
         
-        # 保存配置
-        config.save()
+        # 更新间隔变化时重新安排定时任务
+        if old_data.get('update_interval') != config.update_interval:
+            init_scheduler()
         
-        # 重启服务
-        dnsservice.restart()
+        # 在后台任务中增量应用配置变更，请求立即返回
+        job = job_manager.submit(
+            'config_reload',
+            lambda report_progress: dnsservice.apply_config_changes(old_data)
+        )
         
-        return jsonify({'success': True, 'message': '配置已更新'})
+        return jsonify({'success': True, 'message': '配置已更新', 'job_id': job.id})
     
     except Exception as e:
         logging.error(f"更新配置失败: {str(e)}")
         return jsonify({'error': f'更新配置失败: {str(e)}'}), 500
 
+def submit_inventory_update(changed):
+    """清单修改后标记状态变化，并在后台任务中更新新增或修改的域名，返回任务ID"""
+    touch_app_status()
+    if not changed:
+        return None
+    job = job_manager.submit(
+        'inventory_update',
+        lambda report_progress: dnsservice.apply_inventory_changes(changed)
+    )
+    return job.id
+
+@app.route('/api/domains', methods=['GET', 'POST'])
+def api_domains():
+    """域名清单：GET 按 zone、family、tag、q 筛选并分页（offset、limit 最多1000），POST 添加或修改一个或多个域名"""
+    if request.method == 'GET':
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(1000, max(1, int(request.args.get('limit', 100))))
+            family = normalize_family(request.args['family']) if request.args.get('family') else None
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'查询参数无效: {str(e)}'}), 400
+        config.inventory.refresh()
+        total, entries = config.inventory.list(
+            zone=request.args.get('zone'), family=family, tag=request.args.get('tag'),
+            query=request.args.get('q'), offset=offset, limit=limit
+        )
+        return jsonify({'success': True, 'total': total, 'offset': offset,
+                        'domains': [entry.to_dict() for entry in entries]})
+    
+    data = request.get_json(silent=True)
+    items = data if isinstance(data, list) else [data]
+    cfg = config.snapshot
+    if not cfg.zones:
+        return jsonify({'success': False, 'message': '请先配置Zone'}), 400
+    zones = {zone.name for zone in cfg.zones}
+    try:
+        entries = [DomainEntry.from_dict(item, cfg.zones[0].name) for item in items]
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    unknown = sorted({entry.zone for entry in entries} - zones)
+    if unknown:
+        return jsonify({'success': False, 'message': f"Zone不存在: {', '.join(unknown)}"}), 400
+    
+    try:
+        changed, unchanged = config.inventory.put(entries)
+    except OSError as e:
+        logging.error(f"保存域名清单失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'保存域名清单失败: {str(e)}'}), 500
+    return jsonify({
+        'success': True,
+        'message': f'已添加或修改 {len(changed)} 个域名',
+        'changed': len(changed),
+        'unchanged': unchanged,
+        'job_id': submit_inventory_update(changed)
+    })
+
+@app.route('/api/domains/<domain>', methods=['DELETE'])
+def api_domain_delete(domain):
+    """从清单中删除域名（family 指定时只删除该协议），已有的解析记录不会被删除"""
+    try:
+        domain = normalize_domain(domain)
+        family = normalize_family(request.args['family']) if request.args.get('family') else None
+        removed = config.inventory.remove(domain, family)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except OSError as e:
+        logging.error(f"保存域名清单失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'保存域名清单失败: {str(e)}'}), 500
+    if not removed:
+        return jsonify({'success': False, 'message': f'域名不在清单中: {domain}'}), 404
+    touch_app_status()
+    return jsonify({'success': True, 'message': f'已删除 {len(removed)} 个条目', 'removed': len(removed)})
+
+@app.route('/api/domains/import', methods=['POST'])
+def api_domains_import():
+    """流式批量导入：请求体（或上传的 file）为CSV或JSONL，format 未指定时按文件名或Content-Type判断
+    
+    zone 参数为未填写Zone的行使用的默认Zone；无效行被跳过并在结果中列出。
+    """
+    cfg = config.snapshot
+    if not cfg.zones:
+        return jsonify({'success': False, 'message': '请先配置Zone'}), 400
+    zones = {zone.name for zone in cfg.zones}
+    default_zone = request.args.get('zone') or cfg.zones[0].name
+    if default_zone not in zones:
+        return jsonify({'success': False, 'message': f'Zone不存在: {default_zone}'}), 400
+    
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or (
+        'csv' if 'csv' in ((upload.filename if upload else request.content_type) or '').lower() else 'jsonl'
+    )
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    rows = read_csv(lines) if fmt == 'csv' else read_jsonl(lines)
+    
+    try:
+        stats = config.inventory.import_rows(rows, default_zone, zones)
+    except (csv.Error, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'message': f'导入文件格式无效: {str(e)}'}), 400
+    except OSError as e:
+        logging.error(f"保存域名清单失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'保存域名清单失败: {str(e)}'}), 500
+    
+    changed = stats.pop('changed')
+    logging.info(f"域名清单导入: 新增或修改 {stats['imported']}，未变化 {stats['unchanged']}，无效 {stats['errors']}")
+    stats.update({
+        'success': not stats['errors'],
+        'message': f"导入完成: {stats['imported']} 个新增或修改, {stats['unchanged']} 个未变化, {stats['errors']} 行无效",
+        'job_id': submit_inventory_update(changed)
+    })
+    return jsonify(stats)
+
+@app.route('/api/domains/export')
+def api_domains_export():
+    """流式导出域名清单（format=csv 或 jsonl）"""
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'jsonl'
+    config.inventory.refresh()
+    return Response(
+        config.inventory.export(fmt),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename=domains.{fmt}'}
+    )
+
 @app.route('/api/status')
 def api_status():
-    """获取系统状态"""
-    return jsonify(get_system_status())
+    """获取系统状态（支持ETag / If-None-Match）"""
+    snapshot = get_status_snapshot()
+    
+    if request.if_none_match.contains(snapshot['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot['body'], mimetype='application/json')
+    
+    response.set_etag(snapshot['etag'])
+    # 要求客户端每次携带ETag重新验证，未变化时只返回304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/events')
+def api_events():
+    """SSE事件流：推送周期开始/结束、域名更新结果、IP变化和新日志"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    # 每个SSE连接占用一个worker线程，超过上限时拒绝，客户端改为轮询，线程留给普通请求和健康检查
+    stream = dnsservice.event_bus.open_stream(last_event_id)
+    if stream is None:
+        response = jsonify({'error': 'SSE连接数已达上限，请使用轮询'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    # 响应体不依赖请求上下文，连接空闲时只占用事件总线中的一个游标
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/manual_update', methods=['POST'])
 def manual_update():
-    """手动触发IP更新"""
+    """手动触发IP更新（后台任务，立即返回任务ID）"""
     try:
-        global last_update_time, current_ip
-        
-        # 执行IP检测和DNS更新
-        ip_detector = IPDetector()
-        new_ip = ip_detector.get_public_ip()
-        
-        if new_ip:
-            # 更新全局状态
-            current_ip = new_ip
-            last_update_time = datetime.now()
-            
-            # 执行DNS更新
-            result = dnsservice.update_dns_records(new_ip)
-            
-            return jsonify({
-                'success': True,
-                'message': f'IP更新完成: {new_ip}',
-                'result': result
-            })
-        else:
-            return jsonify({'error': '无法获取公网IP'}), 500
+        job = job_manager.submit('manual_update', run_manual_update)
+        return jsonify({
+            'success': True,
+            'message': '更新任务已提交',
+            'job_id': job.id
+        }), 202
             
     except Exception as e:
         logging.error(f"手动更新失败: {str(e)}")
         return jsonify({'error': f'手动更新失败: {str(e)}'}), 500
 
+def run_manual_update(report_progress) -> dict:
+    """执行完整的双栈更新周期"""
+    global last_update_time, current_ip, app_status_version
+    
+    result = dnsservice.check_and_update_ip(progress_callback=report_progress, trigger='manual')
+    
+    ip_info = result.get('ip_info') or {}
+    new_ip = ip_info.get('ipv4') or ip_info.get('ipv6')
+    if new_ip:
+        # 更新全局状态（与状态快照的重建互斥，避免快照中IP和时间不一致）
+        with status_snapshot_lock:
+            current_ip = new_ip
+            last_update_time = datetime.now()
+            app_status_version += 1
+    
+    return result
+
+@app.route('/nic/update', methods=['GET', 'POST'])
+def nic_update():
+    """dyndns2兼容的推送接口：路由器上报自己的IP，直接更新对应域名"""
+    cfg = config.snapshot
+    auth = request.authorization
+    user = dyndns.find_user(cfg.dyndns_users, auth.username if auth else None, auth.password if auth else None)
+    if not user:
+        response = Response(dyndns.BADAUTH, status=401, mimetype='text/plain')
+        response.headers['WWW-Authenticate'] = 'Basic realm="EdgeOne DDNS"'
+        return response
+    
+    hostnames = [h.strip().lower() for h in request.args.get('hostname', '').split(',') if h.strip()]
+    if not hostnames:
+        return Response(dyndns.NOTFQDN, mimetype='text/plain')
+    if len(hostnames) > dyndns.MAX_HOSTS:
+        return Response(dyndns.NUMHOST, mimetype='text/plain')
+    
+    # 未携带myip时使用请求来源地址
+    addresses = dyndns.parse_addresses(
+        request.args.get('myip') or (None if request.args.get('myipv6') else request.remote_addr),
+        request.args.get('myipv6')
+    )
+    if not addresses:
+        return Response(dyndns.DNSERR, mimetype='text/plain')
+    if not dnsservice.is_running:
+        return Response(dyndns.SERVER_ERROR, mimetype='text/plain')
+    
+    lines = []
+    for hostname in hostnames:
+        if not dyndns.is_fqdn(hostname):
+            lines.append(dyndns.NOTFQDN)
+            continue
+        if not dyndns.host_allowed(user, hostname, cfg):
+            lines.append(dyndns.NOHOST)
+            continue
+        
+        changed = False
+        failed = None
+        for address in addresses:
+            result = dnsservice.push_update(hostname, address)
+            if not result.get('success'):
+                failed = dyndns.NOHOST if result.get('reason') == 'nohost' else dyndns.DNSERR
+                break
+            changed = changed or result.get('action') in ('updated', 'created')
+        
+        if failed:
+            lines.append(failed)
+        else:
+            code = dyndns.GOOD if changed else dyndns.NOCHG
+            lines.append(f"{code} {','.join(addresses)}")
+    
+    logging.info(f"dyndns推送 ({user.get('username')}): {','.join(hostnames)} -> {','.join(addresses)}: {'; '.join(lines)}")
+    touch_app_status()
+    return Response('\n'.join(lines), mimetype='text/plain')
+
+@app.route('/api/plan')
+def api_plan():
+    """预览更新周期将执行的变更（dry run，不修改任何记录）"""
+    try:
+        return jsonify(dnsservice.plan_changes())
+    except Exception as e:
+        logging.error(f"生成变更计划失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'生成变更计划失败: {str(e)}'}), 500
+
+@app.route('/api/cycles')
+def api_cycles():
+    """最近更新周期的追踪摘要"""
+    return jsonify({'cycles': dnsservice.traces.list()})
+
+@app.route('/api/cycles/<cycle_id>')
+def api_cycle_trace(cycle_id):
+    """获取单个周期的span树；format=chrome 时下载Chrome trace文件"""
+    if request.args.get('format') == 'chrome':
+        trace = dnsservice.traces.get_chrome(cycle_id)
+        if trace is None:
+            return jsonify({'error': '周期追踪不存在'}), 404
+        return Response(
+            json.dumps(trace, ensure_ascii=False, default=str),
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment; filename=cycle-{cycle_id}.json'}
+        )
+    
+    trace = dnsservice.traces.get(cycle_id)
+    if trace is None:
+        return jsonify({'error': '周期追踪不存在'}), 404
+    return jsonify(trace)
+
+@app.route('/api/jobs')
+def api_jobs():
+    """获取最近的后台任务"""
+    return jsonify({'jobs': job_manager.list_jobs()})
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """获取后台任务状态和结果"""
+    job = job_manager.get_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/test_notification', methods=['POST'])
 def test_notification():
     """测试企业微信通知"""
@@ -304,6 +679,130 @@ def test_notification():
         logging.error(f"测试通知失败: {str(e)}")
         return jsonify({'error': f'测试通知失败: {str(e)}'}), 500
 
+@app.route('/api/notifications/stats')
+def notification_stats():
+    """获取通知队列深度和投递延迟统计"""
+    return jsonify(dnsservice.notification_manager.get_stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus指标（多worker时合并所有进程）"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def admin_required(func):
+    """管理接口鉴权：只认请求头 X-Admin-Token，必须与配置的 admin_token 一致（不接受查询参数，避免令牌进入访问日志）"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        expected = config.snapshot.admin_token
+        if not expected:
+            return jsonify({'error': '未配置admin_token，管理接口已禁用'}), 403
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8')):
+            return jsonify({'error': '管理令牌无效'}), 401
+        return func(*args, **kwargs)
+    return wrapper
+
+@app.before_request
+def start_request_profile():
+    """CPU采集目标为 web 时，用cProfile记录每个请求（未采集时只做一次判断）"""
+    if PROFILER.armed('web'):
+        g.request_profile = PROFILER.profiled('web')
+        g.request_profile.__enter__()
+
+@app.teardown_request
+def finish_request_profile(exc):
+    request_profile = g.pop('request_profile', None)
+    if request_profile is not None:
+        request_profile.__exit__(None, None, None)
+
+@app.route('/api/admin/profile/status')
+@admin_required
+def profile_status():
+    """性能分析器状态（当前worker进程）"""
+    return jsonify(PROFILER.get_status())
+
+@app.route('/api/admin/profile/cpu')
+@admin_required
+def profile_cpu():
+    """限时CPU采集
+    
+    mode=sampling（默认）：采样 target（scheduler / web / all）线程的调用栈，format=collapsed|text；
+    mode=cprofile：用cProfile记录期间开始的更新周期（target=scheduler）或Web请求（target=web），
+    format=pstats|text；trigger=1 时采集开始后立即触发一次更新周期。
+    """
+    mode = request.args.get('mode', 'sampling')
+    target = request.args.get('target', 'scheduler' if mode == 'cprofile' else 'all')
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return jsonify({'error': 'seconds 必须是数字'}), 400
+    if mode not in ('sampling', 'cprofile') or target not in ('scheduler', 'web', 'all') \
+            or (mode == 'cprofile' and target == 'all'):
+        return jsonify({'error': '不支持的 mode / target 组合'}), 400
+    
+    try:
+        if mode == 'sampling':
+            stacks, rounds = PROFILER.sample(seconds, target)
+            if request.args.get('format', 'collapsed') == 'text':
+                return Response(samples_to_text(stacks, rounds), mimetype='text/plain; charset=utf-8')
+            return Response(samples_to_collapsed(stacks), mimetype='text/plain; charset=utf-8', headers={
+                'Content-Disposition': f'attachment; filename=profile-{os.getpid()}.collapsed'
+            })
+        
+        during = None
+        if request.args.get('trigger') in ('1', 'true'):
+            def during():
+                job_manager.submit(
+                    'profile_update',
+                    lambda report_progress: dnsservice.check_and_update_ip(report_progress, trigger='profile')
+                )
+        stats = PROFILER.cprofile(seconds, target, during)
+    except ProfilerBusy:
+        return jsonify({'error': '已有CPU采集正在进行'}), 409
+    
+    if stats is None:
+        return jsonify({'error': '采集期间没有可记录的更新周期或请求'}), 404
+    if request.args.get('format', 'pstats') == 'text':
+        return Response(stats_to_text(stats, request.args.get('sort', 'cumulative')),
+                        mimetype='text/plain; charset=utf-8')
+    return Response(stats_to_bytes(stats), mimetype='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename=profile-{os.getpid()}.pstats'
+    })
+
+@app.route('/api/admin/profile/memory/start', methods=['POST'])
+@admin_required
+def profile_memory_start():
+    """开始tracemalloc跟踪并记录基线快照"""
+    try:
+        frames = max(1, min(50, int(request.args.get('frames', 10))))
+    except ValueError:
+        return jsonify({'error': 'frames 必须是整数'}), 400
+    return jsonify(dict(PROFILER.start_memory(frames), pid=os.getpid()))
+
+@app.route('/api/admin/profile/memory/diff')
+@admin_required
+def profile_memory_diff():
+    """当前内存分配与基线的差异（文本）；stop=1 时随后停止跟踪"""
+    key_type = request.args.get('key_type', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': 'key_type 只能是 lineno / filename / traceback'}), 400
+    try:
+        limit = max(1, min(500, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': 'limit 必须是整数'}), 400
+    
+    text = PROFILER.memory_diff(limit, key_type, request.args.get('stop') in ('1', 'true'))
+    if text is None:
+        return jsonify({'error': '内存跟踪未开始，请先调用 /api/admin/profile/memory/start'}), 409
+    return Response(text, mimetype='text/plain; charset=utf-8')
+
+@app.route('/api/admin/profile/memory/stop', methods=['POST'])
+@admin_required
+def profile_memory_stop():
+    """停止tracemalloc跟踪"""
+    PROFILER.stop_memory()
+    return jsonify({'success': True, 'message': '内存跟踪已停止'})
+
 @app.route('/api/test_connectivity', methods=['POST'])
 def test_connectivity():
     """测试连接性"""
@@ -338,12 +837,22 @@ def test_connectivity():
         logging.error(f"连接测试失败: {str(e)}")
         return jsonify({'success': False, 'message': f'连接测试失败: {str(e)}'}), 500
 
+@app.route('/api/logs')
+def api_logs():
+    """获取最近的日志（limit 最多500条，file=0 时只返回内存中的日志）"""
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit 必须是整数'}), 400
+    include_file_logs = request.args.get('file', '1') not in ('0', 'false')
+    logs = dnsservice.get_recent_logs(limit=limit, include_file_logs=include_file_logs)
+    return jsonify({'success': True, 'logs': logs})
+
 @app.route('/api/logs/clear', methods=['DELETE'])
 def clear_logs():
     """清空日志"""
     try:
-        dnsservice.update_history.clear()
-        dnsservice._add_log("info", "日志已清空")
+        dnsservice.clear_logs()
         return jsonify({'success': True, 'message': '日志已清空'})
     except Exception as e:
         logging.error(f"清空日志失败: {str(e)}")
@@ -358,6 +867,11 @@ def logs_page():
 def run_scheduler():
     """运行定时任务调度器"""
     while True:
+        # 到期任务实际执行时间相对计划时间的延迟
+        now = datetime.now()
+        due = [job for job in schedule.jobs if job.should_run]
+        if due:
+            metrics.SCHEDULER_LAG.set(max((now - job.next_run).total_seconds() for job in due))
         schedule.run_pending()
         time.sleep(60)
 
@@ -370,12 +884,12 @@ def init_scheduler():
     
     # 添加定时更新任务
     schedule.every(config.update_interval).seconds.do(
-        lambda: dnsservice.check_and_update_ip()
+        lambda: dnsservice.check_and_update_ip(trigger='schedule')
     )
     
     # 启动调度器线程
     if not scheduler_thread or not scheduler_thread.is_alive():
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+        scheduler_thread = threading.Thread(target=run_scheduler, name='scheduler', daemon=True)
         scheduler_thread.start()
         logging.info("定时任务调度器已启动")
 
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端更新周期基准测试
+
+针对本地替身服务（benchmarks/fake_services.py）运行真实的 DNSService 周期，
+统计不同域名数量下的周期耗时、各接口调用次数和内存峰值，结果保存为JSON以便版本间对比：
+
+    python benchmarks/bench_cycle.py [--sizes 1,10,100,1000,10000] [--latency-ms 5] [--qps 0]
+    python benchmarks/bench_cycle.py --output new.json --compare old.json
+
+每个规模执行三次周期：
+    first   约10%的记录需要修改、1%的域名需要创建
+    steady  记录已是最新，没有写入
+    memory  在tracemalloc下重复 steady 周期，记录内存峰值（不计入耗时）
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeZone, start_server  # noqa: E402
+
+DETECTED_IP = '203.0.113.10'
+STALE_IP = '198.51.100.1'
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+def build_zone(size: int, latency: float, qps: float) -> FakeZone:
+    """size 条A记录，每10条中有1条IP过期"""
+    zone = FakeZone(latency=latency, qps=qps, ipv4=DETECTED_IP)
+    for i in range(size):
+        zone.add_record(f'host{i}.example.com', 'A', STALE_IP if i % 10 == 0 else DETECTED_IP)
+    return zone
+
+def write_config(directory: str, endpoint: str, domains) -> str:
+    path = os.path.join(directory, 'config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'secret_id': 'bench',
+            'secret_key': 'bench',
+            'zone_id': 'zone-fake',
+            'edgeone_endpoint': endpoint,
+            'ipv4_enabled': True,
+            'ipv6_enabled': False,
+            'ipv4_domains': list(domains),
+            'webhook_enabled': False,
+            'control_socket': '',
+            'notification_async': False,
+            # 替身服务的限流由 --qps 控制，客户端不再限速
+            'api_rate_limit': 0
+        }, f)
+    return path
+
+def run_cycle(service, zone: FakeZone, trace_memory: bool = False) -> dict:
+    zone.reset_stats()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = service.run_once(trigger='bench', flush_timeout=0)
+    elapsed = time.perf_counter() - start
+    stats = {
+        'seconds': round(elapsed, 4),
+        'success': bool(result.get('success')),
+        'api_calls': {k: v for k, v in sorted(zone.calls.items()) if not k.startswith('GET ')},
+        'api_calls_total': sum(v for k, v in zone.calls.items() if not k.startswith('GET ')),
+        'detect_calls': sum(v for k, v in zone.calls.items() if k.startswith('GET ')),
+        'errors': dict(zone.errors),
+        'failed_records': sum(1 for r in result.get('results', []) if not r.get('success'))
+    }
+    if trace_memory:
+        stats['peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return stats
+
+def run_scenario(size: int, latency: float, qps: float) -> dict:
+    from config import Config
+    from ddns_service import DNSService
+    
+    zone = build_zone(size, latency, qps)
+    server, url = start_server(zone)
+    os.environ['DDNS_IPV4_DETECT_URLS'] = f'{url}/ipv4'
+    # 另有1%的域名在Zone中不存在，需要创建
+    domains = [f'host{i}.example.com' for i in range(size)] + [f'new{i}.example.com' for i in range(size // 100)]
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            config = Config(write_config(directory, url, domains))
+            config.load()
+            service = DNSService(config)
+            scenario = {
+                'domains': len(domains),
+                'first': run_cycle(service, zone),
+                'steady': run_cycle(service, zone)
+            }
+            scenario['memory'] = {'peak_kib': run_cycle(service, zone, trace_memory=True)['peak_kib']}
+            return scenario
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def compare(report: dict, baseline: dict, threshold: float) -> bool:
+    """打印与基线的对比，返回是否存在超过阈值的退化"""
+    previous = {s['domains']: s for s in baseline.get('scenarios', [])}
+    regressed = False
+    print(f"\n对比基线 {baseline.get('meta', {}).get('commit') or '-'}（阈值 {threshold:.0%}）")
+    print(f"{'域名数':>8} {'指标':<18} {'基线':>10} {'当前':>10} {'变化':>8}")
+    for scenario in report['scenarios']:
+        old = previous.get(scenario['domains'])
+        if not old:
+            continue
+        for label, path in (('first.seconds', ('first', 'seconds')),
+                            ('steady.seconds', ('steady', 'seconds')),
+                            ('first.api_calls', ('first', 'api_calls_total')),
+                            ('steady.api_calls', ('steady', 'api_calls_total')),
+                            ('memory.peak_kib', ('memory', 'peak_kib'))):
+            before = old[path[0]][path[1]]
+            after = scenario[path[0]][path[1]]
+            change = (after - before) / before if before else 0.0
+            flag = ''
+            if change > threshold:
+                regressed = True
+                flag = ' !'
+            print(f"{scenario['domains']:>8} {label:<18} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+    return regressed
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='端到端更新周期基准测试')
+    parser.add_argument('--sizes', default='1,10,100,1000,10000', help='逗号分隔的域名数量')
+    parser.add_argument('--latency-ms', type=float, default=0, help='替身服务每个请求的延迟（毫秒）')
+    parser.add_argument('--qps', type=float, default=0, help='替身API限流（每秒请求数），0表示不限流')
+    parser.add_argument('--output', help='结果JSON文件路径（默认 benchmarks/results/cycle-<commit>.json）')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定退化的相对变化阈值')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出服务日志')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency_ms': args.latency_ms,
+            'qps': args.qps
+        },
+        'scenarios': []
+    }
+    
+    print(f"{'域名数':>8} {'first(s)':>9} {'API调用':>8} {'steady(s)':>10} {'API调用':>8} {'内存峰值(KiB)':>14} {'失败':>5}")
+    for size in sizes:
+        scenario = run_scenario(size, args.latency_ms / 1000, args.qps)
+        report['scenarios'].append(scenario)
+        first, steady = scenario['first'], scenario['steady']
+        print(f"{scenario['domains']:>8} {first['seconds']:>9} {first['api_calls_total']:>8} "
+              f"{steady['seconds']:>10} {steady['api_calls_total']:>8} {scenario['memory']['peak_kib']:>14} "
+              f"{first['failed_records'] + steady['failed_records']:>5}")
+    
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"cycle-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存: {output}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更计划计算基准测试
+
+构造一个包含 N 条记录的Zone快照（默认10000条），对不同规模的期望状态计算变更计划，
+并统计执行计划所需的API调用次数（对比逐域名查找+修改的旧方式）。
+
+    python benchmarks/bench_plan.py [--records 10000] [--repeat 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reconciler import (MODIFY_BATCH_SIZE, NAME_FILTER_CHUNK, ZoneSnapshot,  # noqa: E402
+                        compute_plan, desired_state)
+
+def build_zone(record_count: int):
+    """生成Zone记录：一半A记录、一半AAAA记录"""
+    records = []
+    for i in range(record_count):
+        record_type = 'A' if i % 2 == 0 else 'AAAA'
+        records.append({
+            'RecordId': f'record-{i}',
+            'Name': f'host{i // 2}.example.com',
+            'Type': record_type,
+            'Content': f'10.0.{(i // 256) % 256}.{i % 256}' if record_type == 'A' else f'2001:db8::{i:x}',
+            'TTL': 300
+        })
+    return records
+
+def timed(func, repeat: int) -> float:
+    """返回多次执行中的最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='变更计划计算基准测试')
+    parser.add_argument('--records', type=int, default=10000, help='Zone中的记录数')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数（取最短耗时）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = parser.parse_args()
+    
+    random.seed(42)
+    records = build_zone(args.records)
+    snapshot_ms = timed(lambda: ZoneSnapshot(records), args.repeat)
+    snapshot = ZoneSnapshot(records)
+    
+    hosts = [f'host{i}.example.com' for i in range(args.records // 2)]
+    results = []
+    for size in sorted({size for size in (10, 100, 1000, len(hosts)) if size <= len(hosts)}):
+        # 约10%的域名IP变化，另有少量域名在Zone中不存在
+        domains = random.sample(hosts, size) + [f'new{i}.example.com' for i in range(max(1, size // 100))]
+        changed = set(random.sample(domains, max(1, size // 10)))
+        desired = []
+        for domain in domains:
+            record = snapshot.get(domain, 'A')
+            ip_address = record['Content'] if record and domain not in changed else '203.0.113.1'
+            desired.append((domain, 'A', ip_address))
+        
+        plan_ms = timed(lambda: compute_plan(desired, snapshot), args.repeat)
+        plan = compute_plan(desired, snapshot)
+        counts = plan.counts
+        
+        # API调用次数：旧方式每个域名一次查询，加上每条变更一次写入
+        legacy_calls = len(domains) + counts['modify'] + counts['create']
+        planned_calls = (-(-len(domains) // NAME_FILTER_CHUNK)
+                         + -(-counts['modify'] // MODIFY_BATCH_SIZE)
+                         + counts['create'])
+        results.append({
+            'domains': len(domains),
+            'plan_ms': round(plan_ms, 3),
+            'counts': counts,
+            'api_calls_legacy': legacy_calls,
+            'api_calls_planned': planned_calls
+        })
+    
+    report = {
+        'zone_records': args.records,
+        'snapshot_build_ms': round(snapshot_ms, 3),
+        'desired_state_ms': round(timed(lambda: desired_state({'A': hosts, 'AAAA': hosts},
+                                                              {'A': '203.0.113.1', 'AAAA': '2001:db8::1'}),
+                                        args.repeat), 3),
+        'plans': results
+    }
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    
+    print(f"Zone记录数: {report['zone_records']}, 构建快照: {report['snapshot_build_ms']}ms, "
+          f"生成期望状态({len(hosts) * 2}条): {report['desired_state_ms']}ms")
+    print(f"{'域名数':>8} {'计算耗时(ms)':>12} {'create':>7} {'modify':>7} {'noop':>7} {'API调用(旧)':>11} {'API调用(计划)':>13}")
+    for row in results:
+        c = row['counts']
+        print(f"{row['domains']:>8} {row['plan_ms']:>12} {c['create']:>7} {c['modify']:>7} {c['noop']:>7} "
+              f"{row['api_calls_legacy']:>11} {row['api_calls_planned']:>13}")
+
+if __name__ == '__main__':
+    main()
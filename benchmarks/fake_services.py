@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地替身服务 - 模拟EdgeOne（TEO 2022-09-01）DNS记录接口和公网IP检测服务
+
+同一个HTTP服务同时提供：
+    POST /            TEO API（按 X-TC-Action 分发，不校验签名）
+    GET  /ipv4        返回纯文本IPv4地址
+    GET  /ipv6        返回纯文本IPv6地址
+
+可配置每个请求的延迟、API限流（每秒请求数，超出时返回 RequestLimitExceeded）和初始Zone大小。
+单独运行时作为常驻服务：
+
+    python benchmarks/fake_services.py --port 9000 --zone-size 1000 --latency-ms 20 --qps 50
+    EDGEONE_API_ENDPOINT=http://127.0.0.1:9000 DDNS_IPV4_DETECT_URLS=http://127.0.0.1:9000/ipv4 python -m edgeone_ddns once
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+class FakeZone:
+    """内存中的Zone记录及接口调用统计"""
+    
+    def __init__(self, zone_size: int = 0, latency: float = 0.0, qps: float = 0.0,
+                 ipv4: str = '203.0.113.10', ipv6: str = '2001:db8::10'):
+        self.latency = latency
+        self.qps = qps
+        self.ipv4 = ipv4
+        self.ipv6 = ipv6
+        self.records: Dict[str, Dict] = {}
+        # 域名 -> 记录ID列表，按名称过滤时不必扫描整个Zone
+        self._by_name: Dict[str, List[str]] = {}
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        # 令牌桶限流
+        self._tokens = qps
+        self._refilled = time.monotonic()
+        self.populate(zone_size)
+    
+    def populate(self, count: int, content: str = '198.51.100.1', prefix: str = 'host', domain: str = 'example.com'):
+        """添加 count 条A记录：host0.example.com ..."""
+        with self._lock:
+            for i in range(count):
+                self._add(f'{prefix}{i}.{domain}', 'A', content, 300)
+    
+    def add_record(self, name: str, record_type: str, content: str, ttl: int = 300) -> str:
+        with self._lock:
+            return self._add(name, record_type, content, ttl)
+    
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+    
+    def _add(self, name: str, record_type: str, content: str, ttl: int) -> str:
+        self._next_id += 1
+        record_id = f'record-{self._next_id}'
+        self.records[record_id] = {
+            'ZoneId': 'zone-fake',
+            'RecordId': record_id,
+            'Name': name,
+            'Type': record_type,
+            'Location': 'Default',
+            'Content': content,
+            'TTL': ttl,
+            'Status': 'enable'
+        }
+        self._by_name.setdefault(name, []).append(record_id)
+        return record_id
+    
+    def _throttled(self) -> bool:
+        if self.qps <= 0:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.qps, self._tokens + (now - self._refilled) * self.qps)
+        self._refilled = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+    
+    def handle(self, action: str, params: Dict) -> Tuple[Dict, Optional[Tuple[str, str]]]:
+        """处理一次API调用，返回 (响应字段, (错误码, 错误信息) 或 None)"""
+        with self._lock:
+            self.calls[action] += 1
+            if self._throttled():
+                self.errors['RequestLimitExceeded'] += 1
+                return {}, ('RequestLimitExceeded', '请求频率超过限制')
+            handler = getattr(self, f'_action_{action}', None)
+            if handler is None:
+                self.errors['InvalidAction'] += 1
+                return {}, ('InvalidAction', f'不支持的接口 {action}')
+            try:
+                return handler(params), None
+            except KeyError as e:
+                self.errors['InvalidParameter'] += 1
+                return {}, ('InvalidParameter', f'缺少参数 {e}')
+    
+    def _action_DescribeDnsRecords(self, params: Dict) -> Dict:
+        names = types = None
+        for item in params.get('Filters') or []:
+            if item['Name'] == 'name':
+                names = list(dict.fromkeys(item['Values']))
+            elif item['Name'] == 'type':
+                types = set(item['Values'])
+        if names is None:
+            candidates = self.records.values()
+        else:
+            candidates = [self.records[record_id] for name in names for record_id in self._by_name.get(name, ())]
+        matched = [record for record in candidates if types is None or record['Type'] in types]
+        offset = int(params.get('Offset', 0))
+        limit = int(params.get('Limit', 20))
+        return {'TotalCount': len(matched), 'DnsRecords': [dict(r) for r in matched[offset:offset + limit]]}
+    
+    def _action_CreateDnsRecord(self, params: Dict) -> Dict:
+        record_id = self._add(params['Name'], params['Type'], params['Content'], int(params.get('TTL', 300)))
+        return {'RecordId': record_id}
+    
+    def _action_ModifyDnsRecords(self, params: Dict) -> Dict:
+        for item in params['DnsRecords']:
+            record = self.records[item['RecordId']]
+            record['Content'] = item.get('Content', record['Content'])
+            record['TTL'] = item.get('TTL', item.get('Ttl', record['TTL']))
+        return {}
+    
+    def _action_DeleteDnsRecord(self, params: Dict) -> Dict:
+        record = self.records.pop(params['RecordId'])
+        self._by_name[record['Name']].remove(record['RecordId'])
+        return {}
+
+class _Handler(BaseHTTPRequestHandler):
+    zone: FakeZone = None
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，避免Nagle算法与延迟ACK叠加出约40ms的额外延迟
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _reply(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.zone.latency:
+            time.sleep(self.zone.latency)
+        with self.zone._lock:
+            self.zone.calls[f'GET {self.path}'] += 1
+        if self.path == '/ipv4':
+            self._reply(200, self.zone.ipv4.encode(), 'text/plain')
+        elif self.path == '/ipv6':
+            self._reply(200, self.zone.ipv6.encode(), 'text/plain')
+        else:
+            self._reply(404, b'not found', 'text/plain')
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            params = {}
+        if self.zone.latency:
+            time.sleep(self.zone.latency)
+        data, error = self.zone.handle(self.headers.get('X-TC-Action', ''), params)
+        data['RequestId'] = str(uuid.uuid4())
+        if error:
+            data['Error'] = {'Code': error[0], 'Message': error[1]}
+        self._reply(200, json.dumps({'Response': data}).encode('utf-8'), 'application/json')
+
+def start_server(zone: FakeZone, host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """在后台线程中启动替身服务，返回 (server, 基础URL)；port=0 时自动分配端口"""
+    handler = type('FakeHandler', (_Handler,), {'zone': zone})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='fake-services', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+def main():
+    parser = argparse.ArgumentParser(description='EdgeOne API / IP检测服务本地替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--zone-size', type=int, default=100, help='初始A记录数')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个请求的额外延迟（毫秒）')
+    parser.add_argument('--qps', type=float, default=0, help='API每秒请求数上限，0表示不限流')
+    parser.add_argument('--ipv4', default='203.0.113.10')
+    parser.add_argument('--ipv6', default='2001:db8::10')
+    args = parser.parse_args()
+    
+    zone = FakeZone(args.zone_size, args.latency_ms / 1000, args.qps, args.ipv4, args.ipv6)
+    server, url = start_server(zone, args.host, args.port)
+    print(f"替身服务已启动: {url}  (API: {url}/  IPv4: {url}/ipv4  IPv6: {url}/ipv6)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"API调用: {dict(zone.calls)}  错误: {dict(zone.errors)}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web API 压力测试
+
+启动本地替身服务（benchmarks/fake_services.py）和一个指向它们的应用实例，或者直接对已运行的实例（--url），
+并发请求 /api/status、/api/logs、/api/config，统计各接口的延迟分位数和吞吐量。
+压测期间按 --cycle-interval 持续触发更新周期，让调度线程与Web线程同时读写服务状态：
+
+    python benchmarks/load_api.py --duration 20 --concurrency 32
+    python benchmarks/load_api.py --server gunicorn --workers 2 --threads 16
+    python benchmarks/load_api.py --url http://127.0.0.1:4646 --mix status=6,logs=3,config=1
+
+--mix 中可以加入 config_post（把读取到的配置原样提交回去），会写配置文件并触发配置重新应用，
+对已运行的实例使用前请确认。
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 名称 -> (方法, 路径)
+ENDPOINTS = {
+    'status': ('GET', '/api/status'),
+    'logs': ('GET', '/api/logs?limit=50'),
+    'config': ('GET', '/api/config'),
+    'config_post': ('POST', '/api/config')
+}
+
+class Recorder:
+    """单个压测线程的结果，压测结束后再合并，记录时不需要加锁"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Counter] = {}
+        self.errors: Counter = Counter()
+    
+    def add(self, name: str, seconds: float, status: int):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.statuses.setdefault(name, Counter())[status] += 1
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"未知接口: {name}（可选: {', '.join(ENDPOINTS)}）")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+def worker(base_url: str, mix: List[Tuple[str, float]], start_at: float, stop_at: float,
+           use_etag: bool, config_body: Optional[Dict], seed: int, recorder: Recorder):
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    session = requests.Session()
+    etag = None
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            break
+        name = rng.choices(names, weights)[0]
+        method, path = ENDPOINTS[name]
+        headers = {}
+        if name == 'status' and use_etag and etag:
+            headers['If-None-Match'] = etag
+        try:
+            response = session.request(method, base_url + path, headers=headers, timeout=30,
+                                       json=config_body if method == 'POST' else None)
+            response.content
+        except requests.RequestException as e:
+            # 预热期间的错误同样记录，卡住的请求（例如死锁）会以超时的形式出现
+            recorder.errors[f'{name}: {type(e).__name__}'] += 1
+            continue
+        elapsed = time.perf_counter() - now
+        if name == 'status' and response.headers.get('ETag'):
+            etag = response.headers['ETag']
+        # 预热期间的请求不计入结果
+        if now >= start_at:
+            recorder.add(name, elapsed, response.status_code)
+    session.close()
+
+def trigger_cycles(base_url: str, interval: float, stop: threading.Event, counts: Counter):
+    """定期提交手动更新，让更新周期与压测请求并发执行"""
+    session = requests.Session()
+    while not stop.wait(interval):
+        try:
+            response = session.post(base_url + '/api/manual_update', timeout=10)
+            counts['submitted' if response.status_code == 202 else f'http {response.status_code}'] += 1
+        except requests.RequestException as e:
+            counts[type(e).__name__] += 1
+    session.close()
+
+def run_load(base_url: str, args) -> Dict:
+    mix = parse_mix(args.mix)
+    config_body = None
+    if any(name == 'config_post' for name, _ in mix):
+        config_body = requests.get(base_url + '/api/config', timeout=10).json()
+    
+    recorders = [Recorder() for _ in range(args.concurrency)]
+    start_at = time.perf_counter() + args.warmup
+    stop_at = start_at + args.duration
+    threads = [
+        threading.Thread(target=worker, name=f'load-{i}', daemon=True,
+                         args=(base_url, mix, start_at, stop_at, not args.no_etag, config_body, args.seed + i, recorder))
+        for i, recorder in enumerate(recorders)
+    ]
+    stop = threading.Event()
+    cycles: Counter = Counter()
+    cycle_thread = None
+    if args.cycle_interval > 0:
+        cycle_thread = threading.Thread(target=trigger_cycles, name='load-cycles', daemon=True,
+                                        args=(base_url, args.cycle_interval, stop, cycles))
+        cycle_thread.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    if cycle_thread:
+        cycle_thread.join()
+    
+    endpoints = {}
+    total = 0
+    for name, _ in mix:
+        latencies = sorted(value for recorder in recorders for value in recorder.latencies.get(name, ()))
+        statuses = Counter()
+        for recorder in recorders:
+            statuses.update(recorder.statuses.get(name, {}))
+        total += len(latencies)
+        endpoints[name] = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / args.duration, 1),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 0.90) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+        }
+    errors = Counter()
+    for recorder in recorders:
+        errors.update(recorder.errors)
+    return {
+        'url': base_url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'requests': total,
+        'rps': round(total / args.duration, 1),
+        'endpoints': endpoints,
+        'errors': dict(errors),
+        'cycles': dict(cycles)
+    }
+
+# ---- 被测实例 ----
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def serve(port: int):
+    """--serve：在当前进程中用werkzeug多线程服务器运行应用（由父进程启动）"""
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    import app as application
+    
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', port, application.app, threaded=True).serve_forever()
+
+def start_instance(args, directory: str) -> Tuple[subprocess.Popen, str, object]:
+    """启动替身服务和应用实例，返回 (进程, 应用URL, 替身服务)"""
+    from fake_services import FakeZone, start_server
+    
+    zone = FakeZone(latency=args.backend_latency_ms / 1000)
+    domains = [f'host{i}.example.com' for i in range(args.domains)]
+    for domain in domains:
+        zone.add_record(domain, 'A', '198.51.100.1')
+    backend, backend_url = start_server(zone)
+    
+    config_path = os.path.join(directory, 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'secret_id': 'load',
+            'secret_key': 'load',
+            'zone_id': 'zone-fake',
+            'edgeone_endpoint': backend_url,
+            'ipv4_enabled': True,
+            'ipv4_domains': domains,
+            'update_interval': 300,
+            'webhook_enabled': False,
+            'control_socket': ''
+        }, f)
+    
+    port = free_port()
+    env = dict(os.environ, CONFIG_FILE_PATH=config_path, DDNS_IPV4_DETECT_URLS=f'{backend_url}/ipv4',
+               DDNS_METRICS_DIR=os.path.join(directory, 'metrics'),
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+                   '--worker-class', args.worker_class, '--threads', str(args.threads),
+                   '--timeout', '60', 'app:app']
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', str(port)]
+    log = open(os.path.join(directory, 'server.log'), 'wb')
+    process = subprocess.Popen(command, cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            backend.shutdown()
+            raise SystemExit(f"应用实例启动失败，见 {os.path.join(directory, 'server.log')}")
+        try:
+            requests.get(url + '/api/status', timeout=1)
+            return process, url, backend
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    backend.shutdown()
+    raise SystemExit("等待应用实例启动超时")
+
+def print_report(report: Dict):
+    print(f"\n{report['url']}  并发 {report['concurrency']}  {report['duration']:g}s  "
+          f"共 {report['requests']} 次请求，{report['rps']} req/s")
+    print(f"{'接口':<12} {'请求数':>8} {'req/s':>8} {'p50(ms)':>9} {'p90(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9}  状态码")
+    for name, stats in report['endpoints'].items():
+        statuses = ' '.join(f'{code}×{count}' for code, count in stats['statuses'].items())
+        print(f"{name:<12} {stats['requests']:>8} {stats['rps']:>8} {stats['p50_ms']:>9} {stats['p90_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['max_ms']:>9}  {statuses}")
+    if report['errors']:
+        print(f"请求错误: {report['errors']}")
+    if report['cycles']:
+        print(f"压测期间触发的更新周期: {report['cycles']}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Web API 压力测试')
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help='已运行实例的地址；不指定时启动本地实例和替身服务')
+    parser.add_argument('--server', choices=('werkzeug', 'gunicorn'), default='werkzeug', help='本地实例的服务器')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker数')
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker类型（生产镜像使用gthread）')
+    parser.add_argument('--threads', type=int, default=4, help='gthread worker的线程数')
+    parser.add_argument('--domains', type=int, default=20, help='本地实例管理的域名数量')
+    parser.add_argument('--backend-latency-ms', type=float, default=5, help='替身服务每个请求的延迟（毫秒）')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发请求线程数')
+    parser.add_argument('--duration', type=float, default=10, help='计入结果的压测时长（秒）')
+    parser.add_argument('--warmup', type=float, default=2, help='预热时长（秒），期间的请求不计入结果')
+    parser.add_argument('--mix', default='status=6,logs=3,config=1', help='接口权重 名称=权重,...')
+    parser.add_argument('--no-etag', action='store_true', help='请求 /api/status 时不携带 If-None-Match')
+    parser.add_argument('--cycle-interval', type=float, help='每隔多少秒触发一次更新周期（本地实例默认1，--url 时默认不触发）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve(args.serve)
+        return 0
+    
+    if args.cycle_interval is None:
+        args.cycle_interval = 0 if args.url else 1.0
+    
+    if args.url:
+        report = run_load(args.url.rstrip('/'), args)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            process, url, backend = start_instance(args, directory)
+            try:
+                report = run_load(url, args)
+                report['server'] = args.server if args.server == 'werkzeug' else \
+                    f'gunicorn {args.worker_class} x{args.workers}'
+                report['backend_calls'] = dict(backend.RequestHandlerClass.zone.calls)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+                backend.shutdown()
+                backend.server_close()
+    
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if report['errors'] or not report['requests'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
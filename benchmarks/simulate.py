@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调度与检测策略模拟器
+
+用虚拟时钟驱动真实的 DNSService，输入公网IP变化轨迹和检测服务故障轨迹（录制的或随机生成的），
+对每组策略（轮询间隔、检测对冲延迟、强制对账间隔、通知合并窗口）统计：
+检测延迟、DNS记录过期时长、API调用次数和发送的Webhook数。
+
+    python benchmarks/simulate.py --days 30 --intervals 60,300 --force-reconcile 0,3600 --coalesce 0,600
+    python benchmarks/simulate.py --ip-trace ips.jsonl --failure-trace outages.jsonl --json result.json
+
+轨迹文件为JSON Lines：
+    IP变化   {"t": 3600, "ip": "203.0.113.7"}     t 为相对开始的秒数，也可以用 "time": ISO时间
+    服务故障 {"service": "svc-a", "start": 7200, "end": 8100}
+
+对冲延迟 hedge_delay > 0 表示前一个检测服务在该时间内未返回时并行请求下一个服务；
+0 表示按顺序回退（与 IPDetector 当前行为一致）。
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAY = 86400
+
+class VirtualClock:
+    """模拟时间（秒）"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+
+class Timeline:
+    """分段常量的时间序列：[(开始时间, 值), ...]"""
+    
+    def __init__(self, points: List[Tuple[float, str]]):
+        points = sorted(points)
+        self.times = [t for t, _ in points]
+        self.values = [v for _, v in points]
+    
+    def at(self, t: float) -> Optional[str]:
+        index = bisect.bisect_right(self.times, t) - 1
+        return self.values[index] if index >= 0 else None
+
+class ServiceModel:
+    """一个检测服务：固定响应时间，故障窗口内请求失败"""
+    
+    def __init__(self, name: str, latency: float):
+        self.name = name
+        self.latency = latency
+        self.outages: List[Tuple[float, float]] = []
+    
+    def available(self, t: float) -> bool:
+        index = bisect.bisect_right(self.outages, (t, float('inf'))) - 1
+        return index < 0 or not (self.outages[index][0] <= t < self.outages[index][1])
+
+class SimDetector:
+    """替代 IPDetector：按服务模型计算检测耗时并推进虚拟时钟"""
+    
+    def __init__(self, clock: VirtualClock, ips: Timeline, services: List[ServiceModel],
+                 hedge_delay: float, failure_cost: float):
+        self.clock = clock
+        self.ips = ips
+        self.services = services
+        self.hedge_delay = hedge_delay
+        self.failure_cost = failure_cost
+        self.requests = 0
+        # 每次检测的耗时
+        self.durations: List[float] = []
+        # (返回时间, IP或None)
+        self.detections: List[Tuple[float, Optional[str]]] = []
+    
+    def _detect(self) -> Optional[float]:
+        """返回本次检测的耗时，所有服务都失败时返回 None（时钟已推进到放弃时）"""
+        start = self.clock.now
+        best = None
+        launch = 0.0
+        give_up = 0.0
+        for service in self.services:
+            if best is not None and launch >= best:
+                break
+            self.requests += 1
+            ok = service.available(start + launch)
+            finish = launch + (service.latency if ok else self.failure_cost)
+            give_up = max(give_up, finish)
+            if ok:
+                best = finish if best is None else min(best, finish)
+            # 下一个服务：对冲时在 hedge_delay 后启动，否则等当前服务失败后启动
+            if ok and self.hedge_delay <= 0:
+                break
+            launch = min(launch + self.hedge_delay, finish) if self.hedge_delay > 0 else finish
+        elapsed = best if best is not None else give_up
+        self.durations.append(elapsed)
+        self.clock.advance(elapsed)
+        return best
+    
+    def get_all_ips(self, ipv4_enabled: bool = True, ipv6_enabled: bool = False) -> dict:
+        elapsed = self._detect()
+        ip = self.ips.at(self.clock.now) if elapsed is not None else None
+        self.detections.append((self.clock.now, ip))
+        return {'local_ip': '127.0.0.1', 'timestamp': int(self.clock.now), 'ipv4': ip, 'public_ip': ip}
+
+class SimClient:
+    """替代 EdgeOneClient：内存中的记录，每次调用推进虚拟时钟"""
+    
+    def __init__(self, clock: VirtualClock, domains: List[str], initial_ip: str, api_latency: float):
+        self.clock = clock
+        self.api_latency = api_latency
+        self.calls: Dict[str, int] = {}
+        self.records = {
+            f'record-{i}': {'RecordId': f'record-{i}', 'Name': domain, 'Type': 'A', 'Content': initial_ip, 'TTL': 300}
+            for i, domain in enumerate(domains)
+        }
+        # 域名 -> [(时间, 内容)]
+        self.history: Dict[str, List[Tuple[float, str]]] = {domain: [(0.0, initial_ip)] for domain in domains}
+    
+    def _call(self, action: str):
+        self.calls[action] = self.calls.get(action, 0) + 1
+        self.clock.advance(self.api_latency)
+    
+    def describe_dns_records(self, zone_id: str, filters: list = None, limit: int = 1000, offset: int = 0) -> dict:
+        self._call('DescribeDnsRecords')
+        names = set(filters[0]['Values']) if filters else None
+        matched = [dict(r) for r in self.records.values() if names is None or r['Name'] in names]
+        return {'TotalCount': len(matched), 'DnsRecords': matched[offset:offset + limit]}
+    
+    def modify_dns_records(self, zone_id: str, records: list) -> dict:
+        self._call('ModifyDnsRecords')
+        for item in records:
+            self.records[item['RecordId']]['Content'] = item['Content']
+            self.history[item['Name']].append((self.clock.now, item['Content']))
+        return {}
+    
+    def create_dns_record(self, zone_id: str, name: str, record_type: str, content: str, ttl: int = 300) -> dict:
+        self._call('CreateDnsRecord')
+        record_id = f'record-{len(self.records)}'
+        self.records[record_id] = {'RecordId': record_id, 'Name': name, 'Type': record_type, 'Content': content}
+        self.history.setdefault(name, []).append((self.clock.now, content))
+        return {'RecordId': record_id}
+
+# ---- 轨迹 ----
+
+def _offset(item: Dict, key: str, origin: Optional[datetime]) -> float:
+    if key in item:
+        return float(item[key])
+    moment = datetime.fromisoformat(item['time'])
+    return (moment - origin).total_seconds() if origin else 0.0
+
+def load_ip_trace(path: str) -> List[Tuple[float, str]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    timed = [datetime.fromisoformat(item['time']) for item in items if 't' not in item]
+    origin = min(timed) if timed else None
+    return sorted((_offset(item, 't', origin), item['ip']) for item in items)
+
+def load_failure_trace(path: str, services: List[ServiceModel]):
+    by_name = {service.name: service for service in services}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            service = services[item['service']] if isinstance(item['service'], int) else by_name[item['service']]
+            service.outages.append((float(item['start']), float(item['end'])))
+    for service in services:
+        service.outages.sort()
+
+def synthetic_ip_trace(rng: random.Random, duration: float, changes_per_day: float) -> List[Tuple[float, str]]:
+    """泊松过程的IP变化"""
+    points = [(0.0, '203.0.113.1')]
+    t = 0.0
+    while changes_per_day > 0:
+        t += rng.expovariate(changes_per_day / DAY)
+        if t >= duration:
+            break
+        points.append((t, f'203.0.{rng.randint(114, 250)}.{rng.randint(1, 254)}'))
+    return points
+
+def synthetic_outages(rng: random.Random, duration: float, services: List[ServiceModel],
+                      outages_per_day: float, outage_minutes: float):
+    t = 0.0
+    while outages_per_day > 0:
+        t += rng.expovariate(outages_per_day / DAY)
+        if t >= duration:
+            break
+        rng.choice(services).outages.append((t, t + rng.expovariate(1 / (outage_minutes * 60))))
+    for service in services:
+        service.outages.sort()
+
+# ---- 统计 ----
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def summarize(values: List[float]) -> Dict:
+    return {
+        'mean': round(statistics.fmean(values), 1) if values else 0.0,
+        'p50': round(percentile(values, 0.5), 1),
+        'p95': round(percentile(values, 0.95), 1),
+        'max': round(max(values), 1) if values else 0.0
+    }
+
+def detection_lags(changes: List[Tuple[float, str]], detections: List[Tuple[float, Optional[str]]]):
+    """每次IP变化到首次检测到新IP的时间；在下一次变化前都没有检测到的计为 missed"""
+    lags, missed = [], 0
+    times = [t for t, _ in detections]
+    for index, (changed_at, ip) in enumerate(changes[1:], start=1):
+        until = changes[index + 1][0] if index + 1 < len(changes) else float('inf')
+        position = bisect.bisect_left(times, changed_at)
+        while position < len(detections) and detections[position][0] < until:
+            if detections[position][1] == ip:
+                lags.append(detections[position][0] - changed_at)
+                break
+            position += 1
+        else:
+            missed += 1
+    return lags, missed
+
+def staleness(changes: List[Tuple[float, str]], history: List[Tuple[float, str]], duration: float):
+    """每次IP变化后DNS记录仍为旧值的时长，以及整个模拟期间记录与实际IP不一致的总时长"""
+    actual = Timeline(changes)
+    record = Timeline(history)
+    per_change = []
+    for index, (changed_at, ip) in enumerate(changes[1:], start=1):
+        until = changes[index + 1][0] if index + 1 < len(changes) else duration
+        position = bisect.bisect_left(record.times, changed_at)
+        fixed = until
+        if record.at(changed_at) == ip:
+            fixed = changed_at
+        else:
+            while position < len(record.times) and record.times[position] < until:
+                if record.values[position] == ip:
+                    fixed = record.times[position]
+                    break
+                position += 1
+        per_change.append(fixed - changed_at)
+    
+    # 在所有变化点上扫描得到不一致的总时长
+    boundaries = sorted({0.0, duration, *actual.times, *record.times})
+    stale_total = 0.0
+    for start, end in zip(boundaries, boundaries[1:]):
+        if start >= duration:
+            break
+        if actual.at(start) != record.at(start):
+            stale_total += min(end, duration) - start
+    return per_change, stale_total
+
+# ---- 模拟 ----
+
+def build_services(args) -> List[ServiceModel]:
+    """检测服务及其故障窗口；随机故障使用固定种子，每组策略面对相同的故障"""
+    services = parse_services(args.services)
+    if args.failure_trace:
+        load_failure_trace(args.failure_trace, services)
+    else:
+        synthetic_outages(random.Random(args.seed + 1), args.duration, services,
+                          args.outages_per_day, args.outage_minutes)
+    return services
+
+def simulate(policy: Dict, changes: List[Tuple[float, str]], services: List[ServiceModel],
+             args, config_path: str) -> Dict:
+    from config import Config
+    from ddns_service import DNSService
+    
+    clock = VirtualClock()
+    domains = [f'host{i}.example.com' for i in range(args.domains)]
+    config = Config(config_path)
+    config.load()
+    config.data['force_reconcile_interval'] = policy['force_reconcile']
+    config._snapshot = None
+    
+    service = DNSService(config)
+    service.clock = clock
+    service.ip_detector = SimDetector(clock, Timeline(changes), services, policy['hedge_delay'], args.failure_cost)
+    service.edgeone_client = SimClient(clock, domains, changes[0][1], args.api_latency)
+    service.is_running = True
+    cfg = config.snapshot
+    service._configure_notifications(cfg)
+    manager = service.notification_manager
+    manager.set_coalesce_window(policy['coalesce'], clock=clock, use_timer=False)
+    
+    webhooks = {'count': 0}
+    
+    def deliver(delivery: Dict) -> bool:
+        webhooks['count'] += len(delivery.get('requests') or [delivery])
+        return True
+    
+    manager._deliver = deliver
+    
+    cycles = 0
+    wall_start = time.perf_counter()
+    while clock.now < args.duration:
+        if manager.coalescer:
+            manager.coalescer.flush_due()
+        service.check_and_update_ip(trigger='schedule')
+        cycles += 1
+        # schedule 库在任务完成后按间隔计算下一次执行时间
+        clock.advance(policy['interval'])
+    if manager.coalescer:
+        manager.coalescer.flush()
+    wall = time.perf_counter() - wall_start
+    
+    detector = service.ip_detector
+    client = service.edgeone_client
+    lags, missed = detection_lags(changes, detector.detections)
+    per_change, stale_total = staleness(changes, client.history[domains[0]], args.duration)
+    return {
+        'policy': policy,
+        'cycles': cycles,
+        'reconcile_skipped': service.cycle_stats['reconcile_skipped'],
+        'ip_changes': len(changes) - 1,
+        'detection_lag_s': summarize(lags),
+        'missed_changes': missed,
+        'detect_seconds': summarize(detector.durations),
+        'staleness_s': summarize(per_change),
+        'stale_fraction': round(stale_total / args.duration, 6),
+        'api_calls': dict(sorted(client.calls.items())),
+        'api_calls_total': sum(client.calls.values()),
+        'detect_requests': detector.requests,
+        'webhooks': webhooks['count'],
+        'wall_seconds': round(wall, 2)
+    }
+
+def run_policy(task: Tuple) -> Dict:
+    """进程池入口"""
+    policy, changes, args, config_path = task
+    logging.disable(logging.CRITICAL)
+    return simulate(policy, changes, build_services(args), args, config_path)
+
+def parse_list(value: str, cast=float) -> List:
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+def parse_services(value: str) -> List[ServiceModel]:
+    services = []
+    for item in value.split(','):
+        name, _, latency = item.partition(':')
+        services.append(ServiceModel(name.strip(), float(latency or 0.5)))
+    return services
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='调度与检测策略模拟器')
+    parser.add_argument('--days', type=float, default=30, help='模拟天数（使用IP轨迹文件时默认覆盖到最后一次变化）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--domains', type=int, default=3, help='域名数量')
+    parser.add_argument('--ip-trace', help='IP变化轨迹文件（JSON Lines）')
+    parser.add_argument('--failure-trace', help='检测服务故障轨迹文件（JSON Lines）')
+    parser.add_argument('--changes-per-day', type=float, default=1.0, help='随机IP变化频率')
+    parser.add_argument('--outages-per-day', type=float, default=2.0, help='随机服务故障频率')
+    parser.add_argument('--outage-minutes', type=float, default=20.0, help='服务故障平均时长（分钟）')
+    parser.add_argument('--services', default='svc-a:0.3,svc-b:0.6,svc-c:1.0', help='检测服务 名称:响应秒数')
+    parser.add_argument('--failure-cost', type=float, default=10.0, help='检测服务故障时的等待秒数（请求超时）')
+    parser.add_argument('--api-latency', type=float, default=0.15, help='每次EdgeOne API调用的秒数')
+    parser.add_argument('--intervals', default='60,300', help='轮询间隔（秒）')
+    parser.add_argument('--hedge-delays', default='0', help='检测对冲延迟（秒），0表示顺序回退')
+    parser.add_argument('--force-reconcile', default='0', help='强制对账间隔（秒），0表示每个周期都对账')
+    parser.add_argument('--coalesce', default='0', help='通知合并窗口（秒）')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='并行模拟的进程数')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    args = parser.parse_args()
+    
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(args.seed)
+    args.duration = args.days * DAY
+    changes = load_ip_trace(args.ip_trace) if args.ip_trace else synthetic_ip_trace(rng, args.duration, args.changes_per_day)
+    if args.ip_trace and '--days' not in sys.argv:
+        args.duration = changes[-1][0] + DAY
+    
+    policies = [
+        {'interval': interval, 'hedge_delay': hedge, 'force_reconcile': int(force), 'coalesce': coalesce}
+        for interval, hedge, force, coalesce in itertools.product(
+            parse_list(args.intervals), parse_list(args.hedge_delays),
+            parse_list(args.force_reconcile), parse_list(args.coalesce))
+    ]
+    
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, 'config.json')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'secret_id': 'sim', 'secret_key': 'sim', 'zone_id': 'zone-sim',
+                'ipv4_enabled': True,
+                'ipv4_domains': [f'host{i}.example.com' for i in range(args.domains)],
+                'webhook_enabled': True, 'webhook_url': 'http://webhook.invalid/',
+                'notification_async': False, 'control_socket': ''
+            }, f)
+        
+        print(f"模拟 {args.duration / DAY:g} 天，IP变化 {len(changes) - 1} 次，{args.domains} 个域名，{len(policies)} 组策略")
+        print(f"{'间隔':>6} {'对冲':>5} {'强制对账':>8} {'合并':>6} | {'检测延迟p50/p95(s)':>18} {'检测耗时均值(s)':>11} {'过期p95(s)':>10} "
+              f"{'过期占比':>8} {'API调用':>8} {'Webhook':>8} {'耗时(s)':>7}")
+        jobs = max(1, min(args.jobs, len(policies)))
+        tasks = [(policy, changes, args, config_path) for policy in policies]
+        if jobs == 1:
+            outcomes = map(run_policy, tasks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            outcomes = executor.map(run_policy, tasks)
+        for result in outcomes:
+            results.append(result)
+            policy = result['policy']
+            lag = result['detection_lag_s']
+            print(f"{policy['interval']:>6g} {policy['hedge_delay']:>5g} {policy['force_reconcile']:>8} "
+                  f"{policy['coalesce']:>6g} | {lag['p50']:>8}/{lag['p95']:<9} {result['detect_seconds']['mean']:>11} "
+                  f"{result['staleness_s']['p95']:>10} {result['stale_fraction']:>8.4%} "
+                  f"{result['api_calls_total']:>8} {result['webhooks']:>8} {result['wall_seconds']:>7}")
+        if jobs > 1:
+            executor.shutdown()
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'days': args.duration / DAY, 'seed': args.seed, 'ip_changes': len(changes) - 1,
+                       'results': results}, f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
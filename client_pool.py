@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EdgeOne客户端池 - 每个账号一个客户端，同一账号下的所有Zone共享一个限流器
+
+腾讯云API的请求频率限制按账号计算，多个Zone并发对账时由限流器把同一账号的请求
+平滑到 api_rate_limit 次/秒以内，而不是依赖 RequestLimitExceeded 错误后失败。
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional, Tuple
+
+import metrics
+from config import AccountConfig
+from deadline import MIN_REQUEST_TIMEOUT, Deadline, DeadlineExceeded
+
+if TYPE_CHECKING:
+    from edgeone_client import EdgeOneClient
+
+class RateLimiter:
+    """令牌桶限流器，rate 为每秒请求数，burst 为允许的突发请求数
+    
+    acquire() 先预约令牌再在锁外等待，并发调用方按到达顺序依次获得请求时间。
+    """
+    
+    def __init__(self, rate: float, burst: Optional[float] = None, name: str = '',
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.name = name
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+        self._tokens = self.burst
+        self._updated = clock()
+    
+    def configure(self, rate: float, burst: Optional[float] = None):
+        with self._lock:
+            self.rate = max(0.0, rate)
+            self.burst = max(1.0, burst if burst is not None else self.rate)
+    
+    def acquire(self, deadline: Optional[Deadline] = None) -> float:
+        """取得一次请求许可，返回等待的秒数；rate 为0时不限流
+        
+        等待后剩余的周期预算已不足以发起请求时归还令牌并抛出 DeadlineExceeded，不再等待。
+        """
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            remaining = deadline.remaining() if deadline else None
+            if remaining is not None and wait + MIN_REQUEST_TIMEOUT > remaining:
+                self._tokens += 1
+                raise DeadlineExceeded()
+        if wait > 0:
+            metrics.API_THROTTLE_SECONDS.inc(wait, account=self.name)
+            self.sleep(wait)
+        return wait
+    
+    def refund(self):
+        """归还一次取得后没有用于请求的许可"""
+        with self._lock:
+            if self.rate > 0:
+                self._tokens = min(self.burst, self._tokens + 1)
+
+class ClientPool:
+    """账号名 -> (凭据, 客户端)；凭据或接入点变化时重建该账号的客户端，限流器保留"""
+    
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate
+        self._clients: Dict[str, Tuple[AccountConfig, 'EdgeOneClient']] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, account: AccountConfig) -> 'EdgeOneClient':
+        """获取账号的客户端（首次使用时创建，延迟导入SDK）"""
+        with self._lock:
+            entry = self._clients.get(account.name)
+            if entry and entry[0] == account:
+                return entry[1]
+            limiter = self._limiters.get(account.name)
+            if limiter is None:
+                limiter = self._limiters[account.name] = RateLimiter(self.rate, name=account.name)
+            from edgeone_client import EdgeOneClient
+            client = EdgeOneClient(account.secret_id, account.secret_key, endpoint=account.endpoint,
+                                   rate_limiter=limiter)
+            self._clients[account.name] = (account, client)
+            return client
+    
+    def configure(self, rate: float, accounts: Iterable[AccountConfig]):
+        """更新请求频率上限，并丢弃已删除账号的客户端"""
+        names = {account.name for account in accounts}
+        with self._lock:
+            self.rate = rate
+            for limiter in self._limiters.values():
+                limiter.configure(rate)
+            for name in [name for name in self._clients if name not in names]:
+                del self._clients[name]
+                self._limiters.pop(name, None)
+    
+    def __len__(self) -> int:
+        return len(self._clients)
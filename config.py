@@ -5,9 +5,328 @@
 """
 
 import os
+import hashlib
 import json
 import logging
-from typing import List, Optional, Dict
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional, Dict, Tuple
+
+from inventory import DomainInventory, InventoryView
+
+def _freeze(value: Any) -> Any:
+    """递归转换为只读结构：dict -> MappingProxyType，list -> tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _parse_json_mapping(value: Any) -> Mapping:
+    """解析JSON字符串（或已是字典的值）为只读映射，无效时返回空映射"""
+    try:
+        parsed = json.loads(value) if isinstance(value, str) and value else value
+    except (TypeError, ValueError):
+        parsed = None
+    return _freeze(parsed) if isinstance(parsed, dict) else MappingProxyType({})
+
+def _parse_json_list(value: Any) -> Tuple[Mapping, ...]:
+    """解析JSON字符串（或已是列表的值）为只读的映射元组，忽略非对象元素"""
+    try:
+        parsed = json.loads(value) if isinstance(value, str) and value else value
+    except (TypeError, ValueError):
+        parsed = None
+    if not isinstance(parsed, list):
+        return ()
+    return tuple(_freeze(item) for item in parsed if isinstance(item, dict))
+
+def _normalize_domains(value: Any) -> Tuple[str, ...]:
+    """过滤空值和重复项，保持原有顺序"""
+    if not isinstance(value, (list, tuple)):
+        return ()
+    domains = (domain.strip() for domain in value if isinstance(domain, str))
+    return tuple(dict.fromkeys(domain for domain in domains if domain))
+
+# 顶层 secret_id / secret_key / zone_id 对应的账号和Zone名称
+DEFAULT_ACCOUNT = 'default'
+DEFAULT_ZONE = 'default'
+
+@dataclass(frozen=True)
+class AccountConfig:
+    """一个腾讯云账号的API凭据"""
+    name: str
+    secret_id: str
+    secret_key: str
+    endpoint: str = ''
+
+@dataclass(frozen=True)
+class ZoneConfig:
+    """一个Zone及其各协议的域名，通过 account 引用所属账号
+    
+    ttls 为域名清单中设置了TTL的记录：(域名, 记录类型) -> TTL。
+    """
+    name: str
+    zone_id: str
+    account: str
+    ipv4_domains: Tuple[str, ...] = ()
+    ipv6_domains: Tuple[str, ...] = ()
+    ttls: Mapping = field(default_factory=lambda: MappingProxyType({}), repr=False, hash=False)
+    _domain_sets: Mapping = field(init=False, repr=False, compare=False, hash=False)
+    
+    def __post_init__(self):
+        # 成员判断用的集合，域名较多时按Zone查找域名不需要线性扫描
+        object.__setattr__(self, '_domain_sets', MappingProxyType({
+            'A': frozenset(self.ipv4_domains),
+            'AAAA': frozenset(self.ipv6_domains)
+        }))
+    
+    def domains_for(self, record_type: str) -> Tuple[str, ...]:
+        if record_type == 'A':
+            return self.ipv4_domains
+        if record_type == 'AAAA':
+            return self.ipv6_domains
+        return ()
+    
+    def contains(self, domain: str, record_type: str) -> bool:
+        domains = self._domain_sets.get(record_type)
+        return domains is not None and domain in domains
+
+def _parse_accounts(data: Dict) -> Mapping:
+    """账号名 -> AccountConfig；顶层凭据作为 default 账号，缺少凭据的账号被忽略"""
+    accounts = {}
+    secret_id = str(data.get('secret_id', '') or '')
+    secret_key = str(data.get('secret_key', '') or '')
+    if secret_id and secret_key:
+        accounts[DEFAULT_ACCOUNT] = AccountConfig(DEFAULT_ACCOUNT, secret_id, secret_key,
+                                                  str(data.get('edgeone_endpoint', '') or ''))
+    for item in _parse_json_list(data.get('accounts', '[]')):
+        name = str(item.get('name', '') or '')
+        if not name or name in accounts or not item.get('secret_id') or not item.get('secret_key'):
+            continue
+        accounts[name] = AccountConfig(name, str(item['secret_id']), str(item['secret_key']),
+                                       str(item.get('endpoint', '') or ''))
+    return MappingProxyType(accounts)
+
+def _parse_zones(data: Dict, accounts: Mapping, ipv4_domains: Tuple[str, ...],
+                 ipv6_domains: Tuple[str, ...], inventory: Optional[InventoryView] = None) -> Tuple[ZoneConfig, ...]:
+    """顶层 zone_id 作为 default Zone 排在最前；引用了不存在账号的Zone被忽略
+    
+    域名清单中已启用的域名追加在各Zone配置文件中的域名之后。
+    """
+    def make_zone(name: str, zone_id: str, account: str, ipv4: Tuple[str, ...], ipv6: Tuple[str, ...]) -> ZoneConfig:
+        if inventory is None:
+            return ZoneConfig(name, zone_id, account, ipv4, ipv6)
+        return ZoneConfig(
+            name, zone_id, account,
+            tuple(dict.fromkeys(ipv4 + inventory.domains(name, 'ipv4'))),
+            tuple(dict.fromkeys(ipv6 + inventory.domains(name, 'ipv6'))),
+            inventory.ttls(name)
+        )
+    
+    zones = {}
+    zone_id = str(data.get('zone_id', '') or '')
+    if zone_id and DEFAULT_ACCOUNT in accounts:
+        zones[DEFAULT_ZONE] = make_zone(DEFAULT_ZONE, zone_id, DEFAULT_ACCOUNT, ipv4_domains, ipv6_domains)
+    for item in _parse_json_list(data.get('zones', '[]')):
+        zone_id = str(item.get('zone_id', '') or '')
+        name = str(item.get('name', '') or zone_id)
+        account = str(item.get('account', '') or DEFAULT_ACCOUNT)
+        if not zone_id or name in zones or account not in accounts:
+            continue
+        zones[name] = make_zone(
+            name, zone_id, account,
+            _normalize_domains(list(item.get('ipv4_domains') or ())),
+            _normalize_domains(list(item.get('ipv6_domains') or ()))
+        )
+    return tuple(zones.values())
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """编译后的只读配置快照
+    
+    在加载、保存或修改配置后一次性解析生成，读取方拿到引用后在整个更新周期内看到的都是
+    同一份一致的配置，无需加锁，也不会重复解析JSON。
+    """
+    secret_id: str
+    secret_key: str
+    zone_id: str
+    edgeone_endpoint: str
+    accounts: Mapping
+    zones: Tuple[ZoneConfig, ...]
+    zone_workers: int
+    api_rate_limit: float
+    domains: Tuple[str, ...]
+    ipv4_domains: Tuple[str, ...]
+    ipv6_domains: Tuple[str, ...]
+    ipv4_domain_set: frozenset
+    ipv6_domain_set: frozenset
+    wechat_webhook: str
+    update_interval: int
+    force_reconcile_interval: int
+    cycle_timeout: int
+    log_level: str
+    ipv4_enabled: bool
+    ipv6_enabled: bool
+    webhook_enabled: bool
+    webhook_url: str
+    webhook_headers: Mapping
+    webhook_body_template: Mapping
+    webhook_targets: Tuple[Mapping, ...]
+    webhook_max_payload_bytes: int
+    dyndns_users: Tuple[Mapping, ...]
+    control_socket: str
+    notification_async: bool
+    notification_queue_size: int
+    notification_max_retries: int
+    notification_spool_file: str
+    notification_coalesce_window: int
+    trace_history: int
+    trace_export_dir: str
+    admin_token: str
+    inventory_version: int
+    is_valid: bool
+    
+    @classmethod
+    def from_data(cls, data: Dict, inventory: Optional[DomainInventory] = None) -> 'ConfigSnapshot':
+        """从原始配置字典编译快照，指定 inventory 时合并域名清单"""
+        domains = _normalize_domains(data.get('domains', []))
+        # 向后兼容：如果没有配置ipv4_domains，则使用domains
+        ipv4_domains = _normalize_domains(data.get('ipv4_domains', [])) or domains
+        ipv6_domains = _normalize_domains(data.get('ipv6_domains', []))
+        
+        try:
+            update_interval = max(60, min(86400, int(data.get('update_interval', 300))))
+        except (TypeError, ValueError):
+            update_interval = 300
+        
+        try:
+            force_reconcile_interval = max(0, int(data.get('force_reconcile_interval', 0)))
+        except (TypeError, ValueError):
+            force_reconcile_interval = 0
+        
+        try:
+            cycle_timeout = max(0, min(86400, int(data.get('cycle_timeout', 0))))
+        except (TypeError, ValueError):
+            cycle_timeout = 0
+        if 0 < cycle_timeout < 10:
+            cycle_timeout = 10
+        
+        log_level = str(data.get('log_level', 'INFO')).upper()
+        if log_level not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+            log_level = 'INFO'
+        
+        try:
+            notification_queue_size = max(1, int(data.get('notification_queue_size', 100)))
+        except (TypeError, ValueError):
+            notification_queue_size = 100
+        
+        try:
+            notification_max_retries = max(0, int(data.get('notification_max_retries', 3)))
+        except (TypeError, ValueError):
+            notification_max_retries = 3
+        
+        try:
+            notification_coalesce_window = min(3600, max(0, int(data.get('notification_coalesce_window', 0))))
+        except (TypeError, ValueError):
+            notification_coalesce_window = 0
+        
+        try:
+            trace_history = min(1000, max(1, int(data.get('trace_history', 50))))
+        except (TypeError, ValueError):
+            trace_history = 50
+        
+        try:
+            webhook_max_payload_bytes = max(0, int(data.get('webhook_max_payload_bytes', 0)))
+        except (TypeError, ValueError):
+            webhook_max_payload_bytes = 0
+        
+        try:
+            zone_workers = min(32, max(1, int(data.get('zone_workers', 4))))
+        except (TypeError, ValueError):
+            zone_workers = 4
+        
+        try:
+            api_rate_limit = max(0.0, float(data.get('api_rate_limit', 20)))
+        except (TypeError, ValueError):
+            api_rate_limit = 20.0
+        
+        secret_id = str(data.get('secret_id', '') or '')
+        secret_key = str(data.get('secret_key', '') or '')
+        zone_id = str(data.get('zone_id', '') or '')
+        accounts = _parse_accounts(data)
+        view = inventory.view() if inventory is not None else None
+        zones = _parse_zones(data, accounts, ipv4_domains, ipv6_domains, view)
+        
+        return cls(
+            secret_id=secret_id,
+            secret_key=secret_key,
+            zone_id=zone_id,
+            edgeone_endpoint=str(data.get('edgeone_endpoint', '') or ''),
+            accounts=accounts,
+            zones=zones,
+            zone_workers=zone_workers,
+            api_rate_limit=api_rate_limit,
+            domains=domains,
+            ipv4_domains=ipv4_domains,
+            ipv6_domains=ipv6_domains,
+            ipv4_domain_set=frozenset(ipv4_domains),
+            ipv6_domain_set=frozenset(ipv6_domains),
+            wechat_webhook=str(data.get('wechat_webhook', '') or ''),
+            update_interval=update_interval,
+            force_reconcile_interval=force_reconcile_interval,
+            cycle_timeout=cycle_timeout,
+            log_level=log_level,
+            ipv4_enabled=bool(data.get('ipv4_enabled', True)),
+            ipv6_enabled=bool(data.get('ipv6_enabled', False)),
+            webhook_enabled=bool(data.get('webhook_enabled', False)),
+            webhook_url=str(data.get('webhook_url', '') or ''),
+            webhook_headers=_parse_json_mapping(data.get('webhook_headers', '{}')),
+            webhook_body_template=_parse_json_mapping(data.get('webhook_body_template', '{}')),
+            webhook_targets=_parse_json_list(data.get('webhook_targets', '[]')),
+            webhook_max_payload_bytes=webhook_max_payload_bytes,
+            dyndns_users=_parse_json_list(data.get('dyndns_users', '[]')),
+            control_socket=str(data.get('control_socket', '') or ''),
+            notification_async=bool(data.get('notification_async', True)),
+            notification_queue_size=notification_queue_size,
+            notification_max_retries=notification_max_retries,
+            notification_spool_file=str(data.get('notification_spool_file', '') or ''),
+            notification_coalesce_window=notification_coalesce_window,
+            trace_history=trace_history,
+            trace_export_dir=str(data.get('trace_export_dir', '') or ''),
+            admin_token=str(data.get('admin_token', '') or os.environ.get('DDNS_ADMIN_TOKEN', '')),
+            inventory_version=view.version if view is not None else 0,
+            # 至少有一个凭据完整的Zone；只使用顶层配置时等价于 secret_id、secret_key、zone_id 均不为空
+            is_valid=bool(zones)
+        )
+    
+    @property
+    def enabled_domains(self) -> Tuple[str, ...]:
+        """所有Zone中已启用协议的域名（IPv4在前）"""
+        result = ()
+        if self.ipv4_enabled:
+            result += tuple(domain for zone in self.zones for domain in zone.ipv4_domains)
+        if self.ipv6_enabled:
+            result += tuple(domain for zone in self.zones for domain in zone.ipv6_domains)
+        return tuple(dict.fromkeys(result))
+    
+    @property
+    def total_domains(self) -> Tuple[int, int]:
+        """所有Zone的 (IPv4域名数, IPv6域名数)"""
+        return (sum(len(zone.ipv4_domains) for zone in self.zones),
+                sum(len(zone.ipv6_domains) for zone in self.zones))
+    
+    def zone_for(self, domain: str, record_type: str) -> Optional[ZoneConfig]:
+        """该记录类型下包含此域名的第一个Zone"""
+        for zone in self.zones:
+            if zone.contains(domain, record_type):
+                return zone
+        return None
+    
+    @property
+    def webhook_configured(self) -> bool:
+        """是否启用了Webhook且至少有一个投递目标"""
+        return self.webhook_enabled and bool(self.webhook_url or self.webhook_targets)
 
 class Config:
     """配置管理类"""
@@ -21,11 +340,16 @@ class Config:
             'secret_id': '',
             'secret_key': '',
             'zone_id': '',
+            'edgeone_endpoint': '',  # EdgeOne API接入点，为空时使用官方地址（或 EDGEONE_API_ENDPOINT）
             'domains': [],  # 保持向后兼容
             'ipv4_domains': [],  # IPv4域名列表
             'ipv6_domains': [],  # IPv6域名列表
             'wechat_webhook': '',
             'update_interval': 300,  # 5分钟
+            # 公网IP未变化时跳过对账，最长每隔多少秒仍强制对账一次；0表示每个周期都对账
+            'force_reconcile_interval': 0,
+            # 单个更新周期（检测、API请求和同步通知）的总时间上限（秒），超出时返回部分结果；0表示不限制
+            'cycle_timeout': 0,
             'log_level': 'INFO',
             'ipv4_enabled': False,  # 默认禁用IPv4，需要用户主动选择
             'ipv6_enabled': False,  # 默认禁用IPv6，需要用户主动选择
@@ -33,8 +357,46 @@ class Config:
             'webhook_enabled': False,
             'webhook_url': '',
             'webhook_headers': '{}',  # JSON字符串
-            'webhook_body_template': '{}'  # JSON字符串，包含变量占位符
+            'webhook_body_template': '{}',  # JSON字符串，包含变量占位符
+            # 额外的Webhook目标，JSON数组字符串；每项包含 name、url、template 或 headers/body、events、timeout
+            'webhook_targets': '[]',
+            'webhook_max_payload_bytes': 0,  # 默认目标的请求体字节上限，0表示不限制
+            # dyndns2推送账号，JSON数组字符串；每项包含 username、password、hosts（'*' 表示全部已配置域名）
+            'dyndns_users': '[]',
+            # 多账号、多Zone：accounts 为 [{name, secret_id, secret_key, endpoint}]，
+            # zones 为 [{name, zone_id, account, ipv4_domains, ipv6_domains}]；顶层凭据和zone_id作为 default 账号和Zone
+            'accounts': '[]',
+            'zones': '[]',
+            # 同时执行对账的Zone数
+            'zone_workers': 4,
+            # 每个账号的API请求频率上限（次/秒），0表示不限制
+            'api_rate_limit': 20,
+            # 本地控制套接字路径，供ppp/dhclient钩子触发更新，为空时不启用；
+            # 套接字没有认证，所在目录须只有服务用户可写（如 /run/edgeone-ddns/ddns.sock，不存在时以0700创建）
+            'control_socket': '',
+            # 通知后台分发配置
+            'notification_async': True,
+            'notification_queue_size': 100,
+            'notification_max_retries': 3,
+            'notification_spool_file': '',  # 为空时不暂存到磁盘
+            'notification_coalesce_window': 0,  # 通知合并窗口（秒），0表示不合并
+            # 周期追踪：内存中保留的周期数，以及Chrome trace文件导出目录（为空时不导出）
+            'trace_history': 50,
+            'trace_export_dir': '',
+            # 管理接口（性能分析等）的访问令牌，为空时管理接口禁用；只能在配置文件或 DDNS_ADMIN_TOKEN 中设置
+            'admin_token': '',
+            # 域名清单（JSONL操作日志）路径，为空时使用配置文件所在目录下的 domains.jsonl
+            'inventory_file': ''
         }
+        self._defaults = dict(self.data)
+        # 修改配置与从磁盘重新加载之间互斥
+        self.lock = threading.RLock()
+        # 编译后的只读快照，配置变化时置空并在下次读取时重新编译
+        self._snapshot: Optional[ConfigSnapshot] = None
+        # 最近一次 reload 读到的内容是否由某个服务进程通过 save() 写入（否则为外部修改）
+        self.saved_by_service = False
+        # 域名清单，内容变化（包括其他进程的修改）后快照也会重新编译
+        self.inventory = DomainInventory(self._inventory_path(self.data))
         
     def load(self) -> bool:
         """加载配置文件"""
@@ -42,7 +404,9 @@ class Config:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     loaded_data = json.load(f)
+                with self.lock:
                     self.data.update(loaded_data)
+                    self._snapshot = self._compile(self.data)
                 logging.info(f"配置文件加载成功: {self.config_file}")
                 return True
             else:
@@ -53,174 +417,376 @@ class Config:
             return False
     
     def save(self) -> bool:
-        """保存配置文件"""
+        """保存配置文件（先写临时文件再原子替换，避免其他进程读到半个文件）"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            content = json.dumps(self.data, indent=2, ensure_ascii=False)
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            tmp_file = os.path.join(config_dir, f".{os.path.basename(self.config_file)}.{os.getpid()}.tmp")
+            # 先记录内容摘要，其他进程重新加载时据此判断变更已由保存它的进程应用
+            self._write_saved_digest(content)
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(tmp_file, self.config_file)
+            except OSError:
+                # 配置文件本身是挂载点等无法替换的情况，退回原地写入
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                with open(self.config_file, 'w', encoding='utf-8') as f:
+                    f.write(content)
             logging.info(f"配置文件保存成功: {self.config_file}")
             return True
         except Exception as e:
             logging.error(f"保存配置文件失败: {str(e)}")
             return False
     
+    def _saved_digest_path(self) -> str:
+        config_dir = os.path.dirname(os.path.abspath(self.config_file))
+        return os.path.join(config_dir, f".{os.path.basename(self.config_file)}.saved")
+    
+    def _write_saved_digest(self, content: str):
+        path = self._saved_digest_path()
+        try:
+            with open(f"{path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+                f.write(hashlib.sha256(content.encode('utf-8')).hexdigest())
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+        except OSError as e:
+            logging.warning(f"记录配置摘要失败: {str(e)}")
+    
+    def _read_saved_digest(self) -> Optional[str]:
+        try:
+            with open(self._saved_digest_path(), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+    
+    def reload(self) -> Optional[Dict]:
+        """从磁盘重新加载配置
+        
+        新文件校验通过且内容与当前配置不同时整体替换配置数据，返回替换前的配置；
+        文件无效或没有变化时保持当前配置并返回None。
+        """
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+            loaded_data = json.loads(content)
+        except Exception as e:
+            logging.error(f"重新加载配置文件失败，保留当前配置: {str(e)}")
+            return None
+        self.saved_by_service = self._read_saved_digest() == hashlib.sha256(content.encode('utf-8')).hexdigest()
+        
+        error = self.validate_data(loaded_data)
+        if error:
+            logging.error(f"配置文件校验失败，保留当前配置: {error}")
+            return None
+        
+        new_data = dict(self._defaults)
+        new_data.update(loaded_data)
+        
+        with self.lock:
+            if new_data == self.data:
+                return None
+            old_data = self.data
+            self.data = new_data
+            self._snapshot = self._compile(new_data)
+        
+        logging.info(f"配置文件已重新加载: {self.config_file}")
+        return old_data
+    
+    @staticmethod
+    def validate_data(data) -> Optional[str]:
+        """校验配置数据结构，返回错误信息，有效时返回None"""
+        if not isinstance(data, dict):
+            return "配置文件必须是JSON对象"
+        
+        for key in ('domains', 'ipv4_domains', 'ipv6_domains'):
+            value = data.get(key, [])
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                return f"{key} 必须是字符串列表"
+        
+        for key in ('secret_id', 'secret_key', 'zone_id', 'webhook_url', 'inventory_file'):
+            if not isinstance(data.get(key, ''), str):
+                return f"{key} 必须是字符串"
+        
+        try:
+            int(data.get('update_interval', 300))
+        except (TypeError, ValueError):
+            return "update_interval 必须是整数"
+        
+        for key, required in (('accounts', ('name', 'secret_id', 'secret_key')), ('zones', ('zone_id',))):
+            items = data.get(key, [])
+            if isinstance(items, str):
+                try:
+                    items = json.loads(items) if items else []
+                except ValueError:
+                    return f"{key} 不是有效的JSON"
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                return f"{key} 必须是对象列表"
+            for item in items:
+                missing = [field for field in required if not item.get(field)]
+                if missing:
+                    return f"{key} 中的条目缺少 {', '.join(missing)}"
+        
+        return None
+    
     def is_valid(self) -> bool:
         """验证配置是否有效"""
-        required_fields = ['secret_id', 'secret_key', 'zone_id']
-        return all(self.data.get(field) for field in required_fields)
+        return self.snapshot.is_valid
+    
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """获取当前配置的只读快照"""
+        snapshot = self._snapshot
+        inventory_version = self.inventory.refresh()
+        if snapshot is None or snapshot.inventory_version != inventory_version:
+            with self.lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.inventory_version != self.inventory.version:
+                    snapshot = self._compile(self.data)
+                    self._snapshot = snapshot
+        return snapshot
+    
+    def _inventory_path(self, data: Dict) -> str:
+        path = str(data.get('inventory_file', '') or '')
+        if not path:
+            path = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), 'domains.jsonl')
+        return path
+    
+    def _compile(self, data: Dict) -> ConfigSnapshot:
+        """编译快照；清单路径变化时切换到新的清单（调用方持有配置锁）"""
+        path = self._inventory_path(data)
+        if path != self.inventory.path:
+            self.inventory = DomainInventory(path)
+        self.inventory.refresh(force=True)
+        return ConfigSnapshot.from_data(data, self.inventory)
+    
+    def _set(self, key: str, value: Any):
+        """修改配置项，并使快照失效"""
+        with self.lock:
+            self.data[key] = value
+            self._snapshot = None
     
     def to_dict(self) -> dict:
         """返回配置字典（隐藏敏感信息）"""
-        result = self.data.copy()
+        # 与配置修改互斥，避免读到只修改了一部分的配置
+        with self.lock:
+            result = self.data.copy()
+            snapshot = self.snapshot
         # 隐藏密钥信息 - 只有当secret_key不为空且不是已经是掩码时才隐藏
         secret_key = result.get('secret_key', '')
         if secret_key and not secret_key.startswith('*'):
             result['secret_key'] = '*' * 20
+        if result.get('admin_token'):
+            result['admin_token'] = '*' * 20
+        # 隐藏dyndns推送账号的密码
+        if snapshot.dyndns_users:
+            users = [dict(user, password='*' * 20) for user in snapshot.dyndns_users]
+            result['dyndns_users'] = json.dumps(users, ensure_ascii=False, default=dict)
+        # 隐藏附加账号的密钥
+        accounts = _parse_json_list(result.get('accounts', '[]'))
+        if accounts:
+            accounts = [dict(account, secret_key='*' * 20) for account in accounts]
+            result['accounts'] = json.dumps(accounts, ensure_ascii=False, default=dict)
         return result
     
-    # 属性访问器
+    # 属性访问器（读取编译后的快照）
     @property
     def secret_id(self) -> str:
-        return self.data.get('secret_id', '')
+        return self.snapshot.secret_id
     
     @secret_id.setter
     def secret_id(self, value: str):
-        self.data['secret_id'] = value.strip()
+        self._set('secret_id', value.strip())
     
     @property
     def secret_key(self) -> str:
-        return self.data.get('secret_key', '')
+        return self.snapshot.secret_key
     
     @secret_key.setter
     def secret_key(self, value: str):
-        self.data['secret_key'] = value.strip()
+        self._set('secret_key', value.strip())
     
     @property
     def zone_id(self) -> str:
-        return self.data.get('zone_id', '')
+        return self.snapshot.zone_id
     
     @zone_id.setter
     def zone_id(self, value: str):
-        self.data['zone_id'] = value.strip()
+        self._set('zone_id', value.strip())
     
     @property
-    def domains(self) -> List[str]:
-        return self.data.get('domains', [])
+    def domains(self) -> Tuple[str, ...]:
+        return self.snapshot.domains
     
     @domains.setter
     def domains(self, value: List[str]):
         # 过滤空值和重复项
-        domains = [domain.strip() for domain in value if domain.strip()]
-        self.data['domains'] = list(dict.fromkeys(domains))
+        self._set('domains', list(_normalize_domains(value)))
     
     @property
-    def ipv4_domains(self) -> List[str]:
+    def ipv4_domains(self) -> Tuple[str, ...]:
         """获取IPv4域名列表，向后兼容：如果没有配置ipv4_domains，则使用domains"""
-        ipv4_domains = self.data.get('ipv4_domains', [])
-        if ipv4_domains:
-            return ipv4_domains
-        # 向后兼容：如果没有新的配置，使用旧的domains
-        return self.data.get('domains', [])
+        return self.snapshot.ipv4_domains
     
     @ipv4_domains.setter
     def ipv4_domains(self, value: List[str]):
         # 过滤空值和重复项
-        domains = [domain.strip() for domain in value if domain.strip()]
-        self.data['ipv4_domains'] = list(dict.fromkeys(domains))
+        self._set('ipv4_domains', list(_normalize_domains(value)))
     
     @property
-    def ipv6_domains(self) -> List[str]:
+    def ipv6_domains(self) -> Tuple[str, ...]:
         """获取IPv6域名列表"""
-        return self.data.get('ipv6_domains', [])
+        return self.snapshot.ipv6_domains
     
     @ipv6_domains.setter
     def ipv6_domains(self, value: List[str]):
         # 过滤空值和重复项
-        domains = [domain.strip() for domain in value if domain.strip()]
-        self.data['ipv6_domains'] = list(dict.fromkeys(domains))
+        self._set('ipv6_domains', list(_normalize_domains(value)))
     
     @property
     def wechat_webhook(self) -> str:
-        return self.data.get('wechat_webhook', '')
+        return self.snapshot.wechat_webhook
     
     @wechat_webhook.setter
     def wechat_webhook(self, value: str):
-        self.data['wechat_webhook'] = value.strip()
+        self._set('wechat_webhook', value.strip())
     
     @property
     def update_interval(self) -> int:
-        return self.data.get('update_interval', 300)
+        return self.snapshot.update_interval
     
     @update_interval.setter
     def update_interval(self, value: int):
-        self.data['update_interval'] = max(60, min(86400, int(value)))  # 限制在1分钟到24小时之间
+        self._set('update_interval', max(60, min(86400, int(value))))  # 限制在1分钟到24小时之间
     
     @property
     def log_level(self) -> str:
-        return self.data.get('log_level', 'INFO')
+        return self.snapshot.log_level
     
     @log_level.setter
     def log_level(self, value: str):
         valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-        self.data['log_level'] = value.upper() if value.upper() in valid_levels else 'INFO'
+        self._set('log_level', value.upper() if value.upper() in valid_levels else 'INFO')
     
     @property
     def ipv4_enabled(self) -> bool:
-        return self.data.get('ipv4_enabled', True)
+        return self.snapshot.ipv4_enabled
     
     @ipv4_enabled.setter
     def ipv4_enabled(self, value: bool):
-        self.data['ipv4_enabled'] = bool(value)
+        self._set('ipv4_enabled', bool(value))
     
     @property
     def ipv6_enabled(self) -> bool:
-        return self.data.get('ipv6_enabled', False)
+        return self.snapshot.ipv6_enabled
     
     @ipv6_enabled.setter
     def ipv6_enabled(self, value: bool):
-        self.data['ipv6_enabled'] = bool(value)
+        self._set('ipv6_enabled', bool(value))
     
     @property
     def webhook_enabled(self) -> bool:
-        return self.data.get('webhook_enabled', False)
+        return self.snapshot.webhook_enabled
     
     @webhook_enabled.setter
     def webhook_enabled(self, value: bool):
-        self.data['webhook_enabled'] = bool(value)
+        self._set('webhook_enabled', bool(value))
     
     @property
     def webhook_url(self) -> str:
-        return self.data.get('webhook_url', '')
+        return self.snapshot.webhook_url
     
     @webhook_url.setter
     def webhook_url(self, value: str):
-        self.data['webhook_url'] = value.strip()
+        self._set('webhook_url', value.strip())
     
     @property
-    def webhook_headers(self) -> dict:
-        try:
-            headers_str = self.data.get('webhook_headers', '{}')
-            return json.loads(headers_str) if headers_str else {}
-        except:
-            return {}
+    def webhook_headers(self) -> Mapping:
+        return self.snapshot.webhook_headers
     
     @webhook_headers.setter
     def webhook_headers(self, value: dict):
         if isinstance(value, dict):
-            self.data['webhook_headers'] = json.dumps(value, ensure_ascii=False)
+            self._set('webhook_headers', json.dumps(value, ensure_ascii=False))
         else:
-            self.data['webhook_headers'] = value
+            self._set('webhook_headers', value)
     
     @property
-    def webhook_body_template(self) -> dict:
-        try:
-            body_str = self.data.get('webhook_body_template', '{}')
-            return json.loads(body_str) if body_str else {}
-        except:
-            return {}
+    def webhook_body_template(self) -> Mapping:
+        return self.snapshot.webhook_body_template
     
     @webhook_body_template.setter
     def webhook_body_template(self, value: dict):
         if isinstance(value, dict):
-            self.data['webhook_body_template'] = json.dumps(value, ensure_ascii=False)
+            self._set('webhook_body_template', json.dumps(value, ensure_ascii=False))
+        else:
+            self._set('webhook_body_template', value)
+    
+    @property
+    def webhook_targets(self) -> Tuple[Mapping, ...]:
+        return self.snapshot.webhook_targets
+    
+    @webhook_targets.setter
+    def webhook_targets(self, value: list):
+        if isinstance(value, list):
+            self._set('webhook_targets', json.dumps(value, ensure_ascii=False))
+        else:
+            self._set('webhook_targets', value)
+    
+    @property
+    def dyndns_users(self) -> Tuple[Mapping, ...]:
+        return self.snapshot.dyndns_users
+    
+    @dyndns_users.setter
+    def dyndns_users(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value) if value else []
+            except ValueError:
+                value = []
+        # 提交的是掩码密码时保留原密码
+        current = {user.get('username'): user.get('password', '') for user in self.snapshot.dyndns_users}
+        users = []
+        for user in value if isinstance(value, list) else []:
+            if not isinstance(user, dict):
+                continue
+            user = dict(user)
+            if str(user.get('password', '')).startswith('*'):
+                user['password'] = current.get(user.get('username'), '')
+            users.append(user)
+        self._set('dyndns_users', json.dumps(users, ensure_ascii=False))
+    
+    @property
+    def accounts(self) -> Mapping:
+        return self.snapshot.accounts
+    
+    @accounts.setter
+    def accounts(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value) if value else []
+            except ValueError:
+                value = []
+        # 提交的是掩码密钥时保留原密钥
+        current = {account.get('name'): account.get('secret_key', '')
+                   for account in _parse_json_list(self.data.get('accounts', '[]'))}
+        accounts = []
+        for account in value if isinstance(value, list) else []:
+            if not isinstance(account, dict):
+                continue
+            account = dict(account)
+            if str(account.get('secret_key', '')).startswith('*'):
+                account['secret_key'] = current.get(account.get('name'), '')
+            accounts.append(account)
+        self._set('accounts', json.dumps(accounts, ensure_ascii=False))
+    
+    @property
+    def zones(self) -> Tuple[ZoneConfig, ...]:
+        return self.snapshot.zones
+    
+    @zones.setter
+    def zones(self, value):
+        if isinstance(value, list):
+            self._set('zones', json.dumps(value, ensure_ascii=False))
         else:
-            self.data['webhook_body_template'] = value
\ No newline at end of file
+            self._set('zones', value)
\ No newline at end of file
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置文件监听模块 - 通过inotify（不可用时轮询mtime）感知config.json的外部修改
+"""
+
+import ctypes
+import ctypes.util
+import fcntl
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config import Config
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+class ConfigWatcher:
+    """配置文件监听器
+    
+    每个进程（gunicorn worker）各自运行一个监听器。任一进程保存配置或外部工具修改文件后，
+    所有进程都会收到文件事件，校验通过后原子替换内存中的配置，并通过 on_change 回调
+    把替换前的配置交给调用方做增量应用。内容未变化的事件（例如本进程自己的保存）会被忽略。
+    更新解析记录等副作用只应由一个进程执行，调用方可用 is_leader() 判断外部修改由哪个进程负责。
+    """
+    
+    def __init__(self, config: Config, on_change: Callable[[Dict], None],
+                 poll_interval: float = 2.0, debounce: float = 0.05):
+        self.config = config
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._leader_fd: Optional[int] = None
+    
+    def is_leader(self) -> bool:
+        """本进程是否负责应用配置文件外部修改带来的副作用
+        
+        各进程竞争配置文件旁 .<文件名>.leader 的flock，取得后一直持有到进程退出，
+        持有者退出后由下一个检查的进程接管；锁文件无法创建时每个进程都自行应用。
+        """
+        if self._leader_fd is not None:
+            return True
+        config_path = os.path.abspath(self.config.config_file)
+        path = os.path.join(os.path.dirname(config_path), f".{os.path.basename(config_path)}.leader")
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+        except OSError as e:
+            logging.warning(f"无法创建配置领导锁，每个进程各自应用配置变更: {str(e)}")
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
+    
+    def start(self):
+        """启动监听线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止监听线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+    
+    def _run(self):
+        try:
+            self._watch_inotify()
+        except Exception as e:
+            if not self._stop_event.is_set():
+                logging.info(f"inotify不可用，改为轮询配置文件: {str(e)}")
+                self._watch_poll()
+    
+    def _handle_change(self):
+        """重新加载配置，有实际变化时通知调用方"""
+        old_data = self.config.reload()
+        if old_data is None:
+            return
+        try:
+            self.on_change(old_data)
+        except Exception as e:
+            logging.error(f"应用配置变更失败: {str(e)}")
+    
+    def _watch_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        
+        config_path = os.path.abspath(self.config.config_file)
+        config_dir = os.path.dirname(config_path)
+        config_name = os.path.basename(config_path).encode()
+        
+        try:
+            # 监听目录以感知原子替换（rename），同时监听文件本身以感知挂载文件的原地修改
+            dir_wd = libc.inotify_add_watch(fd, config_dir.encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if dir_wd < 0:
+                raise OSError(ctypes.get_errno(), f"无法监听目录 {config_dir}")
+            file_wd = self._add_file_watch(libc, fd, config_path)
+            
+            self.mode = 'inotify'
+            logging.info(f"配置文件监听已启动 (inotify): {config_path}")
+            
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], 1.0)
+                if not readable:
+                    if file_wd < 0:
+                        file_wd = self._add_file_watch(libc, fd, config_path)
+                    continue
+                
+                # 合并短时间内的连续事件（例如编辑器的多次写入）
+                time.sleep(self.debounce)
+                relevant = False
+                for wd, mask, name in self._read_events(fd):
+                    if wd == dir_wd and name == config_name:
+                        relevant = True
+                    elif wd == file_wd:
+                        if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                            # 文件被替换，旧的inode监听失效，需要重新添加
+                            file_wd = -1
+                        # 只在写入完成后处理，避免读到写了一半的文件
+                        if mask & (IN_CLOSE_WRITE | IN_ATTRIB):
+                            relevant = True
+                
+                if file_wd < 0:
+                    file_wd = self._add_file_watch(libc, fd, config_path)
+                if relevant:
+                    self._handle_change()
+        finally:
+            os.close(fd)
+    
+    def _add_file_watch(self, libc, fd: int, path: str) -> int:
+        if not os.path.exists(path):
+            return -1
+        return libc.inotify_add_watch(
+            fd, path.encode(),
+            IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+        )
+    
+    def _read_events(self, fd: int):
+        """读取并解析所有待处理的inotify事件"""
+        while True:
+            try:
+                buffer = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + length].rstrip(b'\0')
+                offset += length
+                yield wd, mask, name
+    
+    def _watch_poll(self):
+        self.mode = 'poll'
+        logging.info(f"配置文件监听已启动 (轮询 {self.poll_interval}s): {self.config.config_file}")
+        
+        last_stat = self._stat()
+        while not self._stop_event.wait(self.poll_interval):
+            current_stat = self._stat()
+            if current_stat != last_stat:
+                last_stat = current_stat
+                self._handle_change()
+    
+    def _stat(self):
+        try:
+            st = os.stat(self.config.config_file)
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地控制套接字模块 - 供ppp ip-up / dhclient钩子通过Unix数据报套接字立即触发更新
+"""
+
+import fcntl
+import ipaddress
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+from typing import Callable, Dict, Optional
+
+# 单个控制消息的最大长度
+MAX_MESSAGE_SIZE = 4096
+# 绑定套接字时的umask，套接字文件权限为0660
+SOCKET_UMASK = 0o117
+
+def _private_dir(path: str) -> str:
+    """确保套接字所在目录只有当前用户可写，不存在时以0700创建；不满足时抛出 OSError"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode):
+        raise OSError(f"{directory} 不是目录")
+    if st.st_uid != os.geteuid() or st.st_mode & 0o022:
+        raise OSError(f"{directory} 可被其他用户写入，请使用只有服务用户可写的目录")
+    return directory
+
+def parse_message(data: bytes) -> Optional[Dict]:
+    """解析控制消息：JSON对象 {"cmd": "trigger", "address": ..., "family": ...}，或纯文本 "trigger [address]" """
+    text = data.decode('utf-8', errors='replace').strip()
+    if not text:
+        return None
+    
+    if text.startswith('{'):
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(message, dict):
+            return None
+    else:
+        parts = text.split()
+        message = {'cmd': parts[0]}
+        if len(parts) > 1:
+            message['address'] = parts[1]
+    
+    address = message.get('address')
+    if address:
+        try:
+            parsed = ipaddress.ip_address(str(address))
+        except ValueError:
+            return None
+        message['address'] = str(parsed)
+        message['family'] = 'ipv4' if parsed.version == 4 else 'ipv6'
+    elif message.get('family') not in (None, 'ipv4', 'ipv6'):
+        return None
+    return message
+
+class ControlSocket:
+    """Unix数据报控制套接字
+    
+    多个gunicorn worker中只有拿到文件锁的一个绑定套接字，其余进程跳过。
+    套接字本身不做认证，只能放在服务用户私有的目录中（如 /tmp 这类公共目录会被拒绝）。
+    收到的消息交给 handler 处理（handler 应尽快返回，实际更新放到后台执行）；
+    发送方绑定了地址时回复处理结果，未绑定时不回复。
+    """
+    
+    def __init__(self, path: str, handler: Callable[[Dict], Dict]):
+        self.path = path
+        self.handler = handler
+        self._sock: Optional[socket.socket] = None
+        self._lock_fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> bool:
+        """获取文件锁并绑定套接字，返回本进程是否负责监听"""
+        if self._thread and self._thread.is_alive():
+            return True
+        
+        try:
+            _private_dir(self.path)
+            # 不跟随符号链接，避免被诱导创建或锁住其他文件
+            self._lock_fd = os.open(self.path + '.lock', os.O_WRONLY | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+        except OSError as e:
+            logging.error(f"控制套接字未启动: {str(e)}")
+            return False
+        
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # 其他进程已在监听
+            self._release()
+            return False
+        
+        try:
+            # 持有锁时残留的套接字文件一定来自已退出的进程
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            # 在umask下创建套接字文件，绑定后再chmod会留下权限过宽的窗口
+            old_umask = os.umask(SOCKET_UMASK)
+            try:
+                self._sock.bind(self.path)
+            finally:
+                os.umask(old_umask)
+        except OSError as e:
+            logging.error(f"绑定控制套接字失败: {str(e)}")
+            self._release()
+            return False
+        
+        self._thread = threading.Thread(target=self._run, name='control-socket', daemon=True)
+        self._thread.start()
+        logging.info(f"控制套接字已启动: {self.path}")
+        return True
+    
+    def stop(self):
+        """关闭套接字并释放文件锁"""
+        if self._sock:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self._release()
+    
+    def _release(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+    
+    def _run(self):
+        while self._sock:
+            try:
+                data, sender = self._sock.recvfrom(MAX_MESSAGE_SIZE)
+            except OSError:
+                return
+            
+            message = parse_message(data)
+            if message is None:
+                reply = {'success': False, 'message': '无效的控制消息'}
+            elif message.get('cmd') != 'trigger':
+                reply = {'success': False, 'message': f"未知命令: {message.get('cmd')}"}
+            else:
+                try:
+                    reply = self.handler(message)
+                except Exception as e:
+                    logging.error(f"处理控制消息失败: {str(e)}")
+                    reply = {'success': False, 'message': str(e)}
+            
+            if sender:
+                try:
+                    self._sock.sendto(json.dumps(reply, ensure_ascii=False).encode('utf-8'), sender)
+                except OSError:
+                    pass
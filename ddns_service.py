@@ -7,13 +7,34 @@ DDNS服务核心模块
 import logging
 import threading
 import os
+import time
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
 
-from config import Config
-from edgeone_client import EdgeOneClient
+import deadline
+import metrics
+import tracing
+from client_pool import ClientPool
+from config import Config, ConfigSnapshot, ZoneConfig
+from events import EventBus
+from inventory import DomainEntry
 from ip_detector import IPDetector
 from notification import NotificationManager
+from profiler import PROFILER
+from reconciler import Plan, PlannedChange, ZoneSnapshot, compute_plan, desired_state, execute_plan, failure_result
+from tracing import TraceStore, trace_cycle
+
+if TYPE_CHECKING:
+    # 腾讯云SDK导入较慢，只在创建客户端时导入
+    from edgeone_client import EdgeOneClient
+
+# 读取日志文件时最多读取末尾的字节数
+LOG_TAIL_BYTES = 64 * 1024
+# 日志文件由所有worker共同写入
+LOG_FILE = os.path.join('logs', 'ddns.log')
 
 class DNSService:
     """DDNS服务核心类"""
@@ -23,36 +44,90 @@ class DNSService:
         self.is_running = False
         self.last_check_time: Optional[datetime] = None
         self.last_ip: Optional[str] = None
-        self.update_history: List[Dict] = []
+        # 各协议最近一次检测到的IP，用于识别IP变化
+        self.last_ips: Dict[str, Optional[str]] = {'ipv4': None, 'ipv6': None}
         self.max_history = 100
+        # 内存日志：调度线程写入、Web线程读取和清空，均在 _history_lock 下进行
+        self.update_history: Deque[Dict] = deque(maxlen=self.max_history)
+        self._history_lock = threading.Lock()
+        
+        # 状态版本号：周期状态或日志变化时递增，供状态快照判断是否需要重建
+        self.status_version = 0
         
         # 初始化组件
-        self.edgeone_client: Optional[EdgeOneClient] = None
+        self.edgeone_client: Optional['EdgeOneClient'] = None
         self.ip_detector = IPDetector()
         self.notification_manager = NotificationManager()
+        self.event_bus = EventBus()
+        # 最近周期的span树
+        cfg = config.snapshot
+        self.traces = TraceStore(cfg.trace_history, cfg.trace_export_dir)
+        # 每个账号一个客户端和限流器，供该账号下的所有Zone共享
+        self.client_pool = ClientPool(cfg.api_rate_limit)
         
         # 线程锁
         self._lock = threading.Lock()
+        self._status_lock = threading.Lock()
+        
+        # 更新周期单飞闸门：同一时间只运行一个周期，运行期间到达的触发最多合并为一次后续周期
+        self._cycle_cond = threading.Condition()
+        self._cycle_in_flight = False
+        self._cycle_follow_up = False
+        # 运行期间到达的携带地址的触发 {(域名, 记录类型): IP}，后续周期中原样写入
+        self._queued_addresses: Dict[Tuple[str, str], str] = {}
+        self._cycle_started = 0
+        self._cycle_completed = 0
+        self._last_cycle_result: Dict = {}
+        self.cycle_stats = {
+            'cycles_run': 0,
+            'follow_up_runs': 0,
+            'coalesced_triggers': 0,
+            'coalesced_by_trigger': {},
+            'reconcile_skipped': 0
+        }
+        # 上次完整成功对账的 (状态, 时间)，用于 force_reconcile_interval；clock 可在模拟中替换
+        self.clock: Callable[[], float] = time.monotonic
+        self._last_reconcile: Optional[tuple] = None
+    
+    def _touch_status(self):
+        """标记服务状态已变化"""
+        with self._status_lock:
+            self.status_version += 1
+    
+    def _emit(self, event_type: str, data: Optional[Dict] = None):
+        """发布服务事件并标记状态变化"""
+        self._touch_status()
+        self.event_bus.publish(event_type, data)
+    
+    def _create_client(self, cfg: ConfigSnapshot) -> 'EdgeOneClient':
+        """为主Zone所属账号创建独立的EdgeOne客户端（延迟导入SDK），不经过客户端池"""
+        from edgeone_client import EdgeOneClient
+        account = cfg.accounts[cfg.zones[0].account]
+        return EdgeOneClient(account.secret_id, account.secret_key, endpoint=account.endpoint)
+    
+    def _primary_client(self, cfg: ConfigSnapshot) -> 'EdgeOneClient':
+        """客户端池中主Zone（第一个Zone）所属账号的客户端"""
+        return self.client_pool.get(cfg.accounts[cfg.zones[0].account])
+    
+    def _client_for(self, cfg: ConfigSnapshot, zone: ZoneConfig) -> 'EdgeOneClient':
+        """Zone所属账号的客户端；主账号使用 edgeone_client"""
+        if self.edgeone_client and zone.account == cfg.zones[0].account:
+            return self.edgeone_client
+        return self.client_pool.get(cfg.accounts[zone.account])
     
     def _init_clients(self) -> bool:
         """初始化API客户端"""
         try:
-            if not self.config.is_valid():
+            cfg = self.config.snapshot
+            if not cfg.is_valid:
                 logging.error("配置无效，无法初始化客户端")
                 return False
             
-            self.edgeone_client = EdgeOneClient(
-                self.config.secret_id,
-                self.config.secret_key
-            )
+            self.edgeone_client = self._primary_client(cfg)
             
             # 设置新的Webhook通知配置
-            if self.config.webhook_enabled:
-                self.notification_manager.set_webhook_config(
-                    self.config.webhook_url,
-                    self.config.webhook_headers,
-                    self.config.webhook_body_template
-                )
+            if cfg.webhook_enabled:
+                self._configure_notifications(cfg)
             
             logging.info("API客户端初始化成功")
             return True
@@ -61,8 +136,28 @@ class DNSService:
             logging.error(f"初始化客户端失败: {str(e)}")
             return False
     
-    def start(self) -> bool:
-        """启动DDNS服务"""
+    def _configure_notifications(self, cfg: ConfigSnapshot):
+        """按配置快照设置通知目标、后台分发和合并窗口"""
+        self.notification_manager.set_webhook_config(
+            cfg.webhook_url,
+            cfg.webhook_headers,
+            cfg.webhook_body_template,
+            cfg.webhook_max_payload_bytes
+        )
+        self.notification_manager.set_webhook_targets(cfg.webhook_targets)
+        # 通知改为后台发送，慢速Webhook不再阻塞DNS更新
+        if cfg.notification_async:
+            self.notification_manager.enable_async(
+                cfg.notification_queue_size,
+                cfg.notification_max_retries,
+                cfg.notification_spool_file
+            )
+        else:
+            self.notification_manager.disable_async()
+        self.notification_manager.set_coalesce_window(cfg.notification_coalesce_window)
+    
+    def start(self, initial_cycle: bool = True) -> bool:
+        """启动DDNS服务，initial_cycle 为False时不发送启动通知、不执行首次检查（由其他进程负责）"""
         with self._lock:
             if self.is_running:
                 logging.warning("DDNS服务已在运行")
@@ -73,20 +168,20 @@ class DNSService:
                 return False
             
             self.is_running = True
+            self._emit("service_status", {"is_running": True})
+            if not initial_cycle:
+                return True
             
             # 获取启用的域名列表
-            all_domains = []
-            if self.config.ipv4_enabled:
-                all_domains.extend(self.config.ipv4_domains)
-            if self.config.ipv6_enabled:
-                all_domains.extend(self.config.ipv6_domains)
+            cfg = self.config.snapshot
+            all_domains = list(cfg.enabled_domains)
             
             # 发送启动通知
-            if self.config.webhook_enabled and self.config.webhook_url and all_domains:
+            if cfg.webhook_configured and all_domains:
                 self.notification_manager.send_startup_notification(all_domains)
             
             # 执行首次检查
-            self.check_and_update_ip()
+            self.check_and_update_ip(trigger='startup')
             
             logging.info("DDNS服务启动成功")
             return True
@@ -95,16 +190,251 @@ class DNSService:
         """停止DDNS服务"""
         with self._lock:
             self.is_running = False
+            self._emit("service_status", {"is_running": False})
             logging.info("DDNS服务已停止")
             return True
     
+    def run_once(self, trigger: str = 'once', flush_timeout: float = 30.0) -> Dict:
+        """执行单次更新周期后退出（命令行 / cron 使用），不发送启动通知，也不启动后台调度
+        
+        返回前等待待发送的通知送达（最多 flush_timeout 秒）。
+        """
+        if not self._init_clients():
+            return {"success": False, "message": "初始化客户端失败"}
+        
+        self.is_running = True
+        try:
+            return self.check_and_update_ip(trigger=trigger)
+        finally:
+            self.is_running = False
+            self.notification_manager.flush(flush_timeout)
+    
+    def plan_changes(self) -> Dict:
+        """只读对账（dry run）：检测当前IP并与Zone中的记录比较，返回变更计划，不做修改"""
+        cfg = self.config.snapshot
+        if not cfg.is_valid:
+            return {"success": False, "message": "配置无效", "changes": []}
+        
+        ip_info = self.ip_detector.get_all_ips(cfg.ipv4_enabled, cfg.ipv6_enabled)
+        record_types = []
+        if cfg.ipv4_enabled:
+            record_types.append('A')
+        if cfg.ipv6_enabled:
+            record_types.append('AAAA')
+        
+        missing = [family for family, record_type in (('ipv4', 'A'), ('ipv6', 'AAAA'))
+                   if record_type in record_types and not ip_info.get(family)]
+        if missing:
+            return {
+                "success": False,
+                "message": f"获取{'/'.join(f.upper() for f in missing)}地址失败",
+                "error": "no_ip",
+                "ip_info": ip_info,
+                "changes": []
+            }
+        
+        # 每个Zone单独读取记录并计算计划，再合并
+        plan = Plan()
+        zones = {}
+        errors = {}
+        for zone in cfg.zones:
+            domains_by_type = {record_type: zone.domains_for(record_type) for record_type in record_types
+                               if zone.domains_for(record_type)}
+            if not domains_by_type:
+                continue
+            try:
+                snapshot = ZoneSnapshot.fetch(
+                    self._client_for(cfg, zone), zone.zone_id,
+                    [domain for domains in domains_by_type.values() for domain in domains],
+                    list(domains_by_type)
+                )
+            except Exception as e:
+                errors[zone.name] = f"读取Zone记录失败: {str(e)}"
+                continue
+            desired = desired_state(domains_by_type, {'A': ip_info.get('ipv4'), 'AAAA': ip_info.get('ipv6')})
+            zone_plan = compute_plan(desired, snapshot, zone.ttls)
+            zones[zone.name] = zone_plan.counts
+            plan.changes.extend(zone_plan.changes)
+        
+        if errors and not zones:
+            message = next(iter(errors.values())) if len(errors) == 1 else "读取Zone记录失败"
+            return {"success": False, "message": message, "errors": errors, "ip_info": ip_info, "changes": []}
+        
+        result = plan.to_dict()
+        result.update({
+            "success": not errors,
+            "message": f"共 {len(plan.changes)} 条记录，{plan.pending} 条需要变更",
+            "ip_info": ip_info,
+            "zones": zones
+        })
+        if errors:
+            result["errors"] = errors
+        return result
+    
     def restart(self) -> bool:
         """重启DDNS服务"""
         self.stop()
         return self.start()
     
-    def check_and_update_ip(self) -> Dict:
-        """检查并更新IP地址"""
+    def check_and_update_ip(self, progress_callback: Optional[Callable[[int, int], None]] = None,
+                            trigger: str = 'manual') -> Dict:
+        """检查并更新IP地址，progress_callback(done, total) 在每个域名处理完成后调用
+        
+        已有周期在运行时不会并发启动新周期：本次触发会排队一次后续周期（多个触发共享同一次），
+        并等待该后续周期完成后返回其结果。
+        """
+        return self._single_flight(self._run_cycle, progress_callback, trigger)
+    
+    def trigger_update(self, address: Optional[str] = None, family: Optional[str] = None,
+                       trigger: str = 'hook') -> Dict:
+        """外部事件触发更新（如ppp ip-up / dhclient钩子）
+        
+        携带新地址时直接用该地址更新对应协议的全部域名，跳过IP检测；否则执行完整周期。
+        """
+        if not address:
+            return self.check_and_update_ip(trigger=trigger)
+        
+        if not self.is_running:
+            return {"success": False, "message": "DDNS服务未运行"}
+        
+        family = family or ('ipv6' if ':' in address else 'ipv4')
+        record_type = 'A' if family == 'ipv4' else 'AAAA'
+        cfg = self.config.snapshot
+        if not getattr(cfg, f"{family}_enabled"):
+            return {"success": False, "message": f"{family.upper()} 未启用"}
+        
+        self._add_log("info", f"收到 {trigger} 触发，{family.upper()} 地址: {address}")
+        self._check_ip_changes({family: address})
+        addresses = {(domain, record_type): address for zone in cfg.zones for domain in zone.domains_for(record_type)}
+        return self._single_flight(partial(self._apply_addresses, addresses), None, trigger, addresses)
+    
+    def _single_flight(self, run: Callable, progress_callback: Optional[Callable[[int, int], None]],
+                       trigger: str, addresses: Optional[Dict[Tuple[str, str], str]] = None) -> Dict:
+        """在单飞闸门内执行 run
+        
+        运行期间到达的触发合并为一次后续周期：携带地址的触发（addresses 为 {(域名, 记录类型): IP}）
+        在后续周期中先按地址写入，其余触发合并为一次完整周期，完整周期跳过已按地址写入的记录。
+        """
+        with self._cycle_cond:
+            if self._cycle_in_flight:
+                self.cycle_stats['coalesced_triggers'] += 1
+                by_trigger = self.cycle_stats['coalesced_by_trigger']
+                by_trigger[trigger] = by_trigger.get(trigger, 0) + 1
+                if addresses:
+                    # 同一记录多次推送时以最后一次为准
+                    self._queued_addresses.update(addresses)
+                else:
+                    self._cycle_follow_up = True
+                target = self._cycle_started + 1
+                logging.debug(f"更新周期进行中，触发 {trigger} 已合并到下一次周期")
+                self._touch_status()
+                while self._cycle_completed < target:
+                    self._cycle_cond.wait()
+                return self._last_cycle_result
+            self._cycle_in_flight = True
+        
+        first_result = None
+        try:
+            while True:
+                with self._cycle_cond:
+                    self._cycle_started += 1
+                    self.cycle_stats['cycles_run'] += 1
+                
+                # 每个周期（包括合并的后续周期）各有一份时间预算
+                budget = deadline.Deadline(self.config.snapshot.cycle_timeout, self.clock)
+                with trace_cycle(trigger, self.traces) as trace, PROFILER.profiled('scheduler'), \
+                        deadline.scope(budget):
+                    result = run(progress_callback)
+                    trace.root.set(success=result.get('success'))
+                result['cycle_id'] = trace.id
+                if first_result is None:
+                    first_result = result
+                
+                with self._cycle_cond:
+                    self._cycle_completed = self._cycle_started
+                    self._last_cycle_result = result
+                    self._cycle_cond.notify_all()
+                    if not self._cycle_follow_up and not self._queued_addresses:
+                        self._cycle_in_flight = False
+                        return first_result
+                    # 运行期间有新的触发，执行一次后续周期
+                    run = partial(self._run_follow_up, self._queued_addresses, self._cycle_follow_up)
+                    self._cycle_follow_up = False
+                    self._queued_addresses = {}
+                    self.cycle_stats['follow_up_runs'] += 1
+                # 后续周期属于合并进来的触发，不再汇报给原调用方
+                progress_callback = None
+                trigger = 'coalesced'
+        except BaseException:
+            with self._cycle_cond:
+                self._cycle_in_flight = False
+                self._cycle_follow_up = False
+                self._queued_addresses = {}
+                self._cycle_completed = self._cycle_started
+                self._last_cycle_result = {"success": False, "message": "更新周期异常中断"}
+                self._cycle_cond.notify_all()
+            raise
+    
+    def _run_follow_up(self, addresses: Dict[Tuple[str, str], str], full: bool,
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """合并进来的触发：先按携带的地址写入，需要时再执行一次完整周期（跳过已按地址写入的记录）"""
+        pushed = self._apply_addresses(addresses) if addresses else None
+        if not full:
+            return pushed
+        result = self._run_cycle(skip=set(addresses))
+        if pushed:
+            result['results'] = pushed['results'] + (result.get('results') or [])
+            result['success'] = result.get('success', False) and pushed['success']
+        return result
+    
+    def _apply_addresses(self, addresses: Dict[Tuple[str, str], str],
+                         progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """按触发携带的地址更新记录，不进行IP检测；addresses 为 {(域名, 记录类型): IP}"""
+        cfg = self.config.snapshot
+        # 周期外的写入使上次对账结果失效；在闸门内清除，不会被进行中的周期重新设置
+        self._last_reconcile = None
+        groups: Dict[Tuple[str, str], Set[str]] = {}
+        for (domain, record_type), ip_address in addresses.items():
+            groups.setdefault((record_type, ip_address), set()).add(domain)
+        
+        results = []
+        with deadline.scope(deadline.current().reserve()):
+            for (record_type, ip_address), domains in groups.items():
+                results.extend(self._update_zones(cfg, {record_type: ip_address}, only={record_type: domains}))
+        
+        success_updates = sum(1 for r in results if r.get('success'))
+        message = f"按指定地址更新完成, 成功: {success_updates}/{len(results)}"
+        cancelled = self._observe_cancelled(results)
+        if cancelled:
+            message += f"（超出周期时间预算，{cancelled} 条未处理）"
+        self._add_log("info" if not cancelled else "warning", message)
+        
+        if cfg.webhook_configured:
+            if len(results) > 1:
+                self.notification_manager.send_batch_update_notification(results)
+            elif results and results[0].get('success') and results[0].get('action') in ('updated', 'created'):
+                self.notification_manager.send_ip_update_notification(
+                    results[0]['domain'],
+                    results[0].get('old_ip'),
+                    results[0]['ip_address'],
+                    results[0]['action']
+                )
+        
+        result = {
+            "success": success_updates == len(results),
+            "message": message,
+            "results": results
+        }
+        if cancelled:
+            result["cancelled"] = cancelled
+        return result
+    
+    def _run_cycle(self, progress_callback: Optional[Callable[[int, int], None]] = None,
+                   skip: Optional[Set[Tuple[str, str]]] = None) -> Dict:
+        """执行一次完整的检测与更新周期，skip 中的 (域名, 记录类型) 不更新"""
+        # 整个周期使用同一份配置快照
+        cfg = self.config.snapshot
+        
         if not self.is_running:
             return {"success": False, "message": "DDNS服务未运行"}
         
@@ -112,7 +442,7 @@ class DNSService:
             return {"success": False, "message": "EdgeOne客户端未初始化"}
         
         # 检查是否启用了任何IP类型
-        if not self.config.ipv4_enabled and not self.config.ipv6_enabled:
+        if not cfg.ipv4_enabled and not cfg.ipv6_enabled:
             self._add_log("info", "未启用任何IP类型，跳过DDNS任务")
             return {
                 "success": True,
@@ -122,52 +452,105 @@ class DNSService:
                 "results": []
             }
         
+        self._emit("cycle_start", {
+            "ipv4_enabled": cfg.ipv4_enabled,
+            "ipv6_enabled": cfg.ipv6_enabled
+        })
+        
+        last_ips = dict(self.last_ips)
+        start = time.perf_counter()
+        result = self._detect_and_update(cfg, progress_callback, skip)
+        metrics.observe_cycle(time.perf_counter() - start, result.get('success', False), self.last_ips != last_ips)
+        return result
+    
+    def _detect_and_update(self, cfg: ConfigSnapshot,
+                           progress_callback: Optional[Callable[[int, int], None]] = None,
+                           skip: Optional[Set[Tuple[str, str]]] = None) -> Dict:
+        """检测公网IP并更新所有域名（周期的主体部分）
+        
+        检测和更新在预留通知预算之前结束，超出预算时未处理的域名为 cancelled，仍然汇报和通知部分结果。
+        """
+        work = deadline.current().reserve()
         try:
             # 获取所有IP信息
-            ip_info = self.ip_detector.get_all_ips(
-                self.config.ipv4_enabled, 
-                self.config.ipv6_enabled
-            )
+            with tracing.span('detect'), deadline.scope(work):
+                ip_info = self.ip_detector.get_all_ips(
+                    cfg.ipv4_enabled, 
+                    cfg.ipv6_enabled
+                )
+            self._check_ip_changes(ip_info)
             
-            results = []
-            total_updates = 0
-            success_updates = 0
-            
-            # 处理IPv4更新
-            if self.config.ipv4_enabled:
-                ipv4_address = ip_info.get('ipv4')
-                if ipv4_address:
-                    ipv4_results = self.update_dns_records(ipv4_address, 'A')
-                    results.extend(ipv4_results)
-                    total_updates += len(ipv4_results)
-                    success_updates += sum(1 for r in ipv4_results if r.get('success'))
-                else:
-                    self._add_log("error", "获取IPv4地址失败")
-            
-            # 处理IPv6更新
-            if self.config.ipv6_enabled:
-                ipv6_address = ip_info.get('ipv6')
-                if ipv6_address:
-                    ipv6_results = self.update_dns_records(ipv6_address, 'AAAA')
-                    results.extend(ipv6_results)
-                    total_updates += len(ipv6_results)
-                    success_updates += sum(1 for r in ipv6_results if r.get('success'))
+            # 公网IP与上次完整对账时相同，且未到强制对账时间时，不调用API
+            reconcile_key = self._reconcile_key(cfg, ip_info)
+            if self._reconcile_fresh(cfg, reconcile_key):
+                with self._cycle_cond:
+                    self.cycle_stats['reconcile_skipped'] += 1
+                self.last_check_time = datetime.now()
+                message = "公网IP未变化，跳过对账"
+                self._emit("cycle_finish", {"success": True, "message": message, "skipped": True})
+                return {"success": True, "message": message, "action": "skipped", "ip_info": ip_info, "results": []}
+            
+            # 检测到的IP由所有Zone共享
+            ip_by_type = {}
+            for family, record_type in (('ipv4', 'A'), ('ipv6', 'AAAA')):
+                if not getattr(cfg, f"{family}_enabled"):
+                    continue
+                if ip_info.get(family):
+                    ip_by_type[record_type] = ip_info[family]
                 else:
-                    self._add_log("error", "获取IPv6地址失败")
+                    self._add_log("error", f"获取{family.upper()}地址失败")
+            
+            # 进度统计：以本周期需要处理的域名总数为分母（多个Zone并发回调）
+            on_result = None
+            if progress_callback:
+                expected = sum(len(zone.domains_for(record_type)) for zone in cfg.zones for record_type in ip_by_type)
+                done = [0]
+                done_lock = threading.Lock()
+                progress_callback(0, expected)
+                
+                def on_result(result: Dict):
+                    with done_lock:
+                        done[0] += 1
+                        progress_callback(done[0], expected)
+            
+            with deadline.scope(work):
+                results = self._update_zones(cfg, ip_by_type, on_result, skip=skip)
+            total_updates = len(results)
+            success_updates = sum(1 for r in results if r.get('success'))
             
             if not results:
-                return {"success": False, "message": "没有可更新的IP地址"}
+                if work.expired:
+                    metrics.CYCLE_DEADLINE_EXCEEDED.inc()
+                    message = "周期时间预算已用完，未能检测到IP地址"
+                else:
+                    message = "没有可更新的IP地址"
+                self._emit("cycle_finish", {"success": False, "message": message})
+                return {"success": False, "message": message, "error": "no_ip"}
             
             self.last_check_time = datetime.now()
+            # 跳过的记录保持推送的地址，与检测到的IP不一定一致，不能作为完整对账
+            if success_updates == total_updates and not skip:
+                self._last_reconcile = (reconcile_key, self.clock())
             
             # 更新last_ip（用于向后兼容，保存最后一次的IPv4地址）
-            if self.config.ipv4_enabled:
+            if cfg.ipv4_enabled:
                 self.last_ip = ip_info.get('ipv4')
             
-            self._add_log("info", f"IP更新完成, 成功: {success_updates}/{total_updates}")
+            message = f"IP更新完成, 成功: {success_updates}/{total_updates}"
+            cancelled = self._observe_cancelled(results)
+            if cancelled:
+                message += f"（超出周期时间预算，{cancelled} 条未处理）"
+            self._add_log("info" if not cancelled else "warning", message)
+            self._emit("cycle_finish", {
+                "success": success_updates == total_updates,
+                "message": message,
+                "success_count": success_updates,
+                "total_count": total_updates,
+                "last_check_time": self.last_check_time.isoformat()
+            })
             
             # 发送通知
-            if self.config.webhook_enabled and self.config.webhook_url:
+            if cfg.webhook_configured:
                 if len(results) > 1:
                     self.notification_manager.send_batch_update_notification(results)
                 elif results:
@@ -179,64 +562,351 @@ class DNSService:
                         result.get('action', 'updated')
                     )
             
-            return {
+            result = {
                 "success": success_updates == total_updates,
-                "message": f"IP更新完成, 成功: {success_updates}/{total_updates}",
+                "message": message,
                 "ip_info": ip_info,
                 "results": results
             }
+            if cancelled:
+                result["cancelled"] = cancelled
+            return result
             
         except Exception as e:
             error_msg = f"检查更新IP失败: {str(e)}"
             self._add_log("error", error_msg)
+            self._emit("cycle_finish", {"success": False, "message": error_msg})
             
             # 发送错误通知
-            if self.config.webhook_enabled and self.config.webhook_url:
+            if cfg.webhook_configured:
                 self.notification_manager.send_error_notification(error_msg)
             
             return {"success": False, "message": error_msg}
     
-    def update_dns_records(self, ip_address: str, record_type: str = 'A') -> List[Dict]:
-        """更新所有域名的DNS记录"""
-        if not self.edgeone_client:
+    def push_update(self, hostname: str, ip_address: str) -> Dict:
+        """处理路由器主动推送的IP（dyndns2），只更新指定域名，不经过IP检测
+        
+        与其他触发一样经过单飞闸门和周期时间预算。域名不属于任何Zone时返回 reason 为 nohost 的失败结果；
+        该域名未配置对应协议的记录时返回失败，不会为其创建记录。
+        """
+        if not self.is_running or not self.edgeone_client:
+            return {"success": False, "message": "DDNS服务未运行"}
+        
+        cfg = self.config.snapshot
+        family = 'ipv6' if ':' in ip_address else 'ipv4'
+        record_type = 'AAAA' if family == 'ipv6' else 'A'
+        if not any(cfg.zone_for(hostname, rtype) for rtype in ('A', 'AAAA')):
+            return {"success": False, "reason": "nohost", "message": f"{hostname} 不属于任何已配置的Zone"}
+        zone = cfg.zone_for(hostname, record_type)
+        if zone is None or not getattr(cfg, f"{family}_enabled"):
+            return {"success": False, "message": f"{hostname} 未配置 {family.upper()} 记录"}
+        
+        addresses = {(hostname, record_type): ip_address}
+        cycle = self._single_flight(partial(self._apply_addresses, addresses), None, 'dyndns', addresses)
+        # 合并到进行中的周期时，结果来自后续周期；同一主机随后又推送了其他地址时以后者为准
+        for result in cycle.get('results') or []:
+            if result.get('domain') == hostname and result.get('record_type') == record_type:
+                if result.get('ip_address') != ip_address:
+                    return {"success": False, "message": f"{hostname} 已被随后的推送更新为 {result.get('ip_address')}"}
+                return result
+        return {"success": False, "message": cycle.get('message') or f"更新 {hostname} 失败"}
+    
+    def apply_config_changes(self, old_data: Dict, update_records: bool = True) -> Dict:
+        """增量应用配置变更：只处理与运行中配置存在差异的部分
+        
+        - 凭据变化：仅重建EdgeOne客户端
+        - Zone变化：执行一次完整周期
+        - Webhook变化：仅更新通知配置
+        - 新增域名或新启用的协议：只更新受影响的域名
+        删除的域名不会删除已有的解析记录，与完整周期的行为一致。
+        update_records 为False时只更新本进程的客户端和通知配置，解析记录和通知由负责应用变更的进程处理。
+        """
+        # 使用同一份域名清单编译旧配置，只比较配置文件本身的差异
+        old = ConfigSnapshot.from_data(old_data, self.config.inventory)
+        new = self.config.snapshot
+        
+        def changed(*fields) -> bool:
+            return any(getattr(old, field) != getattr(new, field) for field in fields)
+        
+        if not new.is_valid:
+            self.stop()
+            return {"success": False, "message": "配置无效，服务已停止", "changes": ["stopped"]}
+        
+        if not self.is_running:
+            # 服务未运行时按完整流程启动
+            success = self.start(initial_cycle=update_records)
+            return {
+                "success": success,
+                "message": "服务已启动" if success else "服务启动失败",
+                "changes": ["started"]
+            }
+        
+        changes = []
+        
+        if changed('accounts', 'api_rate_limit'):
+            self.client_pool.configure(new.api_rate_limit, new.accounts.values())
+        
+        if changed('accounts'):
+            try:
+                self.edgeone_client = self._primary_client(new)
+                changes.append("credentials")
+            except Exception as e:
+                error_msg = f"重建EdgeOne客户端失败: {str(e)}"
+                self._add_log("error", error_msg)
+                return {"success": False, "message": error_msg, "changes": changes}
+        
+        if changed('trace_history', 'trace_export_dir'):
+            self.traces.configure(new.trace_history, new.trace_export_dir)
+        
+        if changed('webhook_enabled', 'webhook_url', 'webhook_headers', 'webhook_body_template',
+                   'webhook_targets', 'webhook_max_payload_bytes', 'notification_coalesce_window',
+                   'notification_async', 'notification_queue_size', 'notification_max_retries',
+                   'notification_spool_file'):
+            if new.webhook_enabled:
+                self._configure_notifications(new)
+            else:
+                # 关闭Webhook后停止后台分发线程，暂存文件保留到下次启用
+                self.notification_manager.disable_async()
+            changes.append("webhook")
+        
+        if not update_records:
+            if not changes:
+                changes.append("none")
+            return {"success": True, "message": "配置已替换，解析记录由其他进程更新", "changes": changes, "results": []}
+        
+        if {(zone.name, zone.zone_id, zone.account) for zone in old.zones} != \
+                {(zone.name, zone.zone_id, zone.account) for zone in new.zones}:
+            # 新的Zone中记录状态未知，需要完整对账
+            changes.append("zone")
+            result = self.check_and_update_ip(trigger='config')
+            result["changes"] = changes
+            return result
+        
+        # 计算每个协议需要处理的域名（此时两份配置的Zone相同，按Zone比较域名列表）
+        old_zones = {zone.name: zone for zone in old.zones}
+        pending = {}
+        for family, record_type in (('ipv4', 'A'), ('ipv6', 'AAAA')):
+            if not getattr(new, f"{family}_enabled"):
+                continue
+            if not getattr(old, f"{family}_enabled"):
+                # 新启用的协议：处理全部域名
+                added = [domain for zone in new.zones for domain in zone.domains_for(record_type)]
+            else:
+                added = [domain for zone in new.zones for domain in zone.domains_for(record_type)
+                         if domain not in old_zones[zone.name].domains_for(record_type)]
+            if added:
+                pending[record_type] = list(dict.fromkeys(added))
+        
+        if not pending:
+            if not changes:
+                changes.append("none")
+            self._add_log("info", f"配置已增量应用: {', '.join(changes)}")
+            return {"success": True, "message": "配置已应用，无需更新解析记录", "changes": changes, "results": []}
+        
+        changes.extend(f"domains:{record_type}" for record_type in pending)
+        
+        def run_partial(progress_callback):
+            return self._run_partial_update(pending, progress_callback)
+        
+        result = self._single_flight(run_partial, None, 'config')
+        result["changes"] = changes
+        return result
+    
+    def apply_inventory_changes(self, entries: Iterable[DomainEntry]) -> Dict:
+        """域名清单新增或修改了条目后，只更新这些域名（已禁用的条目和未启用的协议被跳过）"""
+        if not self.is_running:
+            return {"success": True, "message": "服务未运行，新域名将在服务启动后更新", "results": []}
+        
+        cfg = self.config.snapshot
+        pending = {}
+        for entry in entries:
+            if entry.enabled and getattr(cfg, f"{entry.family}_enabled"):
+                pending.setdefault(entry.record_type, []).append(entry.domain)
+        if not pending:
+            return {"success": True, "message": "无需更新解析记录", "results": []}
+        
+        def run_partial(progress_callback):
+            return self._run_partial_update(pending, progress_callback)
+        
+        return self._single_flight(run_partial, None, 'inventory')
+    
+    def _run_partial_update(self, pending: Dict[str, List[str]],
+                            progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """只更新指定的域名，优先复用最近一次检测到的IP"""
+        cfg = self.config.snapshot
+        # 周期外的写入使上次对账结果失效；在闸门内清除，不会被进行中的周期重新设置
+        self._last_reconcile = None
+        ip_by_type = {}
+        
+        for record_type in pending:
+            family = 'ipv4' if record_type == 'A' else 'ipv6'
+            ip_address = self.last_ips.get(family)
+            if not ip_address:
+                ip_address = self.ip_detector.get_ipv4() if family == 'ipv4' else self.ip_detector.get_ipv6()
+                if not ip_address:
+                    self._add_log("error", f"获取{family.upper()}地址失败")
+                    continue
+                self._check_ip_changes({family: ip_address})
+            ip_by_type[record_type] = ip_address
+        
+        with deadline.scope(deadline.current().reserve()):
+            results = self._update_zones(cfg, ip_by_type, only={
+                record_type: set(domains) for record_type, domains in pending.items()
+            })
+        
+        success_updates = sum(1 for r in results if r.get('success'))
+        message = f"增量更新完成, 成功: {success_updates}/{len(results)}"
+        cancelled = self._observe_cancelled(results)
+        if cancelled:
+            message += f"（超出周期时间预算，{cancelled} 条未处理）"
+        self._add_log("info" if not cancelled else "warning", message)
+        
+        if results and cfg.webhook_configured:
+            self.notification_manager.send_batch_update_notification(results)
+        
+        result = {
+            "success": success_updates == len(results),
+            "message": message,
+            "results": results
+        }
+        if cancelled:
+            result["cancelled"] = cancelled
+        return result
+    
+    @staticmethod
+    def _observe_cancelled(results: List[Dict]) -> int:
+        """因周期预算用完而未处理的记录数，大于0时计入超时周期"""
+        cancelled = sum(1 for r in results if r.get('action') == 'cancelled')
+        if cancelled:
+            metrics.CYCLE_DEADLINE_EXCEEDED.inc()
+        return cancelled
+    
+    @staticmethod
+    def _reconcile_key(cfg: ConfigSnapshot, ip_info: Dict) -> tuple:
+        """决定对账结果是否仍然有效的状态：各Zone及其域名、各协议的IP"""
+        return (
+            cfg.zones,
+            ip_info.get('ipv4') if cfg.ipv4_enabled else None,
+            ip_info.get('ipv6') if cfg.ipv6_enabled else None
+        )
+    
+    def _reconcile_fresh(self, cfg: ConfigSnapshot, reconcile_key: tuple) -> bool:
+        """上次完整成功的对账是否仍可信任（force_reconcile_interval 为0时总是重新对账）"""
+        if not cfg.force_reconcile_interval or self._last_reconcile is None:
+            return False
+        key, reconciled_at = self._last_reconcile
+        return key == reconcile_key and self.clock() - reconciled_at < cfg.force_reconcile_interval
+    
+    def _check_ip_changes(self, ip_info: Dict):
+        """对比检测到的IP与上次结果，发布IP变化事件"""
+        for family in ('ipv4', 'ipv6'):
+            new_ip = ip_info.get(family)
+            if not new_ip:
+                continue
+            old_ip = self.last_ips.get(family)
+            if old_ip != new_ip:
+                self.last_ips[family] = new_ip
+                self._emit("ip_change", {"family": family, "old_ip": old_ip, "new_ip": new_ip})
+    
+    def _update_zones(self, cfg: ConfigSnapshot, ip_by_type: Dict[str, str],
+                      on_result: Optional[Callable[[Dict], None]] = None,
+                      only: Optional[Dict[str, set]] = None,
+                      skip: Optional[Set[Tuple[str, str]]] = None) -> List[Dict]:
+        """对每个Zone执行对账流水线，only 指定时每个记录类型只处理其中的域名，skip 中的 (域名, 记录类型) 不处理
+        
+        多个Zone时在最多 zone_workers 个线程中并发执行，同一账号的请求由客户端池统一限速；
+        单个Zone的异常只影响该Zone的域名。结果按Zone、记录类型的配置顺序返回。
+        """
+        work = []
+        for zone in cfg.zones:
+            tasks = []
+            for record_type, ip_address in ip_by_type.items():
+                domains = zone.domains_for(record_type)
+                if only is not None:
+                    wanted = only.get(record_type, ())
+                    domains = [domain for domain in domains if domain in wanted]
+                if skip:
+                    domains = [domain for domain in domains if (domain, record_type) not in skip]
+                if domains:
+                    tasks.append((record_type, ip_address, list(domains)))
+            if tasks:
+                work.append((zone, tasks))
+        
+        workers = min(cfg.zone_workers, len(work))
+        if workers <= 1:
+            return [result for zone, tasks in work for result in self._update_zone(cfg, zone, tasks, on_result)]
+        
+        # 工作线程中的span挂到当前周期的span树上，并使用同一个截止时间
+        parent = tracing.current_span()
+        budget = deadline.current()
+        
+        def run(item) -> List[Dict]:
+            zone, tasks = item
+            with tracing.attach(parent), deadline.scope(budget), PROFILER.profiled('scheduler'):
+                return self._update_zone(cfg, zone, tasks, on_result)
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ddns-zone') as executor:
+            return [result for zone_results in executor.map(run, work) for result in zone_results]
+    
+    def _update_zone(self, cfg: ConfigSnapshot, zone: ZoneConfig, tasks: List[tuple],
+                     on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """一个Zone的对账流水线：依次处理 (记录类型, IP, 域名列表)"""
+        results = []
+        with tracing.span('zone', zone=zone.name, zone_id=zone.zone_id):
+            for record_type, ip_address, domains in tasks:
+                try:
+                    results.extend(self.update_dns_records(ip_address, record_type, on_result,
+                                                           domains=domains, cfg=cfg, zone=zone))
+                except Exception as e:
+                    self._add_log("error", f"Zone {zone.name} 对账失败: {str(e)}")
+                    for domain in domains:
+                        result = failure_result(domain, e)
+                        result.update({
+                            "domain": domain,
+                            "ip_address": ip_address,
+                            "record_type": record_type,
+                            "zone": zone.name,
+                            "timestamp": datetime.now().isoformat()
+                        })
+                        results.append(result)
+                        if on_result:
+                            on_result(result)
+        return results
+    
+    def update_dns_records(self, ip_address: str, record_type: str = 'A',
+                           on_result: Optional[Callable[[Dict], None]] = None,
+                           domains: Optional[List[str]] = None,
+                           cfg: Optional[ConfigSnapshot] = None,
+                           zone: Optional[ZoneConfig] = None) -> List[Dict]:
+        """更新一个Zone中域名的DNS记录，未指定 zone 时使用主Zone，未指定 domains 时更新该记录类型的全部域名
+        
+        先批量读取现有记录生成变更计划，再按计划执行：无变更的记录不调用API，修改合并为批量请求。
+        """
+        cfg = cfg or self.config.snapshot
+        zone = zone or (cfg.zones[0] if cfg.zones else None)
+        if zone is None:
             return []
         
-        # 根据记录类型选择域名列表
-        if record_type == 'A':
-            domains = self.config.ipv4_domains
-        elif record_type == 'AAAA':
-            domains = self.config.ipv6_domains
-        else:
+        # 本次更新始终使用同一个客户端，即使配置变更期间客户端被替换
+        client = self._client_for(cfg, zone)
+        if not client:
             return []
         
+        # 根据记录类型选择域名列表
+        if domains is None:
+            domains = zone.domains_for(record_type)
+        
         if not domains:
             return []
         
         results = []
         
-        for domain in domains:
-            if record_type == 'A':
-                result = self.edgeone_client.update_or_create_a_record(
-                    self.config.zone_id,
-                    domain,
-                    ip_address
-                )
-            elif record_type == 'AAAA':
-                result = self.edgeone_client.update_or_create_aaaa_record(
-                    self.config.zone_id,
-                    domain,
-                    ip_address
-                )
-            else:
-                result = {
-                    "success": False,
-                    "message": f"不支持的记录类型: {record_type}"
-                }
-            
+        def finish(change: PlannedChange, result: Dict):
             # 添加域名信息到结果
-            result['domain'] = domain
+            result['domain'] = change.domain
             result['ip_address'] = ip_address
             result['record_type'] = record_type
+            result['zone'] = zone.name
             result['timestamp'] = datetime.now().isoformat()
             
             # 记录日志
@@ -244,57 +914,112 @@ class DNSService:
                 self._add_log("info", result['message'])
             else:
                 self._add_log("error", result['message'])
+            metrics.observe_record(record_type, result)
             
+            self._emit("domain_result", {
+                "domain": change.domain,
+                "record_type": record_type,
+                "zone": zone.name,
+                "action": result.get('action'),
+                "success": result['success'],
+                "ip_address": ip_address,
+                "old_ip": result.get('old_ip'),
+                "message": result['message']
+            })
             results.append(result)
+            if on_result:
+                on_result(result)
         
-        return results
+        desired = desired_state({record_type: domains}, {record_type: ip_address})
+        try:
+            with tracing.span('fetch_records', record_type=record_type, domains=len(domains)):
+                snapshot = ZoneSnapshot.fetch(client, zone.zone_id, domains, [record_type])
+        except Exception as e:
+            # 读取失败时所有域名都无法对账
+            for domain, _, _ in desired:
+                result = failure_result(domain, e)
+                finish(PlannedChange('none', domain, record_type, ip_address), result)
+            return results
+        
+        with tracing.span('compute_plan', record_type=record_type) as plan_span:
+            plan = compute_plan(desired, snapshot, zone.ttls)
+            plan_span.set(**plan.counts)
+        # 返回按计划顺序（即配置顺序）排列的结果
+        with tracing.span('execute_plan', record_type=record_type):
+            return execute_plan(client, zone.zone_id, plan, finish)
     
     def get_status(self) -> Dict:
         """获取服务状态"""
         # 计算域名数量
-        ipv4_count = len(self.config.ipv4_domains) if self.config.ipv4_domains else 0
-        ipv6_count = len(self.config.ipv6_domains) if self.config.ipv6_domains else 0
+        cfg = self.config.snapshot
+        ipv4_count, ipv6_count = cfg.total_domains
         total_count = ipv4_count + ipv6_count
         
         return {
             "is_running": self.is_running,
             "last_check_time": self.last_check_time.isoformat() if self.last_check_time else None,
             "last_ip": self.last_ip,
-            "config_valid": self.config.is_valid(),
+            "config_valid": cfg.is_valid,
             "ipv4_domains": ipv4_count,
             "ipv6_domains": ipv6_count,
             "total_domains": total_count,
-            "update_interval": self.config.update_interval
+            "zones": len(cfg.zones),
+            "update_interval": cfg.update_interval,
+            "cycle_stats": self.get_cycle_stats()
         }
     
+    def get_cycle_stats(self) -> Dict:
+        """获取更新周期及触发合并统计"""
+        with self._cycle_cond:
+            stats = dict(self.cycle_stats)
+            stats['coalesced_by_trigger'] = dict(self.cycle_stats['coalesced_by_trigger'])
+            stats['in_flight'] = self._cycle_in_flight
+            return stats
+    
     def get_recent_logs(self, limit: int = 50, include_file_logs: bool = True) -> List[Dict]:
         """获取最近的日志记录"""
         logs = []
+        with self._history_lock:
+            history = list(self.update_history)
         
         # 如果启用文件日志，从日志文件读取更多日志
         if include_file_logs:
-            file_logs = self._get_logs_from_file(limit - len(self.update_history))
+            file_logs = self._get_logs_from_file(limit - len(history))
             logs.extend(file_logs)
         
         # 添加内存中的最新日志
-        logs.extend(self.update_history)
+        logs.extend(history)
         
         # 按时间排序并限制数量
         logs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
         return logs[:limit] if logs else []
     
+    def log_file_version(self) -> Tuple:
+        """日志文件的版本标识，其他worker写入日志时也会变化"""
+        try:
+            st = os.stat(LOG_FILE)
+        except OSError:
+            return ()
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+    
     def _get_logs_from_file(self, limit: int) -> List[Dict]:
         """从日志文件读取最近的日志记录"""
         try:
-            import os
-            log_file = os.path.join('logs', 'ddns.log')
+            log_file = LOG_FILE
             
             if not os.path.exists(log_file):
                 return []
             
             file_logs = []
-            with open(log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            # 只读取文件末尾，日志文件最大10MB，每次请求都整体读入代价过高
+            with open(log_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - LOG_TAIL_BYTES))
+                lines = f.read().decode('utf-8', errors='replace').splitlines()
+            if size > LOG_TAIL_BYTES:
+                # 第一行可能被截断
+                lines = lines[1:]
                 
             # 只读取最后几行
             recent_lines = lines[-50:] if len(lines) > 50 else lines
@@ -342,21 +1067,49 @@ class DNSService:
             "message": message
         }
         
-        self.update_history.append(log_entry)
-        
-        # 限制历史记录数量
-        if len(self.update_history) > self.max_history:
-            self.update_history = self.update_history[-self.max_history:]
+        # deque 自动丢弃超出 max_history 的旧记录
+        with self._history_lock:
+            self.update_history.append(log_entry)
+        self._emit("log", log_entry)
         
         # 记录到系统日志
         log_method = getattr(logging, level.lower(), logging.info)
         log_method(message)
     
+    def clear_logs(self):
+        """清空内存中的日志"""
+        with self._history_lock:
+            self.update_history.clear()
+        self._add_log("info", "日志已清空")
+    
     def test_connectivity(self) -> Dict:
-        """测试连接性"""
+        """测试连接性
+        
+        使用独立的客户端实例，不替换正在运行的周期所使用的客户端和通知配置。
+        """
         try:
-            if not self._init_clients():
+            cfg = self.config.snapshot
+            if not cfg.is_valid:
+                logging.error("配置无效，无法初始化客户端")
+                return {"success": False, "message": "初始化客户端失败"}
+            
+            try:
+                edgeone_client = self._create_client(cfg)
+            except Exception as e:
+                logging.error(f"初始化客户端失败: {str(e)}")
                 return {"success": False, "message": "初始化客户端失败"}
+            # 测试主Zone
+            zone = cfg.zones[0]
+            
+            notification_manager = NotificationManager()
+            if cfg.webhook_enabled:
+                notification_manager.set_webhook_config(
+                    cfg.webhook_url,
+                    cfg.webhook_headers,
+                    cfg.webhook_body_template,
+                    cfg.webhook_max_payload_bytes
+                )
+                notification_manager.set_webhook_targets(cfg.webhook_targets)
             
             # 测试EdgeOne API连接
             test_results = {}
@@ -365,14 +1118,14 @@ class DNSService:
             ipv4_ip = None
             ipv6_ip = None
             
-            if self.config.ipv4_enabled:
+            if cfg.ipv4_enabled:
                 ipv4_ip = self.ip_detector.get_ipv4()
                 test_results['ipv4'] = {
                     "success": bool(ipv4_ip),
                     "value": ipv4_ip or "获取失败"
                 }
             
-            if self.config.ipv6_enabled:
+            if cfg.ipv6_enabled:
                 ipv6_ip = self.ip_detector.get_ipv6()
                 test_results['ipv6'] = {
                     "success": bool(ipv6_ip),
@@ -388,7 +1141,7 @@ class DNSService:
             
             # 2. 测试EdgeOne API
             try:
-                response = self.edgeone_client.describe_dns_records(self.config.zone_id)
+                response = edgeone_client.describe_dns_records(zone.zone_id)
                 test_results['edgeone_api'] = {
                     "success": True,
                     "value": "连接正常"
@@ -401,8 +1154,8 @@ class DNSService:
             
             # 3. 测试Webhook通知
             try:
-                if self.config.webhook_enabled and self.config.webhook_url:
-                    webhook_success = self.notification_manager.send_test_notification()
+                if cfg.webhook_configured:
+                    webhook_success = notification_manager.send_test_notification()
                     test_results['webhook'] = {
                         "success": webhook_success,
                         "value": "发送成功" if webhook_success else "发送失败"
@@ -420,15 +1173,15 @@ class DNSService:
             
             # 4. 查找现有DNS记录
             all_domains = []
-            if self.config.ipv4_domains:
-                all_domains.extend(self.config.ipv4_domains)
-            if self.config.ipv6_domains:
-                all_domains.extend(self.config.ipv6_domains)
+            if zone.ipv4_domains:
+                all_domains.extend(zone.ipv4_domains)
+            if zone.ipv6_domains:
+                all_domains.extend(zone.ipv6_domains)
                 
             if all_domains:
                 domain_test_results = []
                 for domain in all_domains[:3]:  # 只测试前3个域名
-                    record = self.edgeone_client.find_a_record(self.config.zone_id, domain)
+                    record = edgeone_client.find_a_record(zone.zone_id, domain)
                     domain_test_results.append({
                         "domain": domain,
                         "exists": record is not None,
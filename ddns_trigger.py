@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向EdgeOne DDNS服务发送立即更新的触发消息
+
+用于 /etc/ppp/ip-up.d 或 dhclient 退出钩子，例如:
+    ddns_trigger.py                     # 触发完整检测周期
+    ddns_trigger.py --address 1.2.3.4   # 直接使用新地址更新A记录
+    ddns_trigger.py --from-env          # 从ppp/dhclient的环境变量读取新地址
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = os.environ.get('DDNS_CONTROL_SOCKET', '/run/edgeone-ddns/ddns.sock')
+
+def address_from_env():
+    """读取ppp (IPLOCAL) 或 dhclient (new_ip_address / new_ip6_address) 传入的新地址"""
+    if os.environ.get('reason') in ('EXPIRE', 'FAIL', 'RELEASE', 'STOP', 'EXPIRE6', 'RELEASE6', 'STOP6'):
+        return None
+    return (os.environ.get('IPLOCAL') or os.environ.get('new_ip_address')
+            or os.environ.get('new_ip6_address') or None)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='触发EdgeOne DDNS立即更新')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='控制套接字路径')
+    parser.add_argument('--address', help='新的IP地址')
+    parser.add_argument('--family', choices=['ipv4', 'ipv6'], help='地址族（默认按地址推断）')
+    parser.add_argument('--from-env', action='store_true', help='从ppp/dhclient环境变量读取新地址')
+    parser.add_argument('--no-wait', action='store_true', help='发送后立即退出，不等待确认')
+    parser.add_argument('--timeout', type=float, default=1.0, help='等待确认的秒数')
+    args = parser.parse_args()
+    
+    message = {'cmd': 'trigger'}
+    address = args.address or (address_from_env() if args.from_env else None)
+    if address:
+        message['address'] = address
+    if args.family:
+        message['family'] = args.family
+    
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        if not args.no_wait:
+            # 绑定到自动分配的抽象地址，以便接收确认
+            sock.bind('')
+            sock.settimeout(args.timeout)
+        sock.sendto(json.dumps(message).encode('utf-8'), args.socket)
+        if args.no_wait:
+            return 0
+        reply = json.loads(sock.recv(4096).decode('utf-8'))
+    except (OSError, ValueError) as e:
+        print(f"触发失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        sock.close()
+    
+    print(reply.get('message', ''))
+    return 0 if reply.get('success') else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周期时间预算 - 为一次更新周期设置总的截止时间
+
+每个网络请求的超时取其默认值（检测服务10秒、Webhook 15秒、EdgeOne SDK 60秒）与剩余预算中的较小者，
+剩余预算不足以发起请求时抛出 DeadlineExceeded，尚未处理的域名以 cancelled 结果结束，周期返回部分结果。
+当前截止时间保存在线程局部变量中（与周期追踪相同），IPDetector、EdgeOneClient、NotificationManager
+在发起请求前读取；工作线程通过 scope() 继承调用方的截止时间。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# 剩余预算低于此值（秒）时不再发起新的网络请求
+MIN_REQUEST_TIMEOUT = 0.5
+# 检测与更新阶段为结果通知保留的预算比例和上限（秒）
+NOTIFY_RESERVE_RATIO = 0.2
+NOTIFY_RESERVE_MAX = 10.0
+
+class DeadlineExceeded(Exception):
+    """周期时间预算已用完"""
+    
+    def __init__(self, message: str = "周期时间预算已用完"):
+        super().__init__(message)
+
+class Deadline:
+    """截止时间，budget 为0时不限制"""
+    
+    def __init__(self, budget: float = 0, clock: Callable[[], float] = time.monotonic,
+                 expires_at: Optional[float] = None):
+        self.budget = budget
+        self.clock = clock
+        if expires_at is None and budget > 0:
+            expires_at = clock() + budget
+        self.expires_at = expires_at
+    
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+    
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，不限制时返回None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self.clock())
+    
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining < MIN_REQUEST_TIMEOUT
+    
+    def check(self):
+        """剩余预算不足以发起请求时抛出 DeadlineExceeded"""
+        if self.expired:
+            raise DeadlineExceeded()
+    
+    def timeout(self, default: float) -> float:
+        """网络请求的超时：默认值与剩余预算中的较小者"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if remaining < MIN_REQUEST_TIMEOUT:
+            raise DeadlineExceeded()
+        return min(default, remaining)
+    
+    def reserve(self, ratio: float = NOTIFY_RESERVE_RATIO, maximum: float = NOTIFY_RESERVE_MAX) -> 'Deadline':
+        """提前到期的截止时间，把最后一部分预算留给结果通知"""
+        if self.expires_at is None:
+            return self
+        return Deadline(self.budget, self.clock, self.expires_at - min(maximum, self.budget * ratio))
+
+UNBOUNDED = Deadline()
+
+_local = threading.local()
+
+def current() -> Deadline:
+    """当前线程所在周期的截止时间，不在周期内时不限制"""
+    return getattr(_local, 'deadline', None) or UNBOUNDED
+
+@contextmanager
+def scope(deadline: Deadline) -> Iterator[Deadline]:
+    """在 with 块内把 deadline 设为当前线程的截止时间"""
+    previous = getattr(_local, 'deadline', None)
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
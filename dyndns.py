@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+dyndns2协议模块 - 路由器主动推送IP时的认证、主机授权与地址解析
+"""
+
+import hmac
+import ipaddress
+import re
+from typing import List, Mapping, Optional, Tuple
+
+from config import ConfigSnapshot
+
+# dyndns2 返回码
+GOOD = 'good'
+NOCHG = 'nochg'
+BADAUTH = 'badauth'
+NOHOST = 'nohost'
+NOTFQDN = 'notfqdn'
+NUMHOST = 'numhost'
+DNSERR = 'dnserr'
+SERVER_ERROR = '911'
+
+# 单次请求最多更新的主机数（与dyndns2协议一致）
+MAX_HOSTS = 20
+
+_FQDN_PATTERN = re.compile(r'^(?=.{1,253}$)([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.)+[a-z0-9-]{2,63}$', re.I)
+
+def find_user(users: Tuple[Mapping, ...], username: Optional[str], password: Optional[str]) -> Optional[Mapping]:
+    """按用户名和密码查找推送账号，密码比较使用常量时间"""
+    if not username or password is None:
+        return None
+    for user in users:
+        if user.get('username') == username:
+            expected = str(user.get('password', ''))
+            if expected and hmac.compare_digest(expected.encode(), password.encode()):
+                return user
+            return None
+    return None
+
+def host_allowed(user: Mapping, hostname: str, cfg: ConfigSnapshot) -> bool:
+    """判断账号是否有权更新该主机；hosts 中的 '*' 表示允许全部已配置的域名"""
+    hosts = user.get('hosts') or ()
+    if hostname in hosts:
+        return True
+    return '*' in hosts and any(cfg.zone_for(hostname, record_type) for record_type in ('A', 'AAAA'))
+
+def is_fqdn(hostname: str) -> bool:
+    return bool(_FQDN_PATTERN.match(hostname))
+
+def parse_addresses(*values: Optional[str]) -> Optional[List[str]]:
+    """解析 myip / myipv6 参数（可逗号分隔），每个协议族只取第一个地址，存在无效地址时返回None"""
+    addresses = {}
+    for value in values:
+        for item in (value or '').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                address = ipaddress.ip_address(item)
+            except ValueError:
+                return None
+            addresses.setdefault(address.version, str(address))
+    # IPv4在前
+    return [addresses[version] for version in sorted(addresses)]
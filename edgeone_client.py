@@ -7,27 +7,80 @@
 import os
 import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
 from tencentcloud.common import credential
+from tencentcloud.common.http.request import ProxyConnection
 from tencentcloud.common.profile.client_profile import ClientProfile
 from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
 from tencentcloud.teo.v20220901 import teo_client, models
 
+import deadline
+import metrics
+import tracing
+
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+class _DeadlineConnection(ProxyConnection):
+    """按调用线程设置超时的SDK连接对象
+    
+    SDK在发送请求时读取连接对象的 timeout 属性；同一账号的多个Zone线程共享一个客户端，
+    直接改写该属性会互相覆盖，并在周期结束后残留在客户端上。
+    """
+    
+    @classmethod
+    def install(cls, client) -> '_DeadlineConnection':
+        """替换SDK客户端连接对象的类型，保留其会话、代理和证书设置"""
+        conn = client.request.conn
+        default_timeout = conn.__dict__.pop('timeout')
+        conn.__class__ = cls
+        conn._local = threading.local()
+        conn.default_timeout = default_timeout
+        return conn
+    
+    @property
+    def timeout(self) -> float:
+        return getattr(self._local, 'timeout', None) or self.default_timeout
+    
+    @timeout.setter
+    def timeout(self, value: float):
+        self.default_timeout = value
+    
+    @contextmanager
+    def request_timeout(self, timeout: float) -> Iterator[None]:
+        """在 with 块内当前线程的请求使用 timeout"""
+        previous = getattr(self._local, 'timeout', None)
+        self._local.timeout = timeout
+        try:
+            yield
+        finally:
+            self._local.timeout = previous
+
 class EdgeOneClient:
     """基于官方SDK的EdgeOne客户端"""
     
-    def __init__(self, secret_id: str, secret_key: str, region: str = "ap-shanghai"):
+    def __init__(self, secret_id: str, secret_key: str, region: str = "ap-shanghai", endpoint: str = "",
+                 rate_limiter=None):
         self.secret_id = secret_id
         self.secret_key = secret_key
         self.region = region
         self.version = "2022-09-01"
-        self.endpoint = "teo.tencentcloudapi.com"
+        # 可以指定其他接入点（如 http://127.0.0.1:9000 的本地替身），未指定协议时使用https
+        endpoint = endpoint or os.environ.get('EDGEONE_API_ENDPOINT', '') or "teo.tencentcloudapi.com"
+        self.protocol, _, self.endpoint = endpoint.rpartition('://')
+        self.protocol = self.protocol or 'https'
+        # 同一账号的多个Zone共享的限流器（client_pool.RateLimiter），None表示不限流
+        self.rate_limiter = rate_limiter
         
         # 创建SDK客户端
         self.client = self._create_client()
+        # SDK的请求超时，周期内按剩余预算缩短
+        self.request_timeout = self.client.profile.httpProfile.reqTimeout
+        self.connection = _DeadlineConnection.install(self.client)
     
     def _create_client(self):
         """创建SDK客户端"""
@@ -36,7 +89,7 @@ class EdgeOneClient:
             cred = credential.Credential(self.secret_id, self.secret_key)
             
             # 实例化一个http选项
-            httpProfile = HttpProfile()
+            httpProfile = HttpProfile(protocol=self.protocol)
             httpProfile.endpoint = self.endpoint
             
             # 实例化一个client选项
@@ -53,6 +106,37 @@ class EdgeOneClient:
             logging.error(f"❌ 创建EdgeOne SDK客户端失败: {e}")
             raise
     
+    def _call(self, action: str, req, **attrs):
+        """调用SDK接口，记录耗时和错误码；attrs 附加到周期追踪的span上
+        
+        周期预算不足时不发起请求，抛出 DeadlineExceeded。
+        """
+        budget = deadline.current()
+        budget.check()
+        waited = self.rate_limiter.acquire(budget) if self.rate_limiter else 0.0
+        try:
+            # 限流等待之后再取超时，预算已不足时归还令牌
+            timeout = budget.timeout(self.request_timeout)
+        except deadline.DeadlineExceeded:
+            if self.rate_limiter:
+                self.rate_limiter.refund()
+            raise
+        start = time.perf_counter()
+        with tracing.span(f'api.{action}', **attrs) as api_span, self.connection.request_timeout(timeout):
+            if waited:
+                api_span.set(throttled_ms=round(waited * 1000, 1))
+            try:
+                return getattr(self.client, action)(req)
+            except TencentCloudSDKException as e:
+                metrics.API_ERRORS.inc(action=action, code=e.code or 'unknown')
+                api_span.set(code=e.code)
+                raise
+            except Exception:
+                metrics.API_ERRORS.inc(action=action, code='exception')
+                raise
+            finally:
+                metrics.API_SECONDS.observe(time.perf_counter() - start, action=action)
+    
     def describe_dns_records(self, zone_id: str, filters: list = None, limit: int = 1000, offset: int = 0) -> dict:
         """查询DNS记录"""
         try:
@@ -67,7 +151,7 @@ class EdgeOneClient:
                 params["Filters"] = filters
             
             req.from_json_string(json.dumps(params))
-            resp = self.client.DescribeDnsRecords(req)
+            resp = self._call('DescribeDnsRecords', req, filters=filters, offset=offset)
             
             # 解析响应
             response_data = json.loads(resp.to_json_string())
@@ -94,7 +178,7 @@ class EdgeOneClient:
             }
             
             req.from_json_string(json.dumps(params))
-            resp = self.client.CreateDnsRecord(req)
+            resp = self._call('CreateDnsRecord', req, domain=name, type=record_type)
             
             # 解析响应
             response_data = json.loads(resp.to_json_string())
@@ -110,27 +194,34 @@ class EdgeOneClient:
                          record_type: str, content: str, ttl: int = 300, 
                          location: str = "Default") -> dict:
         """修改DNS记录 - 使用批量修改接口"""
+        return self.modify_dns_records(zone_id, [
+            {
+                "RecordId": record_id,
+                "Name": name,
+                "Type": record_type,
+                "Content": content,
+                "Ttl": ttl
+            }
+        ])
+    
+    def modify_dns_records(self, zone_id: str, records: list) -> dict:
+        """批量修改DNS记录，一次请求修改多条"""
         try:
             req = models.ModifyDnsRecordsRequest()
             params = {
                 "ZoneId": zone_id,
-                "DnsRecords": [
-                    {
-                        "RecordId": record_id,
-                        "Name": name,
-                        "Type": record_type,
-                        "Content": content,
-                        "Ttl": ttl
-                    }
-                ]
+                "DnsRecords": records
             }
             
             req.from_json_string(json.dumps(params))
-            resp = self.client.ModifyDnsRecords(req)
+            resp = self._call('ModifyDnsRecords', req, domains=[record['Name'] for record in records])
             
             # 解析响应
             response_data = json.loads(resp.to_json_string())
-            logging.info(f"✅ 修改DNS记录成功: {name} -> {content}")
+            if len(records) == 1:
+                logging.info(f"✅ 修改DNS记录成功: {records[0]['Name']} -> {records[0]['Content']}")
+            else:
+                logging.info(f"✅ 批量修改DNS记录成功: {len(records)} 条")
             
             return response_data
             
@@ -148,7 +239,7 @@ class EdgeOneClient:
             }
             
             req.from_json_string(json.dumps(params))
-            resp = self.client.DeleteDnsRecord(req)
+            resp = self._call('DeleteDnsRecord', req, record_id=record_id)
             
             # 解析响应
             response_data = json.loads(resp.to_json_string())
@@ -382,7 +473,7 @@ def test_sdk_client():
     
     # 创建SDK客户端
     try:
-        client = SDKEdgeOneClient(secret_id, secret_key)
+        client = EdgeOneClient(secret_id, secret_key, endpoint=config.get('edgeone_endpoint', ''))
         print("✅ SDK客户端创建成功")
     except Exception as e:
         print(f"❌ SDK客户端创建失败: {e}")
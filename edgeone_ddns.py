@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EdgeOne DDNS 命令行入口 - 不依赖Flask的守护进程 / 单次运行模式
+
+    python -m edgeone_ddns run     # 常驻运行，按更新间隔执行周期
+    python -m edgeone_ddns once    # 执行一次更新周期后退出（cron / sidecar）
+    python -m edgeone_ddns plan    # 只读对账，显示每个域名需要的操作
+
+较重的模块（DNSService、腾讯云SDK、requests）在解析参数后才导入，
+启动耗时（进程开始到准备发起网络请求）会与启动预算比较并在超出时告警。
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1       # 更新失败（含部分失败）
+EXIT_CONFIG = 2       # 配置无效
+EXIT_NO_IP = 3        # 未获取到公网IP
+EXIT_CHANGES = 4      # plan --detailed-exitcode：存在待变更的记录
+
+# 默认启动预算（毫秒）
+DEFAULT_STARTUP_BUDGET_MS = 250
+
+def _setup_logging(level: str):
+    logging.basicConfig(
+        level=getattr(logging, level, logging.INFO),
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+def _check_startup(budget_ms: float) -> float:
+    """记录启动耗时，超出预算时告警"""
+    startup_ms = (time.perf_counter() - _START) * 1000
+    if startup_ms > budget_ms:
+        logging.warning(f"启动耗时 {startup_ms:.0f}ms，超出预算 {budget_ms:.0f}ms")
+    else:
+        logging.debug(f"启动耗时 {startup_ms:.0f}ms")
+    return startup_ms
+
+def _load(args):
+    """加载配置并创建服务，配置无效时返回 (config, None)"""
+    from config import Config
+    from ddns_service import DNSService
+    
+    config = Config(args.config)
+    config.load()
+    _setup_logging('DEBUG' if args.verbose else config.log_level)
+    if not config.is_valid():
+        logging.error("配置无效：没有凭据完整的Zone（需要 secret_id、secret_key 和 zone_id，或在 accounts / zones 中配置）")
+        return config, None
+    return config, DNSService(config)
+
+def cmd_once(args) -> int:
+    config, service = _load(args)
+    if service is None:
+        return EXIT_CONFIG
+    startup_ms = _check_startup(args.startup_budget_ms)
+    
+    result = service.run_once()
+    if args.json:
+        output = {k: v for k, v in result.items() if k != 'results'}
+        output['startup_ms'] = round(startup_ms, 1)
+        output['results'] = [
+            {k: r.get(k) for k in ('domain', 'record_type', 'action', 'success', 'message')}
+            for r in result.get('results', [])
+        ]
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    else:
+        print(result.get('message', ''))
+    
+    if result.get('success'):
+        return EXIT_OK
+    if result.get('error') == 'no_ip':
+        return EXIT_NO_IP
+    return EXIT_FAILED
+
+def cmd_plan(args) -> int:
+    config, service = _load(args)
+    if service is None:
+        return EXIT_CONFIG
+    startup_ms = _check_startup(args.startup_budget_ms)
+    
+    plan = service.plan_changes()
+    if args.json:
+        plan['startup_ms'] = round(startup_ms, 1)
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
+    else:
+        for change in plan.get('changes', []):
+            print(f"{change['action']:<7} {change['record_type']:<5} {change['domain']:<40} "
+                  f"{change['current'] or '-'} -> {change['desired']}")
+        print(plan.get('message', ''))
+    
+    if not plan.get('success'):
+        return EXIT_NO_IP if plan.get('error') == 'no_ip' else EXIT_FAILED
+    if args.detailed_exitcode and any(c['action'] != 'noop' for c in plan['changes']):
+        return EXIT_CHANGES
+    return EXIT_OK
+
+def cmd_run(args) -> int:
+    config, service = _load(args)
+    if service is None:
+        return EXIT_CONFIG
+    _check_startup(args.startup_budget_ms)
+    
+    from config_watcher import ConfigWatcher
+    
+    stop_event = threading.Event()
+    wake_event = threading.Event()
+    
+    def on_signal(signum, frame):
+        logging.info(f"收到信号 {signum}，正在退出")
+        stop_event.set()
+        wake_event.set()
+    
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    
+    def on_config_change(old_data):
+        service.apply_config_changes(old_data)
+        # 更新间隔可能变化，立即按新间隔重新计时
+        wake_event.set()
+    
+    watcher = ConfigWatcher(config, on_config_change)
+    watcher.start()
+    
+    if not service.start():
+        watcher.stop()
+        return EXIT_FAILED
+    
+    while not stop_event.is_set():
+        if wake_event.wait(config.update_interval):
+            wake_event.clear()
+            continue
+        service.check_and_update_ip(trigger='schedule')
+    
+    watcher.stop()
+    service.stop()
+    service.notification_manager.flush(5)
+    return EXIT_OK
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='edgeone_ddns', description='EdgeOne DDNS 命令行')
+    parser.add_argument('-c', '--config', default=None, help='配置文件路径（默认读取 CONFIG_FILE_PATH 或 config.json）')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出调试日志')
+    parser.add_argument('--startup-budget-ms', type=float, default=DEFAULT_STARTUP_BUDGET_MS,
+                        help='启动耗时预算（毫秒），超出时告警')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    subparsers.add_parser('run', help='常驻运行')
+    
+    once = subparsers.add_parser('once', help='执行一次更新周期后退出')
+    once.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    
+    plan = subparsers.add_parser('plan', help='只读对账，显示需要的变更')
+    plan.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    plan.add_argument('--detailed-exitcode', action='store_true', help=f'存在待变更记录时返回 {EXIT_CHANGES}')
+    
+    args = parser.parse_args(argv)
+    commands = {'run': cmd_run, 'once': cmd_once, 'plan': cmd_plan}
+    return commands[args.command](args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件总线模块 - 为SSE推送提供实时事件
+
+多个gunicorn worker时设置 DDNS_EVENTS_DIR（或调用 enable_relay），各进程发布的事件写入共享的事件日志，
+每个进程再从中读入其他进程的事件，连接到任一worker的SSE客户端都能收到全部事件。
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 每个进程同时保持的SSE连接数上限（0表示不限制），超过时拒绝连接，客户端改为轮询；
+# 每个SSE连接占用一个worker线程，上限需小于 gunicorn --threads，留出线程处理普通请求
+MAX_STREAMS = int(os.environ.get('DDNS_SSE_MAX_STREAMS', 6))
+# 共享事件日志每个分段的大小上限（字节）和保留的分段数
+RELAY_MAX_BYTES = 1024 * 1024
+RELAY_KEEP_SEGMENTS = 4
+# 读取其他进程事件的间隔（秒）
+RELAY_POLL_INTERVAL = 0.2
+
+class EventStream:
+    """SSE响应体，关闭时（事件流结束或客户端断开）归还连接名额"""
+    
+    def __init__(self, events: Iterator[str], release):
+        self._events = events
+        self._release = release
+    
+    def __iter__(self) -> Iterator[str]:
+        return self._events
+    
+    def close(self):
+        release, self._release = self._release, None
+        if release:
+            release()
+        self._events.close()
+
+class EventBus:
+    """进程内事件总线
+    
+    所有事件写入同一个有界环形缓冲区，订阅者只保存自己读到的事件序号，
+    因此订阅者数量不影响发布开销，空闲订阅者也只占用一个游标。
+    """
+    
+    def __init__(self, max_events: int = 500, max_streams: int = MAX_STREAMS):
+        self._events = deque(maxlen=max_events)
+        self._cond = threading.Condition()
+        self._seq = 0
+        # 每个进程（gunicorn worker）使用独立的纪元标识，用于识别跨进程的Last-Event-ID
+        self.epoch = uuid.uuid4().hex[:8]
+        self.max_streams = max_streams
+        self._active_streams = 0
+        self._streams_lock = threading.Lock()
+        self._relay_path: Optional[str] = None
+        self._relay_lock_file = None
+        self._relay_mutex = threading.Lock()
+        self._relay_segment: Optional[int] = None
+        self._relay_handle = None
+        self._relay_thread: Optional[threading.Thread] = None
+    
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+    
+    @property
+    def active_streams(self) -> int:
+        return self._active_streams
+    
+    def publish(self, event_type: str, data: Optional[Dict] = None) -> str:
+        """发布事件，返回事件ID"""
+        event = self._append(event_type, data or {}, datetime.now().isoformat())
+        if self._relay_path:
+            self._relay_write(event)
+        return event['id']
+    
+    def _append(self, event_type: str, data: Dict, timestamp: str) -> Dict:
+        with self._cond:
+            self._seq += 1
+            event = {
+                'id': f"{self.epoch}-{self._seq}",
+                'seq': self._seq,
+                'type': event_type,
+                'timestamp': timestamp,
+                'data': data
+            }
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+    
+    def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        """解析Last-Event-ID，不属于本进程或格式错误时返回None"""
+        if not event_id:
+            return None
+        epoch, _, seq = event_id.partition('-')
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+    
+    def get_since(self, seq: int) -> Tuple[List[Dict], bool]:
+        """获取序号之后的事件，第二个返回值表示中间是否有事件已被环形缓冲区淘汰"""
+        with self._cond:
+            return self._collect(seq)
+    
+    def wait_since(self, seq: int, timeout: float) -> Tuple[List[Dict], bool]:
+        """等待序号之后的新事件，超时返回空列表"""
+        with self._cond:
+            if self._seq <= seq:
+                self._cond.wait(timeout)
+            return self._collect(seq)
+    
+    def _collect(self, seq: int) -> Tuple[List[Dict], bool]:
+        if self._seq <= seq:
+            return [], False
+        events = [event for event in self._events if event['seq'] > seq]
+        return events, events[0]['seq'] != seq + 1
+    
+    def open_stream(self, last_event_id: Optional[str] = None, heartbeat: float = 15.0,
+                    max_duration: float = 300.0) -> Optional[EventStream]:
+        """占用一个连接名额并返回SSE响应体，本进程的名额已用完时返回None"""
+        with self._streams_lock:
+            if self.max_streams and self._active_streams >= self.max_streams:
+                return None
+            self._active_streams += 1
+        return EventStream(self.stream(last_event_id, heartbeat, max_duration), self._release_stream)
+    
+    def _release_stream(self):
+        with self._streams_lock:
+            self._active_streams -= 1
+    
+    def stream(self, last_event_id: Optional[str] = None, heartbeat: float = 15.0,
+               max_duration: float = 300.0) -> Iterator[str]:
+        """生成SSE格式的事件流，支持Last-Event-ID断点续传
+        
+        连接保持 max_duration 秒后结束，释放占用的worker线程；EventSource会带着最后的事件ID自动重连。
+        """
+        yield "retry: 3000\n\n"
+        closes_at = time.monotonic() + max_duration
+        
+        seq = self.parse_event_id(last_event_id)
+        if seq is None:
+            # 新连接或来自其他进程的ID：从当前位置开始，并通知客户端重新拉取完整状态
+            seq = self._seq
+            if last_event_id:
+                yield self._format({'id': f"{self.epoch}-{seq}", 'type': 'reset', 'data': {}})
+        
+        while time.monotonic() < closes_at:
+            events, missed = self.wait_since(seq, min(heartbeat, max(0.0, closes_at - time.monotonic())))
+            if not events:
+                # 心跳注释，保持连接并及时发现已断开的客户端
+                yield ": ping\n\n"
+                continue
+            
+            if missed:
+                yield self._format({'id': events[0]['id'], 'type': 'reset', 'data': {}})
+            
+            for event in events:
+                yield self._format(event)
+            seq = events[-1]['seq']
+    
+    def _format(self, event: Dict) -> str:
+        payload = {
+            'type': event['type'],
+            'timestamp': event.get('timestamp'),
+            'data': event.get('data', {})
+        }
+        return (
+            f"id: {event['id']}\n"
+            f"event: {event['type']}\n"
+            f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        )
+    
+    def enable_relay(self, directory: str):
+        """启用多进程事件转发：本进程发布的事件追加到 <directory> 下的共享事件日志，并读入其他进程写入的事件"""
+        if self._relay_thread and self._relay_thread.is_alive():
+            return
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._relay_path = directory
+        self._relay_lock_file = open(os.path.join(directory, 'events.lock'), 'a')
+        self._relay_thread = threading.Thread(target=self._relay_loop, name='event-relay', daemon=True)
+        self._relay_thread.start()
+    
+    @contextmanager
+    def _relay_locked(self) -> Iterator[None]:
+        """进程内互斥加跨进程flock，追加与轮转不会交错"""
+        with self._relay_mutex:
+            fcntl.flock(self._relay_lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._relay_lock_file, fcntl.LOCK_UN)
+    
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self._relay_path, f'events.{number}.log')
+    
+    def _segments(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self._relay_path):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[0] == 'events' and parts[2] == 'log' and parts[1].isdigit():
+                numbers.append(int(parts[1]))
+        return sorted(numbers)
+    
+    def _relay_write(self, event: Dict):
+        record = {
+            'origin': self.epoch,
+            'type': event['type'],
+            'timestamp': event['timestamp'],
+            'data': event['data']
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        try:
+            with self._relay_locked():
+                if self._relay_segment is None:
+                    segments = self._segments()
+                    self._relay_segment = segments[-1] if segments else 0
+                # 其他进程可能已换到后面的分段
+                rotated = False
+                while os.path.exists(self._segment_path(self._relay_segment + 1)):
+                    self._relay_segment += 1
+                    rotated = True
+                if self._relay_handle and (rotated or self._relay_handle.tell() > RELAY_MAX_BYTES):
+                    self._relay_handle.close()
+                    self._relay_handle = None
+                    if not rotated:
+                        # 写满后换到下一个分段，只保留最近 RELAY_KEEP_SEGMENTS 个
+                        self._relay_segment += 1
+                        for number in self._segments()[:-RELAY_KEEP_SEGMENTS + 1]:
+                            os.remove(self._segment_path(number))
+                if self._relay_handle is None:
+                    self._relay_handle = open(self._segment_path(self._relay_segment), 'a', encoding='utf-8')
+                self._relay_handle.write(line)
+                self._relay_handle.flush()
+        except OSError as e:
+            logging.warning(f"写入共享事件日志失败: {str(e)}")
+            if self._relay_handle:
+                self._relay_handle.close()
+                self._relay_handle = None
+    
+    def _relay_loop(self):
+        """轮询共享事件日志，按分段顺序把其他进程发布的事件放入本进程的缓冲区"""
+        handle = None
+        number = None
+        pending = b''
+        while True:
+            try:
+                if handle is None:
+                    segments = self._segments()
+                    number = segments[-1] if segments else 0
+                    with self._relay_locked():
+                        handle = open(self._segment_path(number), 'ab+')
+                    # 只转发启用之后的事件
+                    handle.seek(0, os.SEEK_END)
+                    pending = b''
+                
+                chunk = handle.read()
+                if chunk:
+                    pending = self._relay_ingest(pending + chunk)
+                    continue
+                
+                later = [n for n in self._segments() if n > number]
+                if later:
+                    # 写入方在锁内换分段，之后旧分段不再有写入：读完后切换到下一个分段
+                    self._relay_ingest(pending + handle.read())
+                    handle.close()
+                    if later[0] != number + 1:
+                        # 读取落后太多，中间的分段已被删除
+                        self._append('reset', {}, datetime.now().isoformat())
+                    number = later[0]
+                    handle = open(self._segment_path(number), 'rb')
+                    pending = b''
+                    continue
+            except OSError as e:
+                logging.warning(f"读取共享事件日志失败: {str(e)}")
+                if handle:
+                    handle.close()
+                handle = None
+            time.sleep(RELAY_POLL_INTERVAL)
+    
+    def _relay_ingest(self, data: bytes) -> bytes:
+        """解析完整的行，返回末尾不完整的部分"""
+        *lines, rest = data.split(b'\n')
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('origin') == self.epoch or not record.get('type'):
+                continue
+            self._append(record['type'], record.get('data') or {}, record.get('timestamp') or datetime.now().isoformat())
+        return rest
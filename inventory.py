@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+域名清单模块 - 大量域名的增删、批量导入导出和每个域名的元数据（TTL、启用状态、标签）
+
+清单保存为追加写入的JSONL操作日志（每行一个 put/del 操作），单个域名的增删只追加一行，
+不需要重写和重新解析整个config.json。日志中的失效行超过存活条目数时整体压缩重写。
+多个进程（gunicorn worker）共享同一个日志文件：写入前持有文件锁并先读取其他进程追加的内容，
+读取方按文件大小增量读取新追加的行，文件被压缩替换后整体重新加载。
+"""
+
+import csv
+import fcntl
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+FAMILIES = ('ipv4', 'ipv6')
+RECORD_TYPES = {'ipv4': 'A', 'ipv6': 'AAAA'}
+# 导入导出的CSV列
+CSV_FIELDS = ('domain', 'family', 'zone', 'ttl', 'enabled', 'tags')
+# EdgeOne允许的TTL范围（秒）
+MIN_TTL = 60
+MAX_TTL = 86400
+# 批量导入时每批写入的条目数
+IMPORT_BATCH_SIZE = 1000
+# 导入结果中最多返回的错误行数
+MAX_IMPORT_ERRORS = 20
+# 失效日志行数超过 存活条目数 + COMPACT_SLACK 时压缩
+COMPACT_SLACK = 1000
+
+_DOMAIN_PATTERN = re.compile(r'^(\*\.)?([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z0-9-]{2,63}$')
+_FAMILY_ALIASES = {'ipv4': 'ipv4', '4': 'ipv4', 'a': 'ipv4', 'ipv6': 'ipv6', '6': 'ipv6', 'aaaa': 'ipv6'}
+_FALSE_VALUES = ('0', 'false', 'no', 'off', 'n')
+
+def normalize_domain(value: Any) -> str:
+    """转为小写并去掉末尾的点，不是有效域名时抛出 ValueError"""
+    domain = str(value or '').strip().lower().rstrip('.')
+    if len(domain) > 253 or not _DOMAIN_PATTERN.match(domain):
+        raise ValueError(f"无效的域名: {value}")
+    return domain
+
+def normalize_family(value: Any) -> str:
+    """ipv4 / ipv6（也接受 4、6、A、AAAA）"""
+    family = _FAMILY_ALIASES.get(str(value or 'ipv4').strip().lower())
+    if family is None:
+        raise ValueError(f"无效的协议: {value}")
+    return family
+
+@dataclass(frozen=True)
+class DomainEntry:
+    """清单中的一个域名（同一域名的IPv4和IPv6是两个条目）"""
+    domain: str
+    family: str
+    zone: str
+    ttl: Optional[int] = None  # 为空时沿用现有记录的TTL，新建记录使用300
+    enabled: bool = True
+    tags: Tuple[str, ...] = ()
+    
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.domain, self.family)
+    
+    @property
+    def record_type(self) -> str:
+        return RECORD_TYPES[self.family]
+    
+    def to_dict(self) -> Dict:
+        return {
+            'domain': self.domain,
+            'family': self.family,
+            'zone': self.zone,
+            'ttl': self.ttl,
+            'enabled': self.enabled,
+            'tags': list(self.tags)
+        }
+    
+    @classmethod
+    def from_dict(cls, item: Mapping, default_zone: str) -> 'DomainEntry':
+        """从请求、导入行或日志解析条目，字段无效时抛出 ValueError"""
+        if not isinstance(item, Mapping):
+            raise ValueError("条目必须是对象")
+        
+        ttl = item.get('ttl')
+        if ttl in (None, ''):
+            ttl = None
+        else:
+            try:
+                ttl = int(ttl)
+            except (TypeError, ValueError):
+                raise ValueError(f"无效的TTL: {ttl}")
+            if not MIN_TTL <= ttl <= MAX_TTL:
+                raise ValueError(f"TTL 必须在 {MIN_TTL}-{MAX_TTL} 之间")
+        
+        enabled = item.get('enabled', True)
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() not in _FALSE_VALUES
+        
+        tags = item.get('tags') or ()
+        if isinstance(tags, str):
+            tags = tags.split(';')
+        if not isinstance(tags, (list, tuple)):
+            raise ValueError("tags 必须是字符串列表")
+        tags = tuple(dict.fromkeys(str(tag).strip() for tag in tags if str(tag).strip()))
+        
+        return cls(
+            domain=normalize_domain(item.get('domain')),
+            family=normalize_family(item.get('family')),
+            zone=str(item.get('zone') or default_zone),
+            ttl=ttl,
+            enabled=bool(enabled),
+            tags=tags
+        )
+
+class InventoryView:
+    """某一版本清单编译后的只读视图，供配置快照合并到各Zone"""
+    
+    def __init__(self, version: int, entries: Iterable[DomainEntry]):
+        self.version = version
+        domains: Dict[Tuple[str, str], List[str]] = {}
+        ttls: Dict[str, Dict[Tuple[str, str], int]] = {}
+        for entry in entries:
+            if not entry.enabled:
+                continue
+            domains.setdefault((entry.zone, entry.family), []).append(entry.domain)
+            if entry.ttl is not None:
+                ttls.setdefault(entry.zone, {})[(entry.domain, entry.record_type)] = entry.ttl
+        self._domains = {key: tuple(value) for key, value in domains.items()}
+        self._ttls = {zone: MappingProxyType(value) for zone, value in ttls.items()}
+    
+    def domains(self, zone: str, family: str) -> Tuple[str, ...]:
+        """Zone中某协议已启用的域名（按加入清单的顺序）"""
+        return self._domains.get((zone, family), ())
+    
+    def ttls(self, zone: str) -> Mapping:
+        """(域名, 记录类型) -> TTL，只包含设置了TTL的条目"""
+        return self._ttls.get(zone, MappingProxyType({}))
+
+class DomainInventory:
+    """域名清单：内存中按 (域名, 协议) 索引，修改追加到JSONL日志
+    
+    version 在内容变化（包括读取到其他进程的修改）时递增，配置快照据此判断是否需要重新编译。
+    """
+    
+    def __init__(self, path: str, refresh_interval: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.version = 0
+        self._entries: Dict[Tuple[str, str], DomainEntry] = {}
+        self._lock = threading.RLock()
+        # 已读取到的日志位置、文件标识和日志行数
+        self._offset = 0
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._log_lines = 0
+        self._checked_at: Optional[float] = None
+        self._view: Optional[InventoryView] = None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, domain: str) -> bool:
+        return self.contains(domain)
+    
+    def contains(self, domain: str, family: Optional[str] = None) -> bool:
+        """域名（或域名的某个协议）是否在清单中"""
+        if family:
+            return (domain, family) in self._entries
+        return any((domain, family) in self._entries for family in FAMILIES)
+    
+    def get(self, domain: str, family: str) -> Optional[DomainEntry]:
+        return self._entries.get((domain, family))
+    
+    def view(self) -> InventoryView:
+        """当前版本的只读视图（每个版本只编译一次）"""
+        with self._lock:
+            if self._view is None or self._view.version != self.version:
+                self._view = InventoryView(self.version, self._entries.values())
+            return self._view
+    
+    def list(self, zone: Optional[str] = None, family: Optional[str] = None, tag: Optional[str] = None,
+             query: Optional[str] = None, offset: int = 0, limit: int = 100) -> Tuple[int, List[DomainEntry]]:
+        """按条件筛选条目，返回 (符合条件的总数, 当前页)"""
+        with self._lock:
+            entries = list(self._entries.values())
+        if zone or family or tag or query:
+            query = (query or '').lower()
+            entries = [entry for entry in entries
+                       if (not zone or entry.zone == zone)
+                       and (not family or entry.family == family)
+                       and (not tag or tag in entry.tags)
+                       and (not query or query in entry.domain)]
+        return len(entries), entries[offset:offset + limit]
+    
+    def refresh(self, force: bool = False) -> int:
+        """读取其他进程追加的修改，返回当前版本；未强制时每 refresh_interval 秒最多检查一次文件"""
+        now = self.clock()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return self.version
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                if self._file_id is not None:
+                    self._reset()
+                return self.version
+            except OSError as e:
+                logging.error(f"读取域名清单失败: {str(e)}")
+                return self.version
+            file_id = (stat.st_dev, stat.st_ino)
+            if file_id != self._file_id or stat.st_size < self._offset:
+                # 首次加载或文件已被压缩替换
+                self._reset()
+                self._file_id = file_id
+            if stat.st_size > self._offset:
+                self._read_tail()
+            return self.version
+    
+    def put(self, entries: Iterable[DomainEntry]) -> Tuple[List[DomainEntry], int]:
+        """添加或修改条目，返回 (新增或内容有变化的条目, 未变化的条目数)
+        
+        所有变化在一次追加写入中完成。
+        """
+        entries = list(entries)
+        with self._lock, self._file_lock():
+            self.refresh(force=True)
+            # 同一批中同一域名出现多次时以最后一次为准
+            latest = {entry.key: entry for entry in entries}
+            changed = [entry for entry in latest.values() if self._entries.get(entry.key) != entry]
+            if changed:
+                self._append([dict(entry.to_dict(), op='put') for entry in changed])
+                for entry in changed:
+                    self._entries[entry.key] = entry
+                self.version += 1
+                self._maybe_compact()
+            return changed, len(entries) - len(changed)
+    
+    def remove(self, domain: str, family: Optional[str] = None) -> List[DomainEntry]:
+        """删除域名（未指定协议时删除两个协议的条目），返回被删除的条目"""
+        with self._lock, self._file_lock():
+            self.refresh(force=True)
+            keys = [(domain, family)] if family else [(domain, family) for family in FAMILIES]
+            removed = [self._entries[key] for key in keys if key in self._entries]
+            if removed:
+                self._append([{'op': 'del', 'domain': entry.domain, 'family': entry.family} for entry in removed])
+                for entry in removed:
+                    del self._entries[entry.key]
+                self.version += 1
+                self._maybe_compact()
+            return removed
+    
+    def import_rows(self, rows: Iterable[Mapping], default_zone: str,
+                    zones: Optional[Collection[str]] = None) -> Dict:
+        """流式导入：逐行解析并按批写入，无效行计入错误并跳过
+        
+        zones 指定时，引用了其他Zone的行视为无效。返回统计和新增或有变化的条目。
+        """
+        stats = {'imported': 0, 'unchanged': 0, 'errors': 0, 'error_lines': []}
+        changed: List[DomainEntry] = []
+        batch: List[DomainEntry] = []
+        
+        def flush():
+            batch_changed, unchanged = self.put(batch)
+            changed.extend(batch_changed)
+            stats['imported'] += len(batch_changed)
+            stats['unchanged'] += unchanged
+            batch.clear()
+        
+        for line, row in enumerate(rows, start=1):
+            try:
+                entry = DomainEntry.from_dict(row, default_zone)
+                if zones is not None and entry.zone not in zones:
+                    raise ValueError(f"Zone不存在: {entry.zone}")
+            except ValueError as e:
+                stats['errors'] += 1
+                if len(stats['error_lines']) < MAX_IMPORT_ERRORS:
+                    stats['error_lines'].append(f"第{line}行: {str(e)}")
+                continue
+            batch.append(entry)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+        stats['changed'] = changed
+        return stats
+    
+    def export(self, fmt: str = 'jsonl') -> Iterator[str]:
+        """逐行导出为CSV（含表头）或JSONL"""
+        with self._lock:
+            entries = list(self._entries.values())
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(CSV_FIELDS)
+            for entry in entries:
+                writer.writerow([entry.domain, entry.family, entry.zone,
+                                 '' if entry.ttl is None else entry.ttl,
+                                 'true' if entry.enabled else 'false', ';'.join(entry.tags)])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for entry in entries:
+                yield json.dumps(entry.to_dict(), ensure_ascii=False) + '\n'
+    
+    def _reset(self):
+        self._entries.clear()
+        self._offset = 0
+        self._file_id = None
+        self._log_lines = 0
+        self.version += 1
+    
+    def _read_tail(self):
+        """应用日志中新追加的完整行（未写完的最后一行留到下次读取）"""
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return
+        for raw in data[:end].splitlines():
+            self._log_lines += 1
+            try:
+                self._apply(json.loads(raw))
+            except (ValueError, KeyError) as e:
+                logging.warning(f"忽略域名清单中的无效行: {str(e)}")
+        self._offset += end
+        self.version += 1
+    
+    def _apply(self, op: Dict):
+        key = (op['domain'], op['family'])
+        if op.get('op') == 'del':
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = DomainEntry.from_dict(op, '')
+    
+    @contextmanager
+    def _file_lock(self):
+        """进程间互斥的文件锁（锁文件与日志并列，日志被压缩替换时锁仍然有效）"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+    
+    def _append(self, ops: List[Dict]):
+        content = ''.join(json.dumps(op, ensure_ascii=False) + '\n' for op in ops).encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(content)
+        stat = os.stat(self.path)
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._offset = stat.st_size
+        self._log_lines += len(ops)
+    
+    def _maybe_compact(self):
+        """失效行过多时只保留存活条目重写日志（先写临时文件再原子替换）"""
+        if self._log_lines <= 2 * len(self._entries) + COMPACT_SLACK:
+            return
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(dict(entry.to_dict(), op='put'), ensure_ascii=False) + '\n')
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            logging.error(f"压缩域名清单失败: {str(e)}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+        stat = os.stat(self.path)
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._offset = stat.st_size
+        self._log_lines = len(self._entries)
+        logging.info(f"域名清单已压缩: {len(self._entries)} 条")
+
+def read_csv(lines: Iterable[str]) -> Iterator[Dict]:
+    """逐行解析CSV（第一行为表头，至少包含 domain 列）"""
+    for row in csv.DictReader(lines):
+        yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[Any]:
+    """逐行解析JSONL，空行被跳过；无法解析的行以 None 返回，由导入计为错误"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
@@ -4,12 +4,20 @@
 公网IP检测模块
 """
 
+import os
 import socket
 import requests
 import logging
 import time
 from typing import Optional, List
 
+import deadline
+import metrics
+import tracing
+
+# 单个检测服务的请求超时（秒）
+DETECT_TIMEOUT = 10
+
 class IPDetector:
     """公网IP检测器"""
     
@@ -76,6 +84,24 @@ class IPDetector:
                 'extract': lambda data: data.strip() if isinstance(data, str) else None
             }
         ]
+        
+        # 环境变量可以替换检测服务（逗号分隔的URL），用于内网检测服务或基准测试中的本地替身
+        self.ipv4_services = self._services_from_env('DDNS_IPV4_DETECT_URLS') or self.ipv4_services
+        self.ipv6_services = self._services_from_env('DDNS_IPV6_DETECT_URLS') or self.ipv6_services
+    
+    @staticmethod
+    def _services_from_env(name: str) -> List[dict]:
+        """从环境变量读取检测服务，响应为纯文本IP或包含 ip 字段的JSON"""
+        urls = [url.strip() for url in os.environ.get(name, '').split(',') if url.strip()]
+        return [
+            {
+                'name': f'custom-{index}',
+                'url': url,
+                'extract': lambda data: (data.get('ip') if isinstance(data, dict)
+                                         else data.strip() if isinstance(data, str) else None)
+            }
+            for index, url in enumerate(urls)
+        ]
     
     def get_public_ip(self, service_index: int = 0, ip_version: str = 'ipv4') -> Optional[str]:
         """获取公网IP地址"""
@@ -85,13 +111,31 @@ class IPDetector:
             return None
         
         service = services[service_index]
+        try:
+            timeout = deadline.current().timeout(DETECT_TIMEOUT)
+        except deadline.DeadlineExceeded:
+            logging.warning(f"周期时间预算已用完，停止检测{ip_version.upper()}地址")
+            return None
+        start = time.perf_counter()
+        with tracing.span('detect.service', service=service['name'], family=ip_version) as detect_span:
+            ip = self._query_service(service, ip_version, timeout)
+            detect_span.set(ok=ip is not None)
+        metrics.IP_DETECTION_SECONDS.observe(time.perf_counter() - start, service=service['name'], family=ip_version)
+        if ip:
+            return ip
+        metrics.IP_DETECTION_FAILURES.inc(service=service['name'], family=ip_version)
         
+        # 尝试下一个服务
+        return self.get_public_ip(service_index + 1, ip_version)
+    
+    def _query_service(self, service: dict, ip_version: str, timeout: float = DETECT_TIMEOUT) -> Optional[str]:
+        """向单个检测服务查询公网IP，失败或返回无效IP时返回None"""
         try:
             logging.debug(f"尝试使用 {service['name']} 获取{ip_version.upper()}公网IP...")
             
             response = requests.get(
                 service['url'], 
-                timeout=10,
+                timeout=timeout,
                 headers={
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
                 }
@@ -118,8 +162,7 @@ class IPDetector:
         except Exception as e:
             logging.warning(f"解析 {service['name']} 响应失败: {str(e)}")
         
-        # 尝试下一个服务
-        return self.get_public_ip(service_index + 1, ip_version)
+        return None
     
     def get_ipv4(self) -> Optional[str]:
         """获取IPv4公网地址"""
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台任务模块 - 将耗时的更新周期移出请求线程
+
+多个gunicorn worker时设置 DDNS_JOBS_DIR，任务状态写入该目录，轮询请求落到其他worker上也能查到任务。
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from events import EventBus
+
+# 进度变化时写盘的最小间隔（秒），状态变化总是立即写盘
+PERSIST_INTERVAL = 0.5
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{12}$')
+
+class Job:
+    """后台任务"""
+    
+    def __init__(self, job_type: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.type = job_type
+        self.status = 'pending'  # pending / running / succeeded / failed
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.progress = {'done': 0, 'total': 0}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+    
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Job':
+        """从其他进程写入的任务状态恢复"""
+        job = cls(data['type'])
+        job.id = data['id']
+        job.status = data['status']
+        job.created_at = datetime.fromisoformat(data['created_at'])
+        job.started_at = datetime.fromisoformat(data['started_at']) if data.get('started_at') else None
+        job.finished_at = datetime.fromisoformat(data['finished_at']) if data.get('finished_at') else None
+        job.progress = data.get('progress') or {'done': 0, 'total': 0}
+        job.result = data.get('result')
+        job.error = data.get('error')
+        return job
+
+class JobManager:
+    """后台任务管理器
+    
+    任务在独立的工作线程中执行，提交接口立即返回任务ID；
+    任务状态可以通过 get_job 轮询，也会以 job_update 事件推送到事件总线。
+    指定 state_dir 时任务状态同时写入 <state_dir>/<任务ID>.json，本进程没有的任务从该目录读取。
+    """
+    
+    def __init__(self, event_bus: Optional[EventBus] = None, max_workers: int = 1, max_jobs: int = 50,
+                 state_dir: Optional[str] = None):
+        self.event_bus = event_bus
+        self.max_jobs = max_jobs
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, mode=0o700, exist_ok=True)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._persisted_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ddns-job')
+    
+    def submit(self, job_type: str, func: Callable[[Callable], Optional[Dict]]) -> Job:
+        """提交任务，func 接收一个进度回调 report_progress(done, total)"""
+        job = Job(job_type)
+        
+        with self._lock:
+            self._jobs[job.id] = job
+            # 只保留最近的任务记录
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        
+        self._publish(job)
+        self._prune_state()
+        self._executor.submit(self._run, job, func)
+        return job
+    
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job or self._load(job_id)
+    
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            jobs = {job.id: job for job in self._jobs.values()}
+        for job in self._load_all():
+            jobs.setdefault(job.id, job)
+        latest = sorted(jobs.values(), key=lambda job: job.created_at)[-limit:]
+        return [job.to_dict() for job in reversed(latest)]
+    
+    def _run(self, job: Job, func: Callable):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        self._publish(job)
+        
+        def report_progress(done: int, total: int):
+            job.progress = {'done': done, 'total': total}
+            self._publish(job, progress_only=True)
+        
+        try:
+            job.result = func(report_progress)
+            success = job.result.get('success', True) if isinstance(job.result, dict) else True
+            job.status = 'succeeded' if success else 'failed'
+            if not success:
+                job.error = job.result.get('message')
+        except Exception as e:
+            logging.error(f"后台任务 {job.type} ({job.id}) 执行失败: {str(e)}")
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+            self._publish(job)
+    
+    def _publish(self, job: Job, progress_only: bool = False):
+        self._persist(job, force=not progress_only)
+        if self.event_bus:
+            data = job.to_dict()
+            # 事件中不携带完整结果，客户端需要时再通过任务接口获取
+            data.pop('result', None)
+            self.event_bus.publish('job_update', data)
+    
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f'{job_id}.json')
+    
+    def _persist(self, job: Job, force: bool = True):
+        """原子写入任务状态（先写临时文件再替换），进度更新按 PERSIST_INTERVAL 节流"""
+        if not self.state_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._persisted_at.get(job.id, 0.0) < PERSIST_INTERVAL:
+            return
+        self._persisted_at[job.id] = now
+        path = self._state_path(job.id)
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False, default=str)
+            os.replace(tmp_file, path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"写入任务状态失败 ({job.id}): {str(e)}")
+        if job.finished_at:
+            self._persisted_at.pop(job.id, None)
+    
+    def _load(self, job_id: str) -> Optional[Job]:
+        if not self.state_dir or not _JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), 'r', encoding='utf-8') as f:
+                return Job.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"读取任务状态失败 ({job_id}): {str(e)}")
+            return None
+    
+    def _load_all(self) -> List[Job]:
+        if not self.state_dir:
+            return []
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return []
+        jobs = (self._load(name[:-5]) for name in names if name.endswith('.json'))
+        return [job for job in jobs if job]
+    
+    def _prune_state(self):
+        """所有进程合计只保留最近的 max_jobs 个任务状态文件"""
+        if not self.state_dir:
+            return
+        try:
+            paths = [os.path.join(self.state_dir, name) for name in os.listdir(self.state_dir)
+                     if name.endswith('.json')]
+            if len(paths) <= self.max_jobs:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:-self.max_jobs]:
+                os.remove(path)
+        except OSError:
+            # 其他进程同时清理时文件可能已被删除
+            pass
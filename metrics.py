@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标模块 - 进程内聚合的计数器 / 仪表 / 直方图，以Prometheus文本格式导出
+
+多个gunicorn worker时，设置 DDNS_METRICS_DIR（或调用 enable_multiprocess）后，
+每个进程定期把自己的指标原子写入 metrics_<pid>.json，/metrics 读取所有文件合并：
+计数器和直方图求和，仪表只取存活进程中的最大值（或和）。
+"""
+
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 多进程模式下的写盘间隔（秒）
+FLUSH_INTERVAL = 10
+
+# 已退出进程的指标累计文件
+ARCHIVE_FILE = 'metrics_archive.json'
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    """指标基类：按标签值元组保存样本"""
+    
+    type_name = ''
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._samples: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def export(self) -> Dict:
+        """导出可JSON序列化的状态"""
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._samples.items()]
+        return {
+            'type': self.type_name,
+            'help': self.documentation,
+            'labels': list(self.labelnames),
+            'samples': samples
+        }
+    
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+class Counter(_Metric):
+    """单调递增的计数器"""
+    
+    type_name = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        return self._samples.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    """可增可减的仪表，mode 决定多进程合并方式（max / sum）"""
+    
+    type_name = 'gauge'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), mode: str = 'max'):
+        super().__init__(name, documentation, labelnames)
+        self.mode = mode
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = value
+    
+    def value(self, **labels) -> float:
+        return self._samples.get(self._key(labels), 0)
+    
+    def export(self) -> Dict:
+        data = super().export()
+        data['mode'] = self.mode
+        return data
+
+class Histogram(_Metric):
+    """直方图：每组标签保存各分桶计数（非累计）、总和与次数"""
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                # [各分桶计数..., +Inf分桶计数, 总和]
+                sample = self._samples[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[index] += 1
+            sample[-1] += value
+    
+    def export(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), list(value)] for key, value in self._samples.items()]
+        return {
+            'type': self.type_name,
+            'help': self.documentation,
+            'labels': list(self.labelnames),
+            'buckets': list(self.buckets),
+            'samples': samples
+        }
+
+class MetricsRegistry:
+    """指标注册表"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._directory: Optional[str] = None
+        self._flush_thread: Optional[threading.Thread] = None
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), mode: str = 'max') -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, mode))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def export(self) -> Dict[str, Dict]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.export() for metric in metrics}
+    
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+    
+    # ---- 多进程 ----
+    
+    @property
+    def multiprocess(self) -> bool:
+        return self._directory is not None
+    
+    def enable_multiprocess(self, directory: str):
+        """启用多进程收集：定期把本进程的指标写入 directory"""
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        if self._flush_thread and self._flush_thread.is_alive():
+            return
+        self._flush_thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flush_thread.start()
+    
+    def _after_fork(self):
+        """子进程不继承父进程的样本（否则合并时重复计数），并重新启动写盘线程"""
+        self.reset()
+        if self._directory:
+            self._flush_thread = None
+            self.enable_multiprocess(self._directory)
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+    
+    def flush(self):
+        """原子写入本进程的指标快照"""
+        if self._directory:
+            _write_state(os.path.join(self._directory, f'metrics_{os.getpid()}.json'), self.export())
+    
+    def collect(self) -> Dict[str, Dict]:
+        """返回要导出的指标：单进程时为本进程状态，多进程时合并所有进程的快照
+        
+        已退出进程（gunicorn --max-requests 回收的worker）的快照会并入 metrics_archive.json 后删除，
+        计数器在worker重启后保持单调，目录中的文件数也不会无限增长。
+        """
+        if not self._directory:
+            return self.export()
+        
+        self.flush()
+        archive_path = os.path.join(self._directory, ARCHIVE_FILE)
+        merged: Dict[str, Dict] = {}
+        with open(os.path.join(self._directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            archive: Dict[str, Dict] = {}
+            _merge_into(archive, _read_state(archive_path), False)
+            dead_paths = []
+            for path in glob.glob(os.path.join(self._directory, 'metrics_*.json')):
+                try:
+                    pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                except ValueError:
+                    continue
+                state = _read_state(path)
+                if _pid_alive(pid):
+                    _merge_into(merged, state, True)
+                else:
+                    _merge_into(archive, state, False)
+                    dead_paths.append(path)
+            if dead_paths:
+                _write_state(archive_path, _to_state(archive))
+                for path in dead_paths:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+        _merge_into(merged, _to_state(archive), False)
+        return _to_state(merged)
+
+def _read_state(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_state(path: str, state: Dict[str, Dict]):
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"写入指标快照失败: {str(e)}")
+
+def _to_state(merged: Dict[str, Dict]) -> Dict[str, Dict]:
+    """把 _merge_into 的结果转换回可序列化的快照格式"""
+    return {
+        name: dict(data, samples=[[list(key), value] for key, value in data['samples'].items()])
+        for name, data in merged.items()
+    }
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _merge_into(merged: Dict[str, Dict], state: Dict[str, Dict], alive: bool):
+    """把一个进程的指标快照合并进 merged（样本以标签元组为键）"""
+    for name, data in state.items():
+        target = merged.get(name)
+        if target is None:
+            target = merged[name] = dict(data, samples={})
+        samples = target['samples']
+        for labels, value in data.get('samples', []):
+            key = tuple(labels)
+            if data['type'] == 'gauge':
+                # 已退出进程的仪表值没有意义
+                if not alive:
+                    continue
+                if key in samples and data.get('mode') != 'sum':
+                    samples[key] = max(samples[key], value)
+                else:
+                    samples[key] = samples.get(key, 0) + value
+            elif data['type'] == 'histogram':
+                if key in samples:
+                    samples[key] = [a + b for a, b in zip(samples[key], value)]
+                else:
+                    samples[key] = list(value)
+            else:
+                samples[key] = samples.get(key, 0) + value
+
+def render_text(state: Dict[str, Dict]) -> str:
+    """以Prometheus文本格式（0.0.4）输出"""
+    lines: List[str] = []
+    for name in sorted(state):
+        data = state[name]
+        samples = data['samples']
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        labelnames = data['labels']
+        for labels, value in sorted(samples, key=lambda s: s[0]):
+            if data['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(data['buckets']) + [math.inf], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, ('le', _format_value(bound)))} "
+                                 f"{cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+# 全局注册表
+REGISTRY = MetricsRegistry()
+
+os.register_at_fork(after_in_child=REGISTRY._after_fork)
+
+if os.environ.get('DDNS_METRICS_DIR'):
+    REGISTRY.enable_multiprocess(os.environ['DDNS_METRICS_DIR'])
+
+# ---- 业务指标 ----
+
+IP_DETECTION_SECONDS = REGISTRY.histogram(
+    'ddns_ip_detection_seconds', '单个IP检测服务的请求耗时', ('service', 'family'))
+IP_DETECTION_FAILURES = REGISTRY.counter(
+    'ddns_ip_detection_failures_total', 'IP检测服务请求失败或返回无效IP的次数', ('service', 'family'))
+API_SECONDS = REGISTRY.histogram(
+    'ddns_edgeone_api_seconds', 'EdgeOne API调用耗时', ('action',))
+API_ERRORS = REGISTRY.counter(
+    'ddns_edgeone_api_errors_total', 'EdgeOne API调用错误次数（按错误码）', ('action', 'code'))
+API_THROTTLE_SECONDS = REGISTRY.counter(
+    'ddns_edgeone_api_throttle_seconds_total', '因账号请求频率上限而等待的时间', ('account',))
+CYCLE_SECONDS = REGISTRY.histogram(
+    'ddns_cycle_duration_seconds', '完整更新周期耗时', ('result',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+CYCLES = REGISTRY.counter(
+    'ddns_cycles_total', '完整更新周期次数（ip_changed 表示公网IP是否与上次不同）', ('ip_changed',))
+RECORDS = REGISTRY.counter(
+    'ddns_records_total', '记录处理结果（changed / unchanged / failed / cancelled）', ('record_type', 'outcome'))
+CYCLE_DEADLINE_EXCEEDED = REGISTRY.counter(
+    'ddns_cycle_deadline_exceeded_total', '超出 cycle_timeout、只返回部分结果的周期次数')
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    'ddns_webhook_delivery_seconds', 'Webhook投递耗时', ('target',))
+WEBHOOK_DELIVERIES = REGISTRY.counter(
+    'ddns_webhook_deliveries_total', 'Webhook投递次数', ('target', 'result'))
+SCHEDULER_LAG = REGISTRY.gauge(
+    'ddns_scheduler_lag_seconds', '定时任务实际执行时间相对计划时间的延迟（最近一次）')
+
+def observe_cycle(duration: float, success: bool, ip_changed: bool):
+    """记录一次完整周期"""
+    CYCLE_SECONDS.observe(duration, result='success' if success else 'failure')
+    CYCLES.inc(ip_changed='true' if ip_changed else 'false')
+
+def observe_record(record_type: str, result: Dict):
+    """按结果动作记录一条DNS记录的处理结果"""
+    if result.get('action') == 'cancelled':
+        outcome = 'cancelled'
+    elif not result.get('success'):
+        outcome = 'failed'
+    elif result.get('action') == 'no_change':
+        outcome = 'unchanged'
+    else:
+        outcome = 'changed'
+    RECORDS.inc(record_type=record_type, outcome=outcome)
+
+def render() -> str:
+    """导出所有指标，并根据（合并后的）周期计数附加IP未变化比例"""
+    state = REGISTRY.collect()
+    cycles = {tuple(labels): value for labels, value in state.get(CYCLES.name, {}).get('samples', [])}
+    total = sum(cycles.values())
+    state['ddns_ip_unchanged_skip_ratio'] = {
+        'type': 'gauge',
+        'help': '公网IP未变化的周期占全部周期的比例',
+        'labels': [],
+        'samples': [[[], cycles.get(('false',), 0) / total if total else 0]]
+    }
+    return render_text(state)
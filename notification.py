@@ -7,18 +7,178 @@
 import json
 import requests
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Any, Callable, Optional, Dict, List, Mapping, Set
 from string import Template
 
+from requests.adapters import HTTPAdapter
+
+import deadline
+import metrics
+import tracing
+from notification_coalescer import NotificationCoalescer
+from notification_dispatcher import NotificationDispatcher
+from notification_payload import payload_size, split_chunks, summarize_results
+
+class CompiledTemplate:
+    """预编译的Webhook模板
+    
+    配置时遍历一次模板树，把含占位符的字符串编译为 string.Template，并记录用到的变量名；
+    发送时只需按编译结果填充，调用方也可以据此只计算模板实际引用的变量。
+    """
+    
+    def __init__(self, template: Any):
+        self.identifiers: Set[str] = set()
+        self._plan = self._compile(template)
+    
+    def _compile(self, node: Any):
+        if isinstance(node, str):
+            if '$' not in node:
+                return ('lit', node)
+            t = Template(node)
+            self.identifiers.update(t.get_identifiers())
+            return ('tpl', t)
+        elif isinstance(node, Mapping):
+            return ('map', [(k, self._compile(v)) for k, v in node.items()])
+        elif isinstance(node, (list, tuple)):
+            return ('seq', [self._compile(item) for item in node])
+        else:
+            return ('lit', node)
+    
+    def render(self, variables: Mapping) -> Any:
+        return self._render(self._plan, variables)
+    
+    def _render(self, plan, variables: Mapping) -> Any:
+        kind, value = plan
+        if kind == 'tpl':
+            try:
+                return value.safe_substitute(variables)
+            except Exception:
+                return value.template
+        elif kind == 'map':
+            return {k: self._render(v, variables) for k, v in value}
+        elif kind == 'seq':
+            return [self._render(item, variables) for item in value]
+        return value
+
+class WebhookTarget:
+    """Webhook投递目标：独立的模板、事件过滤、超时和连接池"""
+    
+    def __init__(self, name: str, url: str, headers: Mapping = None, body_template: Mapping = None,
+                 events: Optional[List[str]] = None, timeout: float = 15, max_payload_bytes: int = 0):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        # 请求体字节数上限，0表示不限制
+        self.max_payload_bytes = max_payload_bytes
+        # 为空表示接收全部类型的通知
+        self.events = frozenset(events) if events else None
+        self.headers = headers or {}
+        self.body_template = body_template or {}
+        self._headers_template = CompiledTemplate(self.headers)
+        self._body_template = CompiledTemplate(self.body_template)
+        self.identifiers = self._headers_template.identifiers | self._body_template.identifiers
+        
+        # 每个目标复用自己的连接池
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'sent': 0,
+            'failed': 0,
+            'last_error': None,
+            'last_latency': None,
+            'latency_total': 0.0
+        }
+    
+    @classmethod
+    def from_config(cls, item: Mapping, index: int = 0) -> 'WebhookTarget':
+        """从配置项创建目标；template 指定 WEBHOOK_TEMPLATES 中的预定义模板，headers / body 覆盖模板内容"""
+        preset = WEBHOOK_TEMPLATES.get(item.get('template') or '', {})
+        headers = dict(preset.get('headers', {}))
+        headers.update(item.get('headers') or {})
+        body = item.get('body') or item.get('body_template') or preset.get('body', {})
+        try:
+            timeout = float(item.get('timeout', 15))
+        except (TypeError, ValueError):
+            timeout = 15
+        try:
+            max_payload_bytes = max(0, int(item.get('max_payload_bytes', preset.get('max_payload_bytes', 0))))
+        except (TypeError, ValueError):
+            max_payload_bytes = 0
+        return cls(
+            name=str(item.get('name') or f"target-{index + 1}"),
+            url=str(item.get('url', '')),
+            headers=headers,
+            body_template=body,
+            events=list(item.get('events') or []),
+            timeout=timeout,
+            max_payload_bytes=max_payload_bytes
+        )
+    
+    def accepts(self, context: Dict) -> bool:
+        """判断是否接收该类型的通知（汇总通知按其中包含的类型判断）"""
+        if self.events is None:
+            return True
+        event_types = context.get('event_types') or [context.get('type', 'custom')]
+        return any(event_type in self.events for event_type in event_types)
+    
+    def build_request(self, variables: Mapping) -> Dict:
+        """渲染出本目标的请求"""
+        # 合并默认请求头和自定义请求头
+        headers = {
+            'User-Agent': 'EdgeOne-DDNS-Notifier/2.0',
+            'Content-Type': 'application/json'
+        }
+        headers.update(self._headers_template.render(variables))
+        return {
+            'target': self.name,
+            'url': self.url,
+            'headers': headers,
+            'body': self._body_template.render(variables),
+            'timeout': self.timeout
+        }
+    
+    def record(self, success: bool, latency: float, error: Optional[str] = None):
+        with self._stats_lock:
+            self.stats['sent' if success else 'failed'] += 1
+            self.stats['last_latency'] = round(latency, 3)
+            self.stats['latency_total'] += latency
+            if error:
+                self.stats['last_error'] = error
+    
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        total = stats.pop('latency_total')
+        count = stats['sent'] + stats['failed']
+        stats['latency_avg'] = round(total / count, 3) if count else None
+        stats['url'] = self.url
+        stats['events'] = sorted(self.events) if self.events else None
+        return stats
+
 class NotificationManager:
-    """自定义Webhook通知管理器"""
+    """自定义Webhook通知管理器
+    
+    除 webhook_url 对应的默认目标外，还可以通过 set_webhook_targets 配置多个目标，
+    每条通知并行发送到所有接收该类型通知的目标。
+    """
     
     def __init__(self, webhook_url: str = "", webhook_headers: dict = None, webhook_body_template: dict = None):
-        self.webhook_url = webhook_url
-        self.webhook_headers = webhook_headers or {}
-        self.webhook_body_template = webhook_body_template or {}
         self.session = requests.Session()
+        # 后台分发器，未启用时同步发送
+        self.dispatcher: Optional[NotificationDispatcher] = None
+        # 通知合并器，未启用时逐条发送
+        self.coalescer: Optional[NotificationCoalescer] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._default_target: Optional[WebhookTarget] = None
+        self._extra_targets: List[WebhookTarget] = []
+        self.set_webhook_config(webhook_url, webhook_headers, webhook_body_template)
         
         # 设置默认请求头
         self.session.headers.update({
@@ -26,94 +186,317 @@ class NotificationManager:
             'Content-Type': 'application/json'
         })
     
-    def set_webhook_config(self, webhook_url: str, webhook_headers: dict = None, webhook_body_template: dict = None):
-        """设置Webhook配置"""
+    def set_webhook_config(self, webhook_url: str, webhook_headers: dict = None, webhook_body_template: dict = None,
+                           max_payload_bytes: int = 0):
+        """设置默认Webhook目标"""
         self.webhook_url = webhook_url
         self.webhook_headers = webhook_headers or {}
         self.webhook_body_template = webhook_body_template or {}
+        self._default_target = WebhookTarget(
+            'default', webhook_url, self.webhook_headers, self.webhook_body_template,
+            max_payload_bytes=max_payload_bytes
+        ) if webhook_url else None
+    
+    def set_webhook_targets(self, targets: List[Mapping]):
+        """设置额外的Webhook目标列表，缺少URL或禁用的目标会被忽略"""
+        self._extra_targets = [
+            WebhookTarget.from_config(item, index)
+            for index, item in enumerate(targets or [])
+            if item.get('url') and item.get('enabled', True)
+        ]
+    
+    @property
+    def targets(self) -> List[WebhookTarget]:
+        """全部投递目标"""
+        if self._default_target:
+            return [self._default_target] + self._extra_targets
+        return list(self._extra_targets)
+    
+    def enable_async(self, max_queue: int = 100, max_retries: int = 3, spool_file: Optional[str] = None):
+        """启用后台分发：通知进入有界队列后立即返回，由后台线程发送并失败重试
+        
+        已启用时参数有变化会重建分发器：相同暂存文件中的通知由新分发器从文件恢复，
+        否则把未完成的通知转交给新分发器。
+        """
+        spool_file = spool_file or None
+        old = self.dispatcher
+        if old and (old.max_queue, old.max_retries, old.spool_file) == (max_queue, max_retries, spool_file):
+            return
+        # 先等旧线程退出（正在进行的发送失败时会进入重试堆），再接管它未完成的通知
+        stopped = old.stop(self._send_timeout()) if old else True
+        self.dispatcher = NotificationDispatcher(
+            self._deliver,
+            max_queue=max_queue,
+            max_retries=max_retries,
+            spool_file=spool_file
+        )
+        self.dispatcher.start()
+        if old and not (old.spool_file and old.spool_file == spool_file):
+            for delivery in old.pending_deliveries():
+                self.dispatcher.enqueue(delivery)
+            if stopped:
+                old.discard_spool()
+            else:
+                # 正在发送的通知可能还会进入旧分发器，保留旧暂存文件，之后启动的分发器会接管
+                logging.warning("旧的通知分发线程未能及时退出，保留其暂存文件")
+    
+    def disable_async(self, timeout: float = 5.0):
+        """停用后台分发，改回同步发送；超时未发出的通知保留在暂存文件中，下次启用时恢复"""
+        if not self.dispatcher:
+            return
+        self.dispatcher.drain(timeout)
+        if not self.dispatcher.stop(self._send_timeout()):
+            logging.warning("通知分发线程未能及时退出")
+        elif not self.dispatcher.spool_file and self.dispatcher.pending_deliveries():
+            logging.warning(f"停用后台分发，丢弃 {len(self.dispatcher.pending_deliveries())} 条未发出的通知")
+        self.dispatcher = None
+    
+    def _send_timeout(self) -> float:
+        """等待一次正在进行的发送结束的时间：最长的Webhook超时再留5秒"""
+        return max((target.timeout for target in self.targets), default=15) + 5
+    
+    def set_coalesce_window(self, window: float, clock: Callable[[], float] = time.monotonic,
+                            use_timer: bool = True):
+        """设置通知合并窗口（秒），0表示不合并；不使用定时器时由调用方调用 coalescer.flush_due()"""
+        if self.coalescer and self.coalescer.window == window and self.coalescer.clock is clock:
+            return
+        if self.coalescer:
+            # 先发出旧窗口中积压的通知
+            self.coalescer.flush()
+        self.coalescer = NotificationCoalescer(window, self._dispatch, clock, use_timer) if window > 0 else None
+    
+    def flush(self, timeout: float = 30.0) -> bool:
+        """立即发出合并窗口中的通知，并等待后台队列发送完毕，返回是否在超时前完成"""
+        if self.coalescer:
+            self.coalescer.flush()
+        if self.dispatcher:
+            return self.dispatcher.drain(timeout)
+        return True
+    
+    def get_stats(self) -> Dict:
+        """获取通知分发统计"""
+        if not self.dispatcher:
+            stats = {'async': False}
+        else:
+            stats = self.dispatcher.get_stats()
+            stats['async'] = True
+        stats['coalesce'] = self.coalescer.get_stats() if self.coalescer else None
+        stats['targets'] = {target.name: target.get_stats() for target in self.targets}
+        return stats
     
-    def _format_variables(self, context: Dict) -> Dict:
-        """格式化变量，用于模板替换"""
+    def _format_variables(self, context: Dict, needed: Optional[Set[str]] = None) -> Dict:
+        """格式化变量，用于模板替换
+        
+        needed 为模板引用的变量名集合；给出时只序列化被引用的 *_json / *_string 变量，
+        避免为模板用不到的大列表（如上千个域名的批量结果）生成JSON。
+        """
+        now = datetime.now()
         # 基础变量
         variables = {
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'timestamp_iso': datetime.now().isoformat(),
-            'timestamp_unix': int(datetime.now().timestamp()),
+            'timestamp': now.strftime("%Y-%m-%d %H:%M:%S"),
+            'timestamp_iso': now.isoformat(),
+            'timestamp_unix': int(now.timestamp()),
         }
         
         # 添加上下文变量
         variables.update(context)
         
         # 格式化复杂变量为JSON字符串
-        # 创建副本避免修改原始字典
-        variables_copy = variables.copy()
-        for key, value in variables_copy.items():
-            if isinstance(value, (dict, list)):
+        for key, value in context.items():
+            if not isinstance(value, (dict, list)):
+                continue
+            if needed is None or f"{key}_json" in needed:
                 variables[f"{key}_json"] = json.dumps(value, ensure_ascii=False, indent=2)
+            if needed is None or f"{key}_string" in needed:
                 variables[f"{key}_string"] = json.dumps(value, ensure_ascii=False)
         
         return variables
     
-    def _substitute_template(self, template: any, variables: Dict) -> any:
+    def _substitute_template(self, template: Any, variables: Dict) -> Any:
         """递归替换模板中的变量"""
-        if isinstance(template, str):
-            try:
-                # 使用字符串模板替换变量
-                t = Template(template)
-                return t.safe_substitute(variables)
-            except:
-                return template
-        elif isinstance(template, dict):
-            return {k: self._substitute_template(v, variables) for k, v in template.items()}
-        elif isinstance(template, list):
-            return [self._substitute_template(item, variables) for item in template]
-        else:
-            return template
+        return CompiledTemplate(template).render(variables)
     
-    def _send_webhook(self, context: Dict) -> bool:
-        """发送Webhook通知"""
-        if not self.webhook_url:
+    def _send_webhook(self, context: Dict, sync: bool = False) -> bool:
+        """发送Webhook通知；启用合并时先进入合并窗口"""
+        if not self.targets:
             logging.warning("未配置Webhook URL")
             return False
         
+        with tracing.span('notify', type=context.get('type')) as notify_span:
+            if self.coalescer and not sync:
+                notify_span.set(mode='coalesced')
+                return self.coalescer.add(context)
+            notify_span.set(mode='queued' if self.dispatcher and not sync else 'sync')
+            return self._dispatch(context, sync)
+    
+    def _dispatch(self, context: Dict, sync: bool = False) -> bool:
+        """渲染并发送通知；启用后台分发且非同步调用时只负责入队"""
         try:
-            # 格式化变量
-            variables = self._format_variables(context)
-            
-            # 准备请求头
-            headers = self._substitute_template(self.webhook_headers, variables)
-            
-            # 准备请求体
-            body = self._substitute_template(self.webhook_body_template, variables)
+            delivery = self._build_delivery(context)
+        except Exception as e:
+            logging.error(f"Webhook通知发送异常: {str(e)}")
+            return False
+        
+        if not delivery['requests']:
+            logging.debug(f"没有目标接收 {delivery['type']} 类型的通知")
+            return True
+        
+        if self.dispatcher and not sync:
+            return self.dispatcher.enqueue(delivery)
+        return self._deliver(delivery)
+    
+    def _build_delivery(self, context: Dict) -> Dict:
+        """渲染模板，为每个接收该通知的目标生成请求"""
+        targets = [target for target in self.targets if target.accepts(context)]
+        
+        # 格式化变量（只计算模板引用到的变量）
+        needed = set()
+        for target in targets:
+            needed |= target.identifiers
+        variables = self._format_variables(context, needed)
+        
+        requests_list = []
+        for target in targets:
+            req = target.build_request(variables)
+            if target.max_payload_bytes and payload_size(req['body']) > target.max_payload_bytes:
+                req = self._fit_payload(target, context, req)
+            requests_list.append(req)
+        
+        return {
+            'type': context.get('type', 'custom'),
+            'requests': requests_list
+        }
+    
+    def _fit_payload(self, target: WebhookTarget, context: Dict, req: Dict) -> Dict:
+        """请求体超出目标的字节上限时，先用摘要替换完整结果，仍然超限则拆分为有序的多条消息"""
+        budget = target.max_payload_bytes
+        if isinstance(context.get('results'), list):
+            key = 'results'
+        elif isinstance(context.get('domains'), list):
+            key = 'domains'
+        else:
+            logging.warning(f"Webhook目标 {target.name} 的请求体超出 {budget} 字节，且无法拆分")
+            return req
+        
+        summary = context.get('summary')
+        if key == 'results' and isinstance(summary, Mapping):
+            # 只保留发生变化的域名和前N条失败
+            items = list(summary['changed']) + list(summary['failures'])
+        else:
+            items = list(context[key])
+        
+        def render(chunk: List, extra: Optional[Dict] = None) -> Dict:
+            chunk_context = dict(context)
+            chunk_context[key] = chunk
+            if extra:
+                chunk_context.update(extra)
+            return target.build_request(self._format_variables(chunk_context, target.identifiers))
+        
+        compact = render(items)
+        if payload_size(compact['body']) <= budget:
+            return compact
+        if payload_size(render([])['body']) > budget:
+            # 模板本身已超限，拆分没有意义
+            logging.warning(f"Webhook目标 {target.name} 的模板超出 {budget} 字节，按摘要发送")
+            return compact
+        
+        chunks = split_chunks(items, lambda chunk: render(chunk)['body'], budget)
+        total = len(chunks)
+        message = context.get('message', '')
+        compact.pop('body')
+        compact['body_chunks'] = [
+            render(chunk, {
+                'chunk_index': index,
+                'chunk_total': total,
+                'message': f"{message} ({index}/{total})"
+            })['body']
+            for index, chunk in enumerate(chunks, 1)
+        ]
+        logging.info(f"Webhook目标 {target.name} 的通知拆分为 {total} 条发送")
+        return compact
+    
+    def _deliver(self, delivery: Dict) -> bool:
+        """并行发送到各个目标；部分失败时只保留失败的请求，便于分发器重试"""
+        requests_list = delivery.get('requests')
+        if requests_list is None:
+            # 单目标格式的暂存通知
+            requests_list = [delivery]
+        if len(requests_list) == 1:
+            outcomes = [self._post(requests_list[0])]
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='webhook')
+            # 同步发送时发送线程继承周期的截止时间
+            budget = deadline.current()
             
-            # 合并默认请求头和自定义请求头
-            final_headers = {
-                'User-Agent': 'EdgeOne-DDNS-Notifier/2.0',
-                'Content-Type': 'application/json'
-            }
-            final_headers.update(headers)
+            def post(req: Dict) -> bool:
+                with deadline.scope(budget):
+                    return self._post(req)
             
-            logging.debug(f"发送Webhook通知到: {self.webhook_url}")
-            logging.debug(f"请求头: {final_headers}")
+            outcomes = list(self._executor.map(post, requests_list))
+        
+        failed = [req for req, success in zip(requests_list, outcomes) if not success]
+        delivery['requests'] = failed
+        return not failed
+    
+    def _post(self, req: Dict) -> bool:
+        """发送单个目标的请求；分片的请求按顺序发送，已送达的分片不会重发"""
+        target = next((t for t in self.targets if t.name == req.get('target')), None)
+        if 'body_chunks' not in req:
+            return self._post_body(target, req, req['body'])
+        
+        chunks = req['body_chunks']
+        while chunks:
+            if not self._post_body(target, req, chunks[0]):
+                return False
+            chunks.pop(0)
+        return True
+    
+    def _post_body(self, target: Optional[WebhookTarget], req: Dict, body) -> bool:
+        """发送一个请求体并记录统计"""
+        with tracing.span('webhook', target=req.get('target', 'default')) as webhook_span:
+            success = self._post_request(target, req, body)
+            webhook_span.set(success=success)
+        return success
+    
+    def _post_request(self, target: Optional[WebhookTarget], req: Dict, body) -> bool:
+        session = target.session if target else self.session
+        start = time.time()
+        try:
+            logging.debug(f"发送Webhook通知到: {req['url']}")
+            logging.debug(f"请求头: {req['headers']}")
             logging.debug(f"请求体: {json.dumps(body, ensure_ascii=False, indent=2)}")
             
-            response = self.session.post(
-                self.webhook_url,
+            response = session.post(
+                req['url'],
                 json=body,
-                headers=final_headers,
-                timeout=15
+                headers=req['headers'],
+                # 在周期内同步发送时不超过剩余预算
+                timeout=deadline.current().timeout(req.get('timeout', 15))
             )
             response.raise_for_status()
             
-            logging.info("Webhook通知发送成功")
+            logging.info(f"Webhook通知发送成功: {req.get('target', 'default')}")
+            self._record_delivery(target, req, True, time.time() - start)
             return True
-            
+        
         except requests.exceptions.RequestException as e:
-            logging.error(f"Webhook通知请求失败: {str(e)}")
-            return False
+            logging.error(f"Webhook通知请求失败 ({req.get('target', 'default')}): {str(e)}")
+            error = str(e)
         except Exception as e:
-            logging.error(f"Webhook通知发送异常: {str(e)}")
-            return False
+            logging.error(f"Webhook通知发送异常 ({req.get('target', 'default')}): {str(e)}")
+            error = str(e)
+        
+        self._record_delivery(target, req, False, time.time() - start, error)
+        return False
+    
+    def _record_delivery(self, target: Optional[WebhookTarget], req: Dict, success: bool,
+                         latency: float, error: Optional[str] = None):
+        name = req.get('target', 'default')
+        metrics.WEBHOOK_SECONDS.observe(latency, target=name)
+        metrics.WEBHOOK_DELIVERIES.inc(target=name, result='success' if success else 'failure')
+        if target:
+            target.record(success, latency, error)
     
     def send_ip_update_notification(self, domain: str, old_ip: Optional[str], new_ip: str, action: str) -> bool:
         """发送IP更新通知"""
@@ -132,12 +515,20 @@ class NotificationManager:
     
     def send_batch_update_notification(self, results: List[Dict]) -> bool:
         """发送批量更新结果通知"""
-        success_count = sum(1 for r in results if r.get('success', False))
-        total_count = len(results)
+        # 一次遍历得到计数、变化的域名和失败摘要，负载超限时用于替换完整结果
+        summary = summarize_results(results)
+        success_count = summary['success_count']
+        total_count = summary['total_count']
         
         context = {
             'type': 'batch_update',
             'results': results,
+            'summary': summary,
+            'action_counts': summary['action_counts'],
+            'changed_domains': summary['changed'],
+            'changed_count': summary['changed_count'],
+            'failures': summary['failures'],
+            'failure_count': summary['failure_count'],
             'success_count': success_count,
             'total_count': total_count,
             'success_rate': f"{success_count}/{total_count}",
@@ -178,7 +569,8 @@ class NotificationManager:
             'description': 'EdgeOne DDNS Webhook通知连接正常'
         }
         
-        return self._send_webhook(context)
+        # 测试通知需要立即知道发送结果，始终同步发送
+        return self._send_webhook(context, sync=True)
     
     def send_startup_notification(self, domains: List[str]) -> bool:
         """发送服务启动通知"""
@@ -223,6 +615,7 @@ class NotificationManager:
 WEBHOOK_TEMPLATES = {
     # 钉钉机器人模板
     'dingtalk': {
+        'max_payload_bytes': 20000,
         'headers': {
             'Content-Type': 'application/json'
         },
@@ -236,6 +629,7 @@ WEBHOOK_TEMPLATES = {
     
     # Slack Webhook模板
     'slack': {
+        'max_payload_bytes': 40000,
         'headers': {
             'Content-Type': 'application/json'
         },
@@ -271,6 +665,7 @@ WEBHOOK_TEMPLATES = {
     
     # Discord Webhook模板
     'discord': {
+        'max_payload_bytes': 6000,
         'headers': {
             'Content-Type': 'application/json'
         },
@@ -290,6 +685,7 @@ WEBHOOK_TEMPLATES = {
     
     # 企业微信机器人模板
     'wechat': {
+        'max_payload_bytes': 2048,
         'headers': {
             'Content-Type': 'application/json'
         },
@@ -303,6 +699,7 @@ WEBHOOK_TEMPLATES = {
     
     # 企业微信Markdown模板
     'wechat_markdown': {
+        'max_payload_bytes': 4096,
         'headers': {
             'Content-Type': 'application/json'
         },
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通知合并模块 - 在时间窗口内合并通知，抑制网络抖动造成的通知风暴
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+# 汇总消息中最多列出的条目数，其余只计数
+MAX_DIGEST_LINES = 20
+
+class NotificationCoalescer:
+    """通知合并器
+    
+    窗口内的第一条通知开启窗口，窗口结束时把期间的全部通知合并成一条汇总发出：
+    同一域名的多次变更合并为「最早的旧IP → 最新的新IP」并记录次数，相同的错误只保留一条并计数。
+    窗口内只有一条通知时原样发出。无论事件频率多高，每个窗口最多产生一条Webhook。
+    
+    默认由定时器在窗口结束时发送；传入 use_timer=False 和自定义 clock 时，
+    由调用方通过 flush_due() 驱动（例如虚拟时钟的模拟器）。
+    """
+    
+    def __init__(self, window: float, flush_func: Callable[[Dict], bool],
+                 clock: Callable[[], float] = time.monotonic, use_timer: bool = True):
+        self.window = window
+        self.flush_func = flush_func
+        self.clock = clock
+        self.use_timer = use_timer
+        self._lock = threading.Lock()
+        self._pending: List[Dict] = []
+        self._window_start: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self.stats = {
+            'received': 0,
+            'sent': 0,
+            'digests': 0,
+            'suppressed': 0
+        }
+    
+    def add(self, context: Dict) -> bool:
+        """加入当前窗口，窗口未开启时开启新窗口"""
+        with self._lock:
+            self._pending.append(context)
+            self.stats['received'] += 1
+            if self._window_start is not None:
+                return True
+            self._window_start = self.clock()
+            if self.use_timer:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+    
+    def flush_due(self, now: Optional[float] = None) -> bool:
+        """窗口已到期时发送汇总，返回是否发送"""
+        now = self.clock() if now is None else now
+        with self._lock:
+            if self._window_start is None or now - self._window_start < self.window:
+                return False
+        return self.flush()
+    
+    def flush(self) -> bool:
+        """立即结束当前窗口并发送汇总"""
+        with self._lock:
+            events = self._pending
+            self._pending = []
+            self._window_start = None
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        
+        if not events:
+            return False
+        
+        context = events[0] if len(events) == 1 else build_digest(events, self.window)
+        with self._lock:
+            self.stats['sent'] += 1
+            self.stats['suppressed'] += len(events) - 1
+            if len(events) > 1:
+                self.stats['digests'] += 1
+        
+        try:
+            return bool(self.flush_func(context))
+        except Exception as e:
+            logging.error(f"发送合并通知失败: {str(e)}")
+            return False
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._pending)
+        stats['window'] = self.window
+        return stats
+
+def build_digest(events: List[Dict], window: float) -> Dict:
+    """把窗口内的多条通知合并为一条汇总通知"""
+    domains: "OrderedDict[tuple, Dict]" = OrderedDict()
+    errors: "OrderedDict[str, Dict]" = OrderedDict()
+    others: "OrderedDict[tuple, Dict]" = OrderedDict()
+    
+    def merge_domain(domain: str, record_type: str, old_ip: Optional[str], new_ip: Optional[str],
+                     action: Optional[str], success: bool, message: str = ''):
+        key = (domain, record_type)
+        entry = domains.get(key)
+        if entry is None:
+            domains[key] = {
+                'domain': domain,
+                'record_type': record_type,
+                'old_ip': old_ip,
+                'new_ip': new_ip,
+                'action': action,
+                'success': success,
+                'message': message,
+                'count': 1
+            }
+            return
+        # 保留最早的旧IP，其余字段取最新值
+        entry['new_ip'] = new_ip or entry['new_ip']
+        entry['action'] = action
+        entry['success'] = success
+        entry['message'] = message
+        entry['count'] += 1
+    
+    def merge_error(message: str):
+        entry = errors.setdefault(message, {'message': message, 'count': 0})
+        entry['count'] += 1
+    
+    for event in events:
+        event_type = event.get('type')
+        if event_type == 'ip_update':
+            merge_domain(event.get('domain', ''), event.get('record_type', 'A'), event.get('old_ip'),
+                         event.get('new_ip'), event.get('action'), True, event.get('message', ''))
+        elif event_type == 'batch_update':
+            for result in event.get('results', []):
+                merge_domain(result.get('domain', ''), result.get('record_type', 'A'), result.get('old_ip'),
+                             result.get('ip_address'), result.get('action'),
+                             result.get('success', False), result.get('message', ''))
+        elif event_type == 'error' or (event_type == 'system_alert' and event.get('level') == 'error'):
+            merge_error(event.get('error_message') or event.get('message', ''))
+        else:
+            key = (event_type, event.get('message', ''))
+            entry = others.setdefault(key, {'type': event_type, 'message': event.get('message', ''), 'count': 0})
+            entry['count'] += 1
+    
+    domain_list = list(domains.values())
+    for entry in domain_list:
+        # 窗口内IP来回变化最终未变：视为抖动
+        entry['flapped'] = entry['count'] > 1 and entry['old_ip'] == entry['new_ip']
+    
+    success_count = sum(1 for d in domain_list if d['success'])
+    changed_count = sum(1 for d in domain_list if d['old_ip'] != d['new_ip'])
+    error_count = sum(e['count'] for e in errors.values())
+    
+    lines = []
+    for entry in domain_list:
+        repeat = f" ({entry['count']}次)" if entry['count'] > 1 else ""
+        if entry['flapped']:
+            lines.append(f"{entry['domain']} [{entry['record_type']}]: IP抖动后恢复为 {entry['new_ip']}{repeat}")
+        elif entry['success']:
+            lines.append(f"{entry['domain']} [{entry['record_type']}]: {entry['old_ip'] or '无'} → {entry['new_ip']}{repeat}")
+        else:
+            lines.append(f"{entry['domain']} [{entry['record_type']}]: 更新失败 {entry['message']}{repeat}")
+    for entry in errors.values():
+        repeat = f" ({entry['count']}次)" if entry['count'] > 1 else ""
+        lines.append(f"错误: {entry['message']}{repeat}")
+    for entry in others.values():
+        repeat = f" ({entry['count']}次)" if entry['count'] > 1 else ""
+        lines.append(f"{entry['message']}{repeat}")
+    
+    if len(lines) > MAX_DIGEST_LINES:
+        omitted = len(lines) - MAX_DIGEST_LINES
+        lines = lines[:MAX_DIGEST_LINES] + [f"... 另有 {omitted} 条未列出"]
+    
+    summary = f"{int(window)}秒内合并 {len(events)} 条通知: {len(domain_list)} 个域名, {error_count} 次错误"
+    
+    return {
+        'type': 'digest',
+        'title': 'EdgeOne DDNS 通知汇总',
+        'window_seconds': window,
+        'event_count': len(events),
+        'suppressed_count': len(events) - 1,
+        'domains': domain_list,
+        'domain_count': len(domain_list),
+        'changed_count': changed_count,
+        'success_count': success_count,
+        'total_count': len(domain_list),
+        'errors': list(errors.values()),
+        'error_count': error_count,
+        'events': list(others.values()),
+        'event_types': sorted({event.get('type', 'custom') for event in events}),
+        'summary': summary,
+        'message': summary + '\n' + '\n'.join(lines)
+    }
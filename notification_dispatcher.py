@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步通知分发模块 - 有界发件箱、失败重试和可选的磁盘暂存
+"""
+
+import fcntl
+import heapq
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+class NotificationDispatcher:
+    """后台通知分发器
+    
+    通知先放入有界队列后立即返回，由后台线程发送，因此Webhook的延迟不会阻塞DNS更新。
+    发送失败按指数退避重试；配置了暂存文件时，每条通知入队时追加写入文件，
+    送达或放弃后追加完成标记，进程重启后会重新投递尚未完成的通知。
+    
+    多个gunicorn worker各自写 <spool_file>.<pid>，并在运行期间持有该文件的flock；
+    启动时接管没有被锁住的暂存文件（所属进程已退出），同一条通知只会由一个进程投递。
+    """
+    
+    def __init__(self, send_func: Callable[[Dict], bool], max_queue: int = 100,
+                 max_retries: int = 3, backoff_base: float = 2.0, backoff_max: float = 60.0,
+                 spool_file: Optional[str] = None):
+        self.send_func = send_func
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.spool_file = spool_file or None
+        
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self._retry_heap: List = []
+        self._retry_seq = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._spool_lock = threading.Lock()
+        self._spool_fh = None
+        self._spool_path: Optional[str] = None
+        self._spool_done_count = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'delivered': 0,
+            'failed': 0,
+            'retried': 0,
+            'dropped': 0,
+            'latency_last': None,
+            'latency_max': 0.0,
+            'latency_total': 0.0
+        }
+    
+    def start(self):
+        """启动分发线程，并重新投递暂存文件中未完成的通知"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._open_spool()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5.0) -> bool:
+        """停止分发线程，返回线程是否已退出
+        
+        未发送的通知保留在暂存文件中，释放文件锁后可由其他分发器接管；
+        线程未退出时（正在发送的通知仍可能进入重试堆）pending_deliveries() 不完整。
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        stopped = not (self._thread and self._thread.is_alive())
+        with self._spool_lock:
+            if self._spool_fh:
+                self._spool_fh.close()
+                self._spool_fh = None
+        return stopped
+    
+    def pending_deliveries(self) -> List[Dict]:
+        """尚未完成的通知（队列中和等待重试的）"""
+        with self._queue.mutex:
+            queued = list(self._queue.queue)
+        return queued + [delivery for _, _, delivery in list(self._retry_heap)]
+    
+    def discard_spool(self):
+        """删除本进程的暂存文件（通知已交给其他分发器时使用，需先调用 stop）"""
+        if self._spool_path and not self._spool_fh:
+            try:
+                os.remove(self._spool_path)
+            except OSError:
+                pass
+    
+    def drain(self, timeout: float = 30.0) -> bool:
+        """等待队列中的通知（含待重试的）处理完毕，返回是否在超时前完成"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                settled = self._stats['delivered'] + self._stats['failed']
+            if settled >= self._stats['enqueued'] and not self._retry_heap:
+                return True
+            time.sleep(0.05)
+        return False
+    
+    def enqueue(self, delivery: Dict) -> bool:
+        """加入发件箱，队列已满时丢弃并返回False"""
+        delivery.setdefault('id', uuid.uuid4().hex)
+        delivery.setdefault('created_at', time.time())
+        delivery.setdefault('attempts', 0)
+        
+        # 入队与写暂存文件一起完成，避免与暂存文件压缩交错
+        with self._spool_lock:
+            try:
+                self._queue.put_nowait(delivery)
+            except queue.Full:
+                self._incr('dropped')
+                logging.warning(f"通知队列已满，丢弃通知: {delivery.get('type', 'unknown')}")
+                return False
+            self._spool_write({'op': 'add', 'item': delivery})
+        
+        self._incr('enqueued')
+        return True
+    
+    def get_stats(self) -> Dict:
+        """获取队列深度和投递延迟统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        delivered = stats.pop('latency_total')
+        stats['latency_avg'] = round(delivered / stats['delivered'], 3) if stats['delivered'] else None
+        stats['queue_depth'] = self._queue.qsize()
+        stats['retry_pending'] = len(self._retry_heap)
+        stats['spool_file'] = self._spool_path or self.spool_file
+        return stats
+    
+    def _incr(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            delivery = self._next_delivery()
+            if delivery is None:
+                continue
+            
+            delivery['attempts'] += 1
+            try:
+                success = self.send_func(delivery)
+            except Exception as e:
+                logging.error(f"通知发送异常: {str(e)}")
+                success = False
+            
+            if success:
+                latency = time.time() - delivery['created_at']
+                with self._stats_lock:
+                    self._stats['delivered'] += 1
+                    self._stats['latency_last'] = round(latency, 3)
+                    self._stats['latency_max'] = max(self._stats['latency_max'], round(latency, 3))
+                    self._stats['latency_total'] += latency
+                self._mark_spool_done(delivery)
+            elif delivery['attempts'] <= self.max_retries:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (delivery['attempts'] - 1)))
+                delay += random.uniform(0, delay * 0.1)
+                self._retry_seq += 1
+                heapq.heappush(self._retry_heap, (time.monotonic() + delay, self._retry_seq, delivery))
+                self._incr('retried')
+                logging.info(f"通知发送失败，{delay:.1f}秒后第{delivery['attempts']}次重试")
+            else:
+                self._incr('failed')
+                logging.error(f"通知发送失败，已放弃: {delivery.get('type', 'unknown')}")
+                self._mark_spool_done(delivery)
+    
+    def _next_delivery(self) -> Optional[Dict]:
+        """优先取出已到期的重试，否则等待新通知"""
+        timeout = 1.0
+        if self._retry_heap:
+            due, _, delivery = self._retry_heap[0]
+            wait = due - time.monotonic()
+            if wait <= 0:
+                heapq.heappop(self._retry_heap)
+                return delivery
+            timeout = min(timeout, wait)
+        
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def _spool_write(self, record: Dict):
+        """追加一条暂存记录（调用方持有 _spool_lock）"""
+        if not self._spool_fh:
+            return
+        try:
+            self._spool_fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._spool_fh.flush()
+        except OSError as e:
+            logging.warning(f"写入通知暂存文件失败: {str(e)}")
+    
+    def _mark_spool_done(self, delivery: Dict):
+        """记录通知已完成；完成标记累积较多且发件箱为空时清空暂存文件"""
+        with self._spool_lock:
+            if not self._spool_fh:
+                return
+            self._spool_write({'op': 'done', 'id': delivery['id']})
+            self._spool_done_count += 1
+            if self._spool_done_count < 100 or self._queue.qsize() or self._retry_heap:
+                return
+            try:
+                # 文件以追加模式打开，截断后的写入从文件开头开始
+                os.ftruncate(self._spool_fh.fileno(), 0)
+                self._spool_done_count = 0
+            except OSError as e:
+                logging.warning(f"压缩通知暂存文件失败: {str(e)}")
+    
+    def _open_spool(self):
+        """打开并锁住本进程的暂存文件，接管已退出进程遗留的暂存文件，重新投递未完成的通知"""
+        if not self.spool_file or self._spool_fh:
+            return
+        
+        path = os.path.abspath(f'{self.spool_file}.{os.getpid()}')
+        pending: Dict[str, Dict] = {}
+        try:
+            # 全局锁保证其他进程不会在本进程创建并锁住暂存文件之前接管它
+            with open(self.spool_file + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                fh = open(path, 'a+', encoding='utf-8')
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fh.seek(0)
+                    # 同一pid上次运行遗留的记录
+                    self._read_spool(fh, pending)
+                    for orphan in self._orphan_spools(path):
+                        self._claim_spool(orphan, pending)
+                    
+                    # 重写暂存文件，只保留未完成的通知
+                    os.ftruncate(fh.fileno(), 0)
+                    for item in pending.values():
+                        fh.write(json.dumps({'op': 'add', 'item': item}, ensure_ascii=False) + '\n')
+                    fh.flush()
+                except OSError:
+                    fh.close()
+                    raise
+        except OSError as e:
+            logging.warning(f"打开通知暂存文件失败，本进程不暂存通知: {str(e)}")
+            return
+        
+        with self._spool_lock:
+            self._spool_fh = fh
+            self._spool_path = path
+            self._spool_done_count = 0
+        
+        # 同一分发器重启时队列中可能已有这些通知
+        known = {delivery.get('id') for delivery in self.pending_deliveries()}
+        for item in pending.values():
+            if item.get('id') in known:
+                continue
+            try:
+                self._queue.put_nowait(item)
+                self._incr('enqueued')
+            except queue.Full:
+                self._incr('dropped')
+        if pending:
+            logging.info(f"从暂存文件恢复 {len(pending)} 条待发送通知")
+    
+    def _orphan_spools(self, own_path: str) -> List[str]:
+        """同一暂存文件名下其他进程的暂存文件（以及旧版本共用的暂存文件本身）"""
+        directory = os.path.dirname(own_path)
+        base = os.path.basename(self.spool_file)
+        paths = []
+        for name in os.listdir(directory):
+            suffix = name[len(base):]
+            if not name.startswith(base) or not (suffix == '' or (suffix[:1] == '.' and suffix[1:].isdigit())):
+                continue
+            path = os.path.join(directory, name)
+            if path != own_path:
+                paths.append(path)
+        return paths
+    
+    def _claim_spool(self, path: str, pending: Dict[str, Dict]):
+        """接管一个没有被锁住的暂存文件：读出未完成的通知后删除该文件"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # 所属进程仍在运行
+                    return
+                self._read_spool(f, pending)
+                os.remove(path)
+        except OSError as e:
+            logging.warning(f"接管通知暂存文件失败 ({path}): {str(e)}")
+    
+    @staticmethod
+    def _read_spool(f, pending: Dict[str, Dict]):
+        """按记录顺序合并暂存文件内容：add 加入、done 移除"""
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程中断时可能留下不完整的最后一行
+                continue
+            if record.get('op') == 'add':
+                item = record.get('item') or {}
+                pending[item.get('id')] = item
+            elif record.get('op') == 'done':
+                pending.pop(record.get('id'), None)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通知负载模块 - 批量结果摘要与超限负载的分片
+"""
+
+import json
+from typing import Callable, Dict, List
+
+# 摘要中保留的失败条目数
+TOP_FAILURES = 10
+
+def summarize_results(results: List[Dict], top_n: int = TOP_FAILURES) -> Dict:
+    """一次遍历批量结果，生成摘要
+    
+    返回各动作计数、只包含发生变化的域名列表、前N条失败，以及成功/总数。
+    列表中的条目只保留域名、记录类型、新旧IP和动作等必要字段。
+    """
+    action_counts: Dict[str, int] = {}
+    changed = []
+    failures = []
+    failure_count = 0
+    success_count = 0
+    
+    for result in results:
+        action = result.get('action') or ('failed' if not result.get('success') else 'unknown')
+        action_counts[action] = action_counts.get(action, 0) + 1
+        
+        if result.get('success'):
+            success_count += 1
+            if action in ('updated', 'created'):
+                changed.append({
+                    'domain': result.get('domain', ''),
+                    'record_type': result.get('record_type', 'A'),
+                    'old_ip': result.get('old_ip'),
+                    'new_ip': result.get('ip_address'),
+                    'action': action
+                })
+        else:
+            failure_count += 1
+            if len(failures) < top_n:
+                failures.append({
+                    'domain': result.get('domain', ''),
+                    'record_type': result.get('record_type', 'A'),
+                    'message': result.get('message', '')
+                })
+    
+    return {
+        'action_counts': action_counts,
+        'changed': changed,
+        'changed_count': len(changed),
+        'failures': failures,
+        'failure_count': failure_count,
+        'success_count': success_count,
+        'total_count': len(results)
+    }
+
+def payload_size(body) -> int:
+    """请求体序列化后的字节数"""
+    return len(json.dumps(body, ensure_ascii=False).encode('utf-8'))
+
+def split_chunks(items: List, render: Callable[[List], object], budget: int) -> List[List]:
+    """把列表拆分为若干连续分片，使每个分片渲染后的请求体不超过预算
+    
+    先按单个条目的序列化大小贪心分组，再逐个校验渲染结果，仍超限的分片对半拆分。
+    单个条目本身超限时单独成片。
+    """
+    if not items:
+        return [items]
+    
+    base = payload_size(render([]))
+    available = max(1, budget - base)
+    groups: List[List] = []
+    current: List = []
+    current_size = 0
+    for item in items:
+        # 模板中的JSON字符串会被再次转义，按1.5倍估算
+        size = int(len(json.dumps(item, ensure_ascii=False, indent=2).encode('utf-8')) * 1.5)
+        if current and current_size + size > available:
+            groups.append(current)
+            current, current_size = [], 0
+        current.append(item)
+        current_size += size
+    groups.append(current)
+    
+    chunks: List[List] = []
+    while groups:
+        group = groups.pop(0)
+        if len(group) > 1 and payload_size(render(group)) > budget:
+            middle = len(group) // 2
+            groups[:0] = [group[:middle], group[middle:]]
+            continue
+        chunks.append(group)
+    return chunks
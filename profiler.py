@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按需性能分析模块 - 在运行中的进程里采集限时的CPU profile和tracemalloc内存快照差异
+
+未启用时完全静默：不设置任何profile钩子，不启动tracemalloc，
+更新周期和Web请求只多一次属性判断。
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# 单次CPU采集的最长时间（秒）
+MAX_DURATION = 300
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+# 采样时单个调用栈的最大深度
+MAX_STACK_DEPTH = 64
+
+# 属于调度器（更新周期）的线程名前缀，其余线程视为Web线程
+SCHEDULER_THREADS = ('scheduler', 'ddns-job', 'ddns-zone')
+# 后台辅助线程，采样 web 目标时排除
+BACKGROUND_THREADS = SCHEDULER_THREADS + ('config-watcher', 'control-socket', 'metrics-flush',
+                                          'notification-dispatcher', 'webhook', 'profiler')
+
+class ProfilerBusy(Exception):
+    """已有CPU采集正在进行"""
+
+def _thread_matches(name: str, target: str) -> bool:
+    if target == 'scheduler':
+        return name.startswith(SCHEDULER_THREADS)
+    if target == 'web':
+        return not name.startswith(BACKGROUND_THREADS)
+    return not name.startswith('profiler')
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profiler:
+    """进程内的按需性能分析器（每个进程一个实例）"""
+    
+    def __init__(self):
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        # 正在进行的cProfile采集目标（scheduler / web）及已结束的profile
+        self._armed: Optional[str] = None
+        self._profiles = []
+        # tracemalloc基线快照
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+    
+    # ---- CPU：cProfile ----
+    
+    def armed(self, target: str) -> bool:
+        return self._armed == target
+    
+    @contextmanager
+    def profiled(self, target: str):
+        """采集进行中且目标匹配时，用cProfile记录代码块（每次调用独立的Profile，结束后合并）"""
+        if self._armed != target:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+    
+    def start_cprofile(self, target: str):
+        """开始采集：之后开始的更新周期（scheduler）或Web请求（web）在 profiled() 中被记录"""
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy()
+        with self._lock:
+            self._profiles = []
+        self._armed = target
+    
+    def stop_cprofile(self) -> Optional[pstats.Stats]:
+        """结束采集并返回合并后的统计；期间没有被记录的代码时返回 None"""
+        self._armed = None
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        self._busy.release()
+        
+        stats = None
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+    
+    def cprofile(self, seconds: float, target: str = 'scheduler', during=None) -> Optional[pstats.Stats]:
+        """限时采集；during 为可选的回调，在采集开始后调用（例如立即触发一次更新周期）"""
+        self.start_cprofile(target)
+        try:
+            deadline = time.monotonic() + min(seconds, MAX_DURATION)
+            if during:
+                during()
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        finally:
+            stats = self.stop_cprofile()
+        return stats
+    
+    # ---- CPU：采样 ----
+    
+    def sample(self, seconds: float, target: str = 'all',
+               interval: float = SAMPLE_INTERVAL) -> Tuple[Counter, int]:
+        """定时读取各线程的调用栈，返回 (调用栈 -> 采样次数, 采样轮数)
+        
+        只能看到操作系统线程（gthread worker中每个请求各占一个线程）。
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            stacks: Counter = Counter()
+            rounds = 0
+            me = threading.get_ident()
+            deadline = time.monotonic() + min(seconds, MAX_DURATION)
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    name = names.get(ident, f'thread-{ident}')
+                    if ident == me or not _thread_matches(name, target):
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(name)
+                    stacks[tuple(reversed(stack))] += 1
+                rounds += 1
+                time.sleep(interval)
+            return stacks, rounds
+        finally:
+            self._busy.release()
+    
+    # ---- 内存：tracemalloc ----
+    
+    def start_memory(self, frames: int = 10) -> Dict:
+        """开始跟踪内存分配并记录基线快照"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._started_tracemalloc = True
+        self._baseline = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        return {'tracing': True, 'traced_bytes': current, 'peak_bytes': peak}
+    
+    def memory_diff(self, limit: int = 50, key_type: str = 'lineno', stop: bool = False) -> Optional[str]:
+        """与基线比较的内存分配差异（文本）；未开始跟踪时返回 None"""
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        diff = snapshot.compare_to(self._baseline, key_type)
+        current, peak = tracemalloc.get_traced_memory()
+        
+        lines = [
+            f"# tracemalloc diff (pid {os.getpid()}, key_type={key_type})",
+            f"# traced: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB",
+            f"# total change: {sum(stat.size_diff for stat in diff) / 1024:+.1f} KiB",
+            ''
+        ]
+        for stat in diff[:limit]:
+            lines.append(str(stat))
+            if key_type == 'traceback':
+                lines.extend(f"    {line}" for line in stat.traceback.format())
+        if stop:
+            self.stop_memory()
+        return '\n'.join(lines) + '\n'
+    
+    def stop_memory(self):
+        """丢弃基线；由本模块启动的tracemalloc一并停止"""
+        self._baseline = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+    
+    def get_status(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'cpu_busy': self._busy.locked(),
+            'cprofile_target': self._armed,
+            'memory_tracing': tracemalloc.is_tracing() and self._baseline is not None
+        }
+
+def stats_to_bytes(stats: pstats.Stats) -> bytes:
+    """pstats二进制格式（与 Profile.dump_stats 相同，可用 pstats / snakeviz 打开）"""
+    return marshal.dumps(stats.stats)
+
+def stats_to_text(stats: pstats.Stats, sort: str = 'cumulative', limit: int = 50) -> str:
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+def samples_to_collapsed(stacks: Counter) -> str:
+    """flamegraph.pl / speedscope 可读取的折叠调用栈格式"""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+def samples_to_text(stacks: Counter, rounds: int, limit: int = 30) -> str:
+    """按函数汇总采样：self为栈顶次数，total为出现在栈中的次数"""
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    threads: Counter = Counter()
+    for stack, count in stacks.items():
+        threads[stack[0]] += count
+        self_counts[stack[-1]] += count
+        for label in set(stack[1:]):
+            total_counts[label] += count
+    
+    lines = [f"# {rounds} rounds, {sum(stacks.values())} samples", '', 'samples by thread:']
+    lines.extend(f"  {count:>8}  {name}" for name, count in threads.most_common())
+    lines.extend(['', f"top {limit} by self:"])
+    lines.extend(f"  {count:>8}  {label}" for label, count in self_counts.most_common(limit))
+    lines.extend(['', f"top {limit} by total:"])
+    lines.extend(f"  {count:>8}  {label}" for label, count in total_counts.most_common(limit))
+    return '\n'.join(lines) + '\n'
+
+# 进程级单例
+PROFILER = Profiler()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对账模块 - 根据期望状态和Zone记录快照计算变更计划，并以最少的API调用执行
+"""
+
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from deadline import DeadlineExceeded
+
+# DescribeDnsRecords 的 name 过滤条件单次最多携带的域名数
+NAME_FILTER_CHUNK = 20
+# DescribeDnsRecords 单页最大记录数
+DESCRIBE_PAGE_SIZE = 1000
+# ModifyDnsRecords 单次最多修改的记录数
+MODIFY_BATCH_SIZE = 100
+# 新建记录的默认TTL（秒）
+DEFAULT_TTL = 300
+
+@dataclass(frozen=True)
+class PlannedChange:
+    """单条记录的计划操作"""
+    action: str  # create / modify / noop
+    domain: str
+    record_type: str
+    desired: str
+    current: Optional[str] = None
+    record_id: Optional[str] = None
+    ttl: int = DEFAULT_TTL
+
+@dataclass
+class Plan:
+    """变更计划"""
+    changes: List[PlannedChange] = field(default_factory=list)
+    
+    def by_action(self, action: str) -> List[PlannedChange]:
+        return [change for change in self.changes if change.action == action]
+    
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = {'create': 0, 'modify': 0, 'noop': 0}
+        for change in self.changes:
+            counts[change.action] += 1
+        return counts
+    
+    @property
+    def pending(self) -> int:
+        """需要调用API的变更数"""
+        return sum(1 for change in self.changes if change.action != 'noop')
+    
+    def to_dict(self) -> Dict:
+        return {
+            'counts': self.counts,
+            'pending': self.pending,
+            'changes': [asdict(change) for change in self.changes]
+        }
+
+class ZoneSnapshot:
+    """Zone中DNS记录的只读索引，按 (域名, 记录类型) 查找，同名同类型存在多条时取第一条"""
+    
+    def __init__(self, records: Iterable[Dict] = ()):
+        self.records: Dict[Tuple[str, str], Dict] = {}
+        for record in records:
+            self.records.setdefault((record.get('Name'), record.get('Type')), record)
+    
+    def get(self, domain: str, record_type: str) -> Optional[Dict]:
+        return self.records.get((domain, record_type))
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    @classmethod
+    def fetch(cls, client, zone_id: str, domains: Iterable[str], record_types: Iterable[str]) -> 'ZoneSnapshot':
+        """按域名分组查询记录：每组一次请求（记录较多时分页），而不是每个域名各查一次"""
+        domains = list(dict.fromkeys(domains))
+        record_types = list(record_types)
+        records = []
+        for start in range(0, len(domains), NAME_FILTER_CHUNK):
+            filters = [{'Name': 'name', 'Values': domains[start:start + NAME_FILTER_CHUNK], 'Fuzzy': False}]
+            if len(record_types) == 1:
+                filters.append({'Name': 'type', 'Values': record_types, 'Fuzzy': False})
+            offset = 0
+            while True:
+                response = client.describe_dns_records(zone_id, filters, limit=DESCRIBE_PAGE_SIZE, offset=offset)
+                page = response.get('DnsRecords') or []
+                records.extend(page)
+                offset += len(page)
+                if not page or offset >= response.get('TotalCount', 0):
+                    break
+        wanted = set(record_types)
+        return cls(record for record in records if record.get('Type') in wanted)
+
+def desired_state(domains_by_type: Dict[str, Iterable[str]], ip_by_type: Dict[str, str]) -> List[Tuple[str, str, str]]:
+    """生成期望状态：(域名, 记录类型, IP) 列表，没有IP的记录类型被跳过"""
+    desired = []
+    for record_type, domains in domains_by_type.items():
+        ip_address = ip_by_type.get(record_type)
+        if not ip_address:
+            continue
+        desired.extend((domain, record_type, ip_address) for domain in domains)
+    return desired
+
+def compute_plan(desired: Iterable[Tuple[str, str, str]], snapshot: ZoneSnapshot,
+                 ttls: Optional[Mapping[Tuple[str, str], int]] = None) -> Plan:
+    """对比期望状态与快照，得到每条记录的操作
+    
+    ttls 为 (域名, 记录类型) -> 期望的TTL；未指定TTL的记录沿用现有TTL，IP和TTL都一致时无需变更。
+    """
+    plan = Plan()
+    for domain, record_type, ip_address in desired:
+        ttl = ttls.get((domain, record_type)) if ttls else None
+        record = snapshot.get(domain, record_type)
+        if record is None:
+            plan.changes.append(PlannedChange('create', domain, record_type, ip_address, ttl=ttl or DEFAULT_TTL))
+            continue
+        current = record.get('Content')
+        current_ttl = record.get('TTL', DEFAULT_TTL)
+        plan.changes.append(PlannedChange(
+            'noop' if current == ip_address and ttl in (None, current_ttl) else 'modify',
+            domain,
+            record_type,
+            ip_address,
+            current=current,
+            record_id=record.get('RecordId'),
+            ttl=ttl or current_ttl
+        ))
+    return plan
+
+def failure_result(domain: str, error: Exception, record_id: Optional[str] = None) -> Dict:
+    """操作失败的结果；周期预算用完而未执行的记录为 cancelled"""
+    if isinstance(error, DeadlineExceeded):
+        return {
+            'action': 'cancelled',
+            'success': False,
+            'message': f"域名 {domain} 未处理: {str(error)}",
+            'record_id': record_id
+        }
+    return {
+        'action': 'none',
+        'success': False,
+        'message': f"操作域名 {domain} 失败: {str(error)}",
+        'record_id': record_id
+    }
+
+def execute_plan(client, zone_id: str, plan: Plan,
+                 on_result: Optional[Callable[[PlannedChange, Dict], None]] = None) -> List[Dict]:
+    """执行计划：修改合并为批量的 ModifyDnsRecords 调用，创建逐条调用，无变更的不调用API
+    
+    返回与 update_or_create_*_record 结构相同的结果列表（按计划中的顺序）；
+    on_result(change, result) 在每条记录得到结果时调用。
+    """
+    results: Dict[int, Dict] = {}
+    
+    def finish(index: int, result: Dict):
+        results[index] = result
+        if on_result:
+            on_result(plan.changes[index], result)
+    
+    modifies = []
+    for index, change in enumerate(plan.changes):
+        if change.action == 'noop':
+            finish(index, {
+                'action': 'no_change',
+                'success': True,
+                'message': f"域名 {change.domain} 的{change.record_type}记录IP已是 {change.desired}，无需更新",
+                'record_id': change.record_id
+            })
+        elif change.action == 'modify':
+            modifies.append((index, change))
+    
+    for start in range(0, len(modifies), MODIFY_BATCH_SIZE):
+        batch = modifies[start:start + MODIFY_BATCH_SIZE]
+        try:
+            client.modify_dns_records(zone_id, [
+                {
+                    'RecordId': change.record_id,
+                    'Name': change.domain,
+                    'Type': change.record_type,
+                    'Content': change.desired,
+                    'TTL': change.ttl
+                }
+                for _, change in batch
+            ])
+            error = None
+        except Exception as e:
+            error = e
+            logging.error(f"批量修改 {len(batch)} 条DNS记录失败: {str(e)}")
+        for index, change in batch:
+            if error:
+                finish(index, failure_result(change.domain, error, change.record_id))
+            else:
+                finish(index, {
+                    'action': 'updated',
+                    'success': True,
+                    'message': f"域名 {change.domain} 的{change.record_type}记录已更新为 {change.desired}",
+                    'record_id': change.record_id,
+                    'old_ip': change.current,
+                    'new_ip': change.desired
+                })
+    
+    for index, change in enumerate(plan.changes):
+        if change.action != 'create':
+            continue
+        try:
+            response = client.create_dns_record(zone_id, change.domain, change.record_type, change.desired,
+                                                change.ttl)
+            if 'RecordId' not in response:
+                raise Exception("创建DNS记录失败，未返回DnsRecordId")
+            finish(index, {
+                'action': 'created',
+                'success': True,
+                'message': f"域名 {change.domain} 的{change.record_type}记录已创建为 {change.desired}",
+                'record_id': response['RecordId'],
+                'new_ip': change.desired
+            })
+        except Exception as e:
+            finish(index, failure_result(change.domain, e))
+    
+    return [results[index] for index in range(len(plan.changes))]
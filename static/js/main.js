@@ -6,7 +6,10 @@
 window.EdgeOneDDNS = {
     config: {},
     status: {},
-    timer: null
+    timer: null,
+    eventSource: null,
+    refreshTimer: null,
+    sseRetryTimer: null
 };
 
 // 页面加载完成后执行
@@ -19,9 +22,9 @@ function initializeApp() {
     // 初始化工具提示
     initializeTooltips();
     
-    // 设置定时刷新
+    // 订阅实时事件（不支持时回退到定时刷新）
     if (window.location.pathname === '/') {
-        startAutoRefresh();
+        startLiveUpdates();
     }
     
     // 绑定全局事件
@@ -43,10 +46,11 @@ function bindGlobalEvents() {
     // 监听页面可见性变化
     document.addEventListener('visibilitychange', function() {
         if (document.hidden) {
-            stopAutoRefresh();
+            stopLiveUpdates();
         } else {
             if (window.location.pathname === '/') {
-                startAutoRefresh();
+                startLiveUpdates();
+                updateStatus();
             }
         }
     });
@@ -66,6 +70,85 @@ function bindGlobalEvents() {
     });
 }
 
+// 启动实时更新：优先使用SSE，不可用时回退到轮询
+function startLiveUpdates() {
+    stopLiveUpdates();
+    
+    if (!window.EventSource) {
+        startAutoRefresh();
+        return;
+    }
+    
+    const source = new EventSource('/api/events');
+    window.EdgeOneDDNS.eventSource = source;
+    
+    const handleEvent = function(e) {
+        let payload = {};
+        try {
+            payload = JSON.parse(e.data);
+        } catch (err) {
+            return;
+        }
+        document.dispatchEvent(new CustomEvent('ddns:event', { detail: payload }));
+        scheduleStatusRefresh();
+    };
+    
+    ['service_status', 'cycle_start', 'cycle_finish', 'domain_result', 'ip_change', 'log', 'reset'].forEach(type => {
+        source.addEventListener(type, handleEvent);
+    });
+    
+    // 后台任务进度只转发给页面脚本，不影响状态显示
+    source.addEventListener('job_update', function(e) {
+        try {
+            document.dispatchEvent(new CustomEvent('ddns:event', { detail: JSON.parse(e.data) }));
+        } catch (err) {
+            // 忽略格式错误的事件
+        }
+    });
+    
+    source.onopen = function() {
+        // SSE连接正常，停止轮询
+        stopAutoRefresh();
+    };
+    
+    source.onerror = function() {
+        // 浏览器会自动重连；连接被彻底关闭时（如服务端SSE连接数已满返回503）回退到轮询，稍后再尝试SSE
+        if (source.readyState === EventSource.CLOSED) {
+            window.EdgeOneDDNS.eventSource = null;
+            startAutoRefresh();
+            window.EdgeOneDDNS.sseRetryTimer = setTimeout(startLiveUpdates, 60000);
+        }
+    };
+}
+
+// 停止实时更新
+function stopLiveUpdates() {
+    if (window.EdgeOneDDNS.eventSource) {
+        window.EdgeOneDDNS.eventSource.close();
+        window.EdgeOneDDNS.eventSource = null;
+    }
+    if (window.EdgeOneDDNS.refreshTimer) {
+        clearTimeout(window.EdgeOneDDNS.refreshTimer);
+        window.EdgeOneDDNS.refreshTimer = null;
+    }
+    if (window.EdgeOneDDNS.sseRetryTimer) {
+        clearTimeout(window.EdgeOneDDNS.sseRetryTimer);
+        window.EdgeOneDDNS.sseRetryTimer = null;
+    }
+    stopAutoRefresh();
+}
+
+// 合并短时间内的多个事件，只刷新一次状态
+function scheduleStatusRefresh() {
+    if (window.EdgeOneDDNS.refreshTimer) {
+        return;
+    }
+    window.EdgeOneDDNS.refreshTimer = setTimeout(function() {
+        window.EdgeOneDDNS.refreshTimer = null;
+        updateStatus();
+    }, 300);
+}
+
 // 启动自动刷新
 function startAutoRefresh() {
     stopAutoRefresh();
@@ -300,5 +383,5 @@ window.API = API;
 
 // 页面卸载时清理
 window.addEventListener('beforeunload', function() {
-    stopAutoRefresh();
+    stopLiveUpdates();
 });
\ No newline at end of file
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周期追踪模块 - 为每次更新周期记录轻量的span树（单调时钟计时），用于事后分析慢周期
+
+    with trace_cycle('schedule', store) as trace:
+        with span('detect', service='ipify', family='ipv4') as s:
+            ...
+            s.set(ok=True)
+
+当前线程没有进行中的追踪时 span() 不做任何记录，开销可以忽略。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+_local = threading.local()
+
+class Span:
+    """一个计时区间"""
+    
+    __slots__ = ('name', 'attrs', 'start', 'end', 'children')
+    
+    def __init__(self, name: str, attrs: Optional[Dict] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List['Span'] = []
+    
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+    
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+    
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attrs': self.attrs,
+            'children': [child.to_dict(origin) for child in self.children]
+        }
+
+class _NoopSpan:
+    """没有进行中的追踪时返回的占位span"""
+    
+    __slots__ = ()
+    
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    """一次更新周期的span树"""
+    
+    def __init__(self, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.started_at = datetime.now()
+        self.root = Span('cycle', {'trigger': trigger})
+    
+    @property
+    def finished(self) -> bool:
+        return self.root.end is not None
+    
+    def summary(self) -> Dict:
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': round(self.root.duration * 1000, 3),
+            'finished': self.finished,
+            'success': self.root.attrs.get('success'),
+            'spans': sum(1 for _ in self._walk())
+        }
+    
+    def to_dict(self) -> Dict:
+        data = self.summary()
+        data['root'] = self.root.to_dict(self.root.start)
+        return data
+    
+    def to_chrome(self) -> Dict:
+        """Chrome trace event格式（chrome://tracing / Perfetto 可直接打开）"""
+        origin = self.root.start
+        pid = os.getpid()
+        events = [{
+            'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+            'args': {'name': f'edgeone-ddns cycle {self.id} ({self.trigger})'}
+        }]
+        for item in self._walk():
+            events.append({
+                'name': item.name,
+                'cat': item.name.split('.')[0],
+                'ph': 'X',
+                'ts': round((item.start - origin) * 1e6, 1),
+                'dur': round(item.duration * 1e6, 1),
+                'pid': pid,
+                'tid': 0,
+                'args': item.attrs
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'trace': self.to_dict()}
+    
+    def _walk(self) -> Iterator[Span]:
+        stack = [self.root]
+        while stack:
+            item = stack.pop()
+            yield item
+            stack.extend(reversed(item.children))
+
+class TraceStore:
+    """保存最近 N 个周期的追踪，可选地把每个追踪导出为Chrome trace文件"""
+    
+    def __init__(self, capacity: int = 50, export_dir: str = ''):
+        self.capacity = max(1, capacity)
+        self.export_dir = export_dir
+        self._traces: 'OrderedDict[str, Trace]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def configure(self, capacity: int, export_dir: str):
+        with self._lock:
+            self.capacity = max(1, capacity)
+            self.export_dir = export_dir
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+    
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.id] = trace
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+            export_dir = self.export_dir
+        if export_dir:
+            self._export(trace, export_dir)
+    
+    def get(self, trace_id: str) -> Optional[Dict]:
+        """按ID查找追踪（span树格式）；内存中没有时尝试读取导出文件（可能由其他worker写入）"""
+        with self._lock:
+            trace = self._traces.get(trace_id)
+        if trace:
+            return trace.to_dict()
+        exported = self.load_chrome(trace_id)
+        return exported.get('trace') if exported else None
+    
+    def get_chrome(self, trace_id: str) -> Optional[Dict]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+        if trace:
+            return trace.to_chrome()
+        return self.load_chrome(trace_id)
+    
+    def load_chrome(self, trace_id: str) -> Optional[Dict]:
+        if not self.export_dir or not trace_id.isalnum():
+            return None
+        try:
+            with open(self._path(self.export_dir, trace_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def list(self) -> List[Dict]:
+        """最近的追踪摘要（新的在前）"""
+        with self._lock:
+            traces = list(self._traces.values())
+        return [trace.summary() for trace in reversed(traces)]
+    
+    @staticmethod
+    def _path(export_dir: str, trace_id: str) -> str:
+        return os.path.join(export_dir, f'cycle-{trace_id}.json')
+    
+    def _export(self, trace: Trace, export_dir: str):
+        path = self._path(export_dir, trace.id)
+        try:
+            os.makedirs(export_dir, exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(trace.to_chrome(), f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"导出周期追踪失败: {str(e)}")
+            return
+        self._prune(export_dir)
+    
+    def _prune(self, export_dir: str):
+        """导出目录只保留最近 capacity 个文件"""
+        try:
+            files = [os.path.join(export_dir, name) for name in os.listdir(export_dir)
+                     if name.startswith('cycle-') and name.endswith('.json')]
+            if len(files) <= self.capacity:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.capacity]:
+                os.unlink(path)
+        except OSError:
+            pass
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+@contextmanager
+def trace_cycle(trigger: str, store: Optional[TraceStore] = None) -> Iterator[Trace]:
+    """在当前线程开始一次周期追踪，结束后加入 store"""
+    trace = Trace(trigger)
+    previous = (getattr(_local, 'trace', None), getattr(_local, 'stack', None))
+    _local.trace = trace
+    _local.stack = [trace.root]
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.set(error=str(e))
+        raise
+    finally:
+        trace.root.end = time.perf_counter()
+        _local.trace, _local.stack = previous
+        if store is not None:
+            store.add(trace)
+
+def current_span() -> Optional[Span]:
+    """当前线程中最内层的span，用于把并发子任务的span挂到同一棵树上"""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+@contextmanager
+def attach(parent: Optional[Span]):
+    """在工作线程中把之后的span记录到 parent 下；parent 为 None 时不记录"""
+    previous = (getattr(_local, 'trace', None), getattr(_local, 'stack', None))
+    _local.stack = [parent] if parent is not None else None
+    try:
+        yield
+    finally:
+        _local.trace, _local.stack = previous
+
+@contextmanager
+def span(name: str, **attrs):
+    """在当前追踪中记录一个子span；没有进行中的追踪时不记录"""
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        yield _NOOP_SPAN
+        return
+    item = Span(name, attrs)
+    stack[-1].children.append(item)
+    stack.append(item)
+    try:
+        yield item
+    except BaseException as e:
+        item.set(error=str(e))
+        raise
+    finally:
+        item.end = time.perf_counter()
+        stack.pop()